@@ -1,28 +1,35 @@
 # agent.py – Tekisho Research Assistant (MongoDB + LiveKit Cloud + RAG)
 import os
 import json
+import asyncio
 import logging
 import re
+import time
 from dotenv import load_dotenv
-from pymongo import MongoClient
+# Tracing spans and Prometheus metrics; imported first so the metrics
+# directory is configured before anything loads prometheus_client
+import telemetry
 from livekit import agents
-from livekit.agents import AgentSession, Agent, RoomInputOptions, WorkerOptions
+from livekit.agents import AgentSession, Agent, JobProcess, RoomInputOptions, WorkerOptions
 from livekit.agents.llm import function_tool
 from livekit.plugins import noise_cancellation, silero, tavus
 from prompts import SESSION_INSTRUCTION, AGENT_INSTRUCTION
+from speech import normalize_for_speech, SpeechNormalizer
 
 # RAG module
 import rag
+# Shared MongoDB pool and client lookup
+import db
+import client_lookup
+import fuzzy_index
+import profile_cache
+from prefetch import SessionPrefetch
 
 # -------------------------------------
 # Environment Setup
 # -------------------------------------
 load_dotenv()
 
-MONGO_URI = os.getenv("MONGO_URI")
-DB_NAME = os.getenv("MONGO_DB_NAME", "tekisho_db")
-COLLECTION_NAME = os.getenv("MONGO_COLLECTION", "clients")
-
 LIVEKIT_URL = os.getenv("LIVEKIT_URL")
 LIVEKIT_API_KEY = os.getenv("LIVEKIT_API_KEY")
 LIVEKIT_API_SECRET = os.getenv("LIVEKIT_API_SECRET")
@@ -31,6 +38,23 @@ TAVUS_API_KEY = os.getenv("TAVUS_API_KEY")
 REPLICA_ID = os.getenv("REPLICA_ID")
 PERSONA_ID = os.getenv("PERSONA_ID")
 
+# Stream RAG answers straight into TTS instead of returning them to the LLM
+RAG_STREAMING = os.getenv("RAG_STREAMING", "1") == "1"
+
+# Spoken when a solutions answer can't be generated
+SOLUTIONS_FALLBACK = ("Our AI solutions typically deliver ROI ranging from one fifty to three hundred percent "
+                      "within the first six to twelve weeks. Cost savings usually fall between twenty five and forty percent, "
+                      "with productivity improvements of fifty to eighty percent. "
+                      "Would you like me to connect you with a solution architect to discuss specific numbers for your use case?")
+# Spoken instead when the answer fails part way through
+SOLUTIONS_INTERRUPTED = ("I'd rather not guess at the rest of the details, so let me connect you with a solution "
+                         "architect who can walk you through the specifics. Would that be helpful?")
+
+# Set to register for explicit dispatch (required by server.py's warm room pool)
+AGENT_NAME = os.getenv("AGENT_NAME", "")
+# Participant attribute server.py's room pool polls for (room_pool.WARM_ATTRIBUTE)
+WARM_ATTRIBUTE = "tekisho.warm"
+
 # Logging setup
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("TekishoAgent")
@@ -39,82 +63,113 @@ logger = logging.getLogger("TekishoAgent")
 # =====================================
 # Helper Functions
 # =====================================
-def format_numbers_for_speech(text: str) -> str:
+def format_for_speech(text: str, context: str = "") -> str:
+    """normalize_for_speech(), timed as its own stage."""
+    with telemetry.span("speech.normalize", chars=len(text)):
+        return normalize_for_speech(text, context)
+
+
+class SpeechChunker:
     """
-    Convert numeric patterns to speech-friendly format.
-    Examples:
-    - "150-200%" -> "one fifty to two hundred percent"
-    - "25-35%" -> "twenty five to thirty five percent"
-    - "6-8 weeks" -> "six to eight weeks"
+    Turn streamed LLM text into sentence-sized, speech-formatted pieces.
+    speech.SpeechNormalizer formats the text as it arrives, holding back a
+    number the next delta may still complete ("150-" before "200%"); the
+    formatted text is released at sentence boundaries, or at a word boundary
+    once it grows long.
     """
-    
-    def number_to_words(num_str):
-        """Convert number string to words (simple version for common cases)"""
-        num = int(num_str)
-        
-        # Handle special cases
-        if num == 0:
-            return "zero"
-        
-        ones = ["", "one", "two", "three", "four", "five", "six", "seven", "eight", "nine"]
-        teens = ["ten", "eleven", "twelve", "thirteen", "fourteen", "fifteen", 
-                 "sixteen", "seventeen", "eighteen", "nineteen"]
-        tens = ["", "", "twenty", "thirty", "forty", "fifty", "sixty", "seventy", "eighty", "ninety"]
-        
-        if num < 10:
-            return ones[num]
-        elif num < 20:
-            return teens[num - 10]
-        elif num < 100:
-            return tens[num // 10] + (" " + ones[num % 10] if num % 10 != 0 else "")
-        elif num < 1000:
-            hundreds = ones[num // 100] + " hundred"
-            remainder = num % 100
-            if remainder == 0:
-                return hundreds
-            elif remainder < 10:
-                return hundreds + " and " + ones[remainder]
-            elif remainder < 20:
-                return hundreds + " and " + teens[remainder - 10]
-            else:
-                return hundreds + " and " + tens[remainder // 10] + (" " + ones[remainder % 10] if remainder % 10 != 0 else "")
+
+    # Sentence end: terminal punctuation followed by whitespace, or a newline
+    SENTENCE_END = re.compile(r'[.!?]["\')]?\s|\n')
+    MAX_PENDING = 200
+
+    def __init__(self, formatter=format_for_speech):
+        self._normalizer = SpeechNormalizer(formatter)
+        self._buffer = ""
+
+    def _cut(self) -> int:
+        """Index up to which the buffer can be released, or 0."""
+        cut = 0
+        for match in self.SENTENCE_END.finditer(self._buffer):
+            cut = match.end()
+        if cut or len(self._buffer) < self.MAX_PENDING:
+            return cut
+        # Long run-on text: release up to the last word boundary
+        return self._buffer.rfind(" ") + 1
+
+    def feed(self, delta: str) -> list:
+        """Add streamed text; return any pieces ready to be spoken."""
+        self._buffer += self._normalizer.feed(delta)
+        cut = self._cut()
+        if not cut:
+            return []
+        piece, self._buffer = self._buffer[:cut], self._buffer[cut:]
+        return [piece] if piece.strip() else []
+
+    def flush(self) -> list:
+        """Return whatever is left at the end of the stream."""
+        piece, self._buffer = self._buffer + self._normalizer.flush(), ""
+        return [piece] if piece.strip() else []
+
+    async def stream(self, deltas):
+        """Async-iterate formatted pieces from an async iterator of text deltas."""
+        async for delta in deltas:
+            for piece in self.feed(delta):
+                yield piece
+        for piece in self.flush():
+            yield piece
+
+
+async def speak_with_fallback(pieces):
+    """
+    Pass streamed answer pieces through to session.say(). The stream is read
+    after the tool has returned, so a failure mid-answer (OpenAI, Pinecone)
+    is caught here and a fallback is spoken instead of going silent.
+    """
+    spoken = False
+    try:
+        async for piece in pieces:
+            spoken = True
+            yield piece
+    except Exception as e:
+        logger.exception("Streaming solution failed: %s", e)
+        telemetry.error("tool.get_tekisho_solutions", e)
+        yield SOLUTIONS_INTERRUPTED if spoken else SOLUTIONS_FALLBACK
+
+
+async def lookup_client_profile(name: str, company: str):
+    """
+    Resolve a spoken name/company to a flattened client profile.
+    Fuzzy/phonetic match first (tolerates STT misspellings), then the indexed
+    Mongo lookup; profiles are served from the host's shared cache when possible.
+    """
+    client_id = None
+    if fuzzy_index.matcher.ready:
+        with telemetry.span("client.fuzzy_match"):
+            matches = fuzzy_index.matcher.search(name, company, limit=1)
+        if matches and matches[0][1] >= fuzzy_index.FUZZY_MIN_CONFIDENCE:
+            client_id = matches[0][0]
+            logger.info(f"Fuzzy match for {name} / {company} (confidence {matches[0][1]})")
+
+    if client_id is not None:
+        profile = await asyncio.to_thread(profile_cache.cache.get_by_id, str(client_id))
+        telemetry.cache_lookup("profile", profile is not None)
+        if profile is None:
+            with telemetry.span("client.mongo_lookup", by="id"):
+                client_doc = await client_lookup.get_client_by_id(client_id)
         else:
-            return num_str  # Fallback for large numbers
-    
-    # Pattern for percentage ranges like "150-200%"
-    def replace_percent_range(match):
-        start = match.group(1)
-        end = match.group(2)
-        start_words = number_to_words(start)
-        end_words = number_to_words(end)
-        return f"{start_words} to {end_words} percent"
-    
-    # Pattern for simple ranges like "6-8 weeks"
-    def replace_number_range(match):
-        start = match.group(1)
-        end = match.group(2)
-        unit = match.group(3)
-        start_words = number_to_words(start)
-        end_words = number_to_words(end)
-        return f"{start_words} to {end_words} {unit}"
-    
-    # Pattern for single percentages like "25%"
-    def replace_single_percent(match):
-        num = match.group(1)
-        num_words = number_to_words(num)
-        return f"{num_words} percent"
-    
-    # Apply replacements
-    # Range with percentage: 150-200%
-    text = re.sub(r'(\d+)-(\d+)%', replace_percent_range, text)
-    
-    # Range with unit: 6-8 weeks, 25-35 days
-    text = re.sub(r'(\d+)-(\d+)\s+(weeks|days|months|hours)', replace_number_range, text)
-    
-    # Single percentage: 25%
-    text = re.sub(r'(\d+)%', replace_single_percent, text)
-    
-    return text
+            client_doc = None
+    else:
+        profile = await asyncio.to_thread(profile_cache.cache.get, name, company)
+        telemetry.cache_lookup("profile", profile is not None)
+        client_doc = None
+
+    if profile is None and client_doc is None:
+        with telemetry.span("client.mongo_lookup", by="name"):
+            client_doc = await client_lookup.find_client(name, company)
+    if profile is None and client_doc is not None:
+        profile = client_lookup.flatten_profile(client_doc)
+        await asyncio.to_thread(profile_cache.cache.put, profile, name, company)
+    return profile
 
 
 # =====================================
@@ -137,81 +192,62 @@ class Assistant(Agent):
             "greeting_done": False,
             "identity_confirmed": False
         }
+        # Retrieves (and drafts answers) for the client's industry once we know it
+        self.prefetch = SessionPrefetch(formatter=format_for_speech)
 
     # ------------------
     # Function: Search Client in Database
     # ------------------
     @function_tool()
-    async def search_client_in_database(self, name: str, company: str) -> str:
+    async def search_client_in_database(self, name: str, company: str) -> str | None:
         """
         Search for client information in MongoDB database based on name and company.
         Returns personalized greeting with company research if found.
         """
-        try:
-            client = MongoClient(MONGO_URI)
-            db = client[DB_NAME]
-            collection = db[COLLECTION_NAME]
-            # Search for client (case-insensitive)
-            # Updated query to match new schema structure
-            query = {
-                "$or": [
-                    {"company_name": {"$regex": company, "$options": "i"}},
-                    {"company_details.name": {"$regex": name, "$options": "i"}}
-                ]
-            }
-            client_doc = collection.find_one(query)
-            if client_doc:
-                # Extract data from nested structure
-                record_id = str(client_doc.get('_id', ''))
-                record_company_name = client_doc.get('company_name', '')
-                # Extract from company_details
-                company_details = client_doc.get('company_details', {})
-                record_name = company_details.get('name', '')
-                record_email = company_details.get('email', '')
-                record_phone = company_details.get('phone', '')
-                # Extract from ai_extracted_data
-                ai_data = client_doc.get('ai_extracted_data', {})
-                structured_data = ai_data.get('structured_data', {})
-                record_research_about_company = structured_data.get('Industry', '')
-                record_company_summary = structured_data.get('Description/tagline', '')
-                # Store all information in context
-                self.conversation_context.update({
-                    "record_id": record_id,
-                    "client_name": record_name,
-                    "company": record_company_name,
-                    "mail_id": record_email,
-                    "phone_no": record_phone,
-                    "company_summary": record_company_summary,
-                    "research_about_company": record_research_about_company,
-                    "identity_confirmed": True
-                })
-                # Build personalized response
-                response = f"Hi {record_name}! "
-                if record_company_name:
-                    response += f"I see you're from {record_company_name}. "
-                if record_research_about_company:
-                    response += f"Your company operates in the {record_research_about_company} industry. "
-                if record_company_summary:
-                    response += f"{record_company_summary} "
-                response += "It's wonderful to connect with you! What specific challenges or opportunities can I help you explore today?"
-                logger.info(f"Found client in DB: {record_name} from {record_company_name}")
-                # Close the connection
-                client.close()
-                return response
-            else:
-                # Not found in database
-                logger.info(f"Client not found: {name} from {company}")
-                client.close()
-                return (f"Nice to meet you, {name}! I don't have prior information about {company} in our system yet, "
-                       f"but I'd love to learn more about your business and the challenges you're facing. "
-                       f"Could you tell me a bit about what {company} does and what brings you here today?")
-        except Exception as e:
-            logger.error(f"Database search failed: {e}")
-            if 'client' in locals():
-                client.close()
-            return (f"Great to meet you, {name} from {company}! "
-                   f"I'd love to understand more about your business challenges. "
-                   f"What specific areas are you looking to improve or automate?")
+        with telemetry.span("tool.search_client_in_database") as current:
+            try:
+                profile = await lookup_client_profile(name, company)
+                current.set_attribute("client.found", bool(profile))
+                if profile:
+                    record_name = profile["client_name"]
+                    record_company_name = profile["company"]
+                    record_research_about_company = profile["research_about_company"]
+                    record_company_summary = profile["company_summary"]
+                    # Store all information in context
+                    self.conversation_context.update(profile)
+                    self.conversation_context["identity_confirmed"] = True
+                    # Start on the likely solution questions while the visitor is still talking
+                    self.prefetch.start(profile["research_about_company"])
+                    telemetry.cache_lookup("greeting", bool(profile.get("greeting")))
+                    if profile.get("greeting"):
+                        # Precomputed by greetings.py: speak it as is; it goes into the
+                        # chat context, so no tool reply (and no second LLM turn) is needed
+                        self.session.say(format_for_speech(profile["greeting"]), add_to_chat_ctx=True)
+                        logger.info(f"Found client in DB: {record_name} from {record_company_name} (stored greeting)")
+                        return None
+                    # Build personalized response
+                    response = f"Hi {record_name}! "
+                    if record_company_name:
+                        response += f"I see you're from {record_company_name}. "
+                    if record_research_about_company:
+                        response += f"Your company operates in the {record_research_about_company} industry. "
+                    if record_company_summary:
+                        response += f"{record_company_summary} "
+                    response += "It's wonderful to connect with you! What specific challenges or opportunities can I help you explore today?"
+                    logger.info(f"Found client in DB: {record_name} from {record_company_name}")
+                    return response
+                else:
+                    # Not found in database
+                    logger.info(f"Client not found: {name} from {company}")
+                    return (f"Nice to meet you, {name}! I don't have prior information about {company} in our system yet, "
+                           f"but I'd love to learn more about your business and the challenges you're facing. "
+                           f"Could you tell me a bit about what {company} does and what brings you here today?")
+            except Exception as e:
+                logger.error(f"Database search failed: {e}")
+                telemetry.error("tool.search_client_in_database", e)
+                return (f"Great to meet you, {name} from {company}! "
+                       f"I'd love to understand more about your business challenges. "
+                       f"What specific areas are you looking to improve or automate?")
 
     # ------------------
     # Function: Get Tekisho Solutions (RAG-powered)
@@ -222,38 +258,48 @@ class Assistant(Agent):
         challenge: str, 
         industry: str = None,
         wants_specific_metrics: bool = False
-    ) -> str:
+    ) -> str | None:
         """
         Get AI solutions for a specific business challenge using RAG.
         Returns conversational response with metrics formatted for speech.
         """
-        try:
-            # Track challenges discussed
-            self.conversation_context["challenges_discussed"].append(challenge)
-            
-            # Use industry from context if not provided
-            if not industry and self.conversation_context.get("research_about_company"):
-                industry = self.conversation_context["research_about_company"]
+        with telemetry.span("tool.get_tekisho_solutions", streaming=RAG_STREAMING):
+            try:
+                # Track challenges discussed
+                self.conversation_context["challenges_discussed"].append(challenge)
             
-            # Call RAG function
-            answer = rag.get_tekisho_solutions(
-                challenge=challenge, 
-                industry=industry
-            )
+                # Use industry from context if not provided
+                if not industry and self.conversation_context.get("research_about_company"):
+                    industry = self.conversation_context["research_about_company"]
             
-            # Format numbers for speech
-            answer = format_numbers_for_speech(answer)
+                if RAG_STREAMING:
+                    # Speak the answer sentence by sentence as tokens arrive; the
+                    # spoken text is added to the chat context, so no tool reply
+                    # (and no second LLM turn) is needed
+                    deltas = rag.astream_tekisho_solutions(
+                        challenge=challenge, industry=industry, formatter=format_for_speech,
+                        session=self.prefetch
+                    )
+                    self.session.say(speak_with_fallback(SpeechChunker().stream(deltas)), add_to_chat_ctx=True)
+                    logger.info(f"Streaming solution for challenge: {challenge}")
+                    return None
+
+                # Call RAG function (async, so the session's event loop keeps running)
+                # Numbers are formatted for speech before the answer is cached
+                answer = await rag.aget_tekisho_solutions(
+                    challenge=challenge, 
+                    industry=industry,
+                    formatter=format_for_speech,
+                    session=self.prefetch
+                )
             
-            logger.info(f"Generated solution for challenge: {challenge}")
-            return answer
+                logger.info(f"Generated solution for challenge: {challenge}")
+                return answer
             
-        except Exception as e:
-            logger.exception("get_tekisho_solutions failed: %s", e)
-            fallback = ("Our AI solutions typically deliver ROI ranging from one fifty to three hundred percent "
-                       "within the first six to twelve weeks. Cost savings usually fall between twenty five and forty percent, "
-                       "with productivity improvements of fifty to eighty percent. "
-                       "Would you like me to connect you with a solution architect to discuss specific numbers for your use case?")
-            return fallback
+            except Exception as e:
+                logger.exception("get_tekisho_solutions failed: %s", e)
+                telemetry.error("tool.get_tekisho_solutions", e)
+                return SOLUTIONS_FALLBACK
 
     # ------------------
     # Function: Ask Clarifying Question
@@ -306,22 +352,89 @@ class Assistant(Agent):
         return summary
 
 
+def job_metadata(ctx: agents.JobContext) -> dict:
+    """Dispatch metadata; room_pool.py sends {"pool": true, "max_idle": seconds} for warm rooms."""
+    try:
+        return json.loads(ctx.job.metadata or "{}")
+    except json.JSONDecodeError:
+        logger.warning(f"Ignoring malformed job metadata: {ctx.job.metadata!r}")
+        return {}
+
+
+def record_greeting_latency(session: AgentSession, start: float, warm: bool):
+    """Time from the visitor being there to the agent starting to speak."""
+    def on_state_changed(ev):
+        if ev.new_state == "speaking":
+            session.off("agent_state_changed", on_state_changed)
+            telemetry.record("session.greeting_warm" if warm else "session.greeting_cold", start)
+    session.on("agent_state_changed", on_state_changed)
+
+
 # =====================================
 # Entrypoint
 # =====================================
+def prewarm(proc: JobProcess):
+    """
+    Load per-process resources once, while the worker process waits for a job:
+    the VAD model, RAG clients/index/caches, the fuzzy client index, the
+    trace exporter and the resolved prompts. Jobs read them from proc.userdata.
+    """
+    start = time.perf_counter()
+    telemetry.setup_tracing()
+    proc.userdata["vad"] = silero.VAD.load()
+    rag.init()
+    fuzzy_index.preload()
+    proc.userdata["instructions"] = AGENT_INSTRUCTION
+    proc.userdata["session_instructions"] = SESSION_INSTRUCTION
+    proc.userdata["prewarmed"] = True
+    logger.info(f"Worker process prewarmed in {(time.perf_counter() - start) * 1000:.0f}ms")
+
+
 async def entrypoint(ctx: agents.JobContext):
     """Main entry for LiveKit agent session."""
     logger.info("Starting Tekisho RAG-Powered Agent with DB Integration...")
+    job_start = time.perf_counter()
+    metadata = job_metadata(ctx)
+    pooled = bool(metadata.get("pool"))
+
+    # Tag every span of this session with its room and job
+    telemetry.setup_tracing()
+    telemetry.bind_session(room=ctx.job.room.name, job_id=ctx.job.id)
+    ctx.add_shutdown_callback(telemetry.flush)
+
+    # Open the MongoDB pool while the avatar and session start up, and close it
+    # when the job (and its process) shuts down
+    db_warmup = asyncio.create_task(db.ping())
+    ctx.add_shutdown_callback(db.aclose)
+
+    # Map the host's fuzzy client index if client_sync.py saved a newer one since
+    # prewarm; lookups fall back to Mongo until it is ready
+    index_warmup = asyncio.create_task(fuzzy_index.start())
+
+    # Cached client profiles live in the host's shared store, which client_sync.py
+    # keeps in sync with Mongo; just report this session's hit rate
+    async def log_profile_cache_stats():
+        logger.info(f"Profile cache stats: {profile_cache.cache.stats()}")
+    ctx.add_shutdown_callback(log_profile_cache_stats)
+
+    # Normally done by prewarm(); otherwise open the vector index and OpenAI
+    # client off the event loop so the first solutions question doesn't pay for it
+    userdata = ctx.proc.userdata
+    rag_warmup = None
+    if not userdata.get("prewarmed"):
+        rag_warmup = asyncio.create_task(asyncio.to_thread(rag.init))
+    ctx.add_shutdown_callback(rag.aclose)
 
     # Create agent with instructions from prompts.py
-    agent = Assistant(instructions=AGENT_INSTRUCTION)
+    agent = Assistant(instructions=userdata.get("instructions", AGENT_INSTRUCTION))
+    ctx.add_shutdown_callback(agent.prefetch.aclose)
 
     # Set up voice, avatar, and session
     session = AgentSession(
         llm="openai/gpt-4o-mini",  # Using GPT-4 for better function calling
         stt="assemblyai/universal-streaming",
         tts="cartesia/sonic-2:9626c31c-bec5-4cca-baa8-f8ba9e84c8bc",
-        vad=silero.VAD.load(),
+        vad=userdata.get("vad") or silero.VAD.load(),
     )
 
     avatar = tavus.AvatarSession(
@@ -340,8 +453,27 @@ async def entrypoint(ctx: agents.JobContext):
         ),
     )
 
+    # A pooled room has no visitor yet: report warm, then wait for one to be
+    # handed the room by server.py (or leave, freeing this worker slot)
+    greeting_start = job_start
+    if pooled:
+        telemetry.record("session.warmup", job_start)
+        await ctx.room.local_participant.set_attributes({WARM_ATTRIBUTE: "1"})
+        try:
+            await asyncio.wait_for(ctx.wait_for_participant(), timeout=float(metadata.get("max_idle", 600)))
+        except asyncio.TimeoutError:
+            logger.info("No visitor joined the warm room; leaving")
+            ctx.shutdown(reason="warm room idle")
+            return
+        greeting_start = time.perf_counter()
+    record_greeting_latency(session, greeting_start, warm=pooled)
+
     # Generate initial greeting
-    await session.generate_reply(instructions=SESSION_INSTRUCTION)
+    await session.generate_reply(instructions=userdata.get("session_instructions", SESSION_INSTRUCTION))
+    await db_warmup
+    await index_warmup
+    if rag_warmup is not None:
+        await rag_warmup
 
 
 # =====================================
@@ -352,8 +484,13 @@ if __name__ == "__main__":
     agents.cli.run_app(
         WorkerOptions(
             entrypoint_fnc=entrypoint,
+            prewarm_fnc=prewarm,
+            agent_name=AGENT_NAME,
             ws_url=LIVEKIT_URL,
             api_key=LIVEKIT_API_KEY,
             api_secret=LIVEKIT_API_SECRET,
+            # Latency histograms, error counters and cache lookups on :PROMETHEUS_PORT/metrics
+            prometheus_port=telemetry.PROMETHEUS_PORT,
+            prometheus_multiproc_dir=telemetry.PROMETHEUS_MULTIPROC_DIR,
         ),
     )
\ No newline at end of file
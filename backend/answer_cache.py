@@ -0,0 +1,210 @@
+# answer_cache.py – Semantic cache of speech-formatted answers keyed on the query embedding
+import os
+import time
+import sqlite3
+import logging
+import threading
+from collections import OrderedDict
+import numpy as np
+from dotenv import load_dotenv
+
+# ========== CONFIG ==========
+load_dotenv()
+
+# Cosine similarity a new query needs with a cached one to reuse its answer
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "3600"))
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "500"))
+# Shared by every job process on the host; each LiveKit job runs in a fresh
+# process, so without it every visitor would start from an empty cache. Set
+# it empty to keep answers in process memory only
+ANSWER_CACHE_PATH = os.getenv(
+    "ANSWER_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "answers.sqlite"),
+)
+
+logger = logging.getLogger("TekishoAnswerCache")
+
+
+class SemanticAnswerCache:
+    """
+    Answers keyed by (industry, response_type) and matched by cosine similarity
+    of the query embedding. Entries expire after `ttl` seconds, the oldest is
+    evicted past `max_entries`, and everything is dropped when the document
+    index version changes.
+
+    Lookups only touch memory. With a `path`, put() also writes the answer to a
+    SQLite table shared between processes and refresh() loads the answers other
+    processes wrote since the last call; both do disk I/O, so async callers run
+    them in a thread.
+    """
+
+    def __init__(self, threshold: float = ANSWER_CACHE_THRESHOLD, ttl: float = ANSWER_CACHE_TTL,
+                 max_entries: int = ANSWER_CACHE_MAX_ENTRIES, path: str = None):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.path = path or None
+        self._entries = OrderedDict()  # entry id -> (key, unit vector, answer, expires_at, cost_ms)
+        self._matrices = {}  # key -> (entry ids, stacked unit vectors), rebuilt lazily
+        self._next_id = 0
+        self._index_version = None
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._conn = None
+        self._loaded_id = 0  # highest stored row already in memory
+        self.loaded = 0
+        self.hits = 0
+        self.misses = 0
+        self.latency_saved_ms = 0.0
+
+    @staticmethod
+    def _key(industry: str, response_type: str) -> tuple:
+        return ((industry or "").strip().casefold(), response_type)
+
+    @staticmethod
+    def _unit(emb) -> np.ndarray:
+        vec = np.asarray(emb, dtype=np.float32)
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm else vec
+
+    def _matrix(self, key):
+        if key not in self._matrices:
+            ids = [entry_id for entry_id, entry in self._entries.items() if entry[0] == key]
+            vectors = np.stack([self._entries[entry_id][1] for entry_id in ids]) if ids else None
+            self._matrices[key] = (ids, vectors)
+        return self._matrices[key]
+
+    def _remove(self, entry_id):
+        entry = self._entries.pop(entry_id, None)
+        if entry is not None:
+            self._matrices.pop(entry[0], None)
+
+    def _insert(self, entry_id, key, vec, answer: str, expires_at: float, cost_ms: float):
+        self._entries[entry_id] = (key, vec, answer, expires_at, cost_ms)
+        self._matrices.pop(key, None)
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+
+    def _db(self):
+        if self._conn is None:
+            if self.path != ":memory:":
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS answers (id INTEGER PRIMARY KEY AUTOINCREMENT, index_version TEXT, "
+                "industry TEXT, response_type TEXT, vector BLOB, answer TEXT, expires_at REAL, cost_ms REAL)"
+            )
+        return self._conn
+
+    @property
+    def persistent(self) -> bool:
+        return self.path is not None
+
+    def check_index_version(self, version):
+        """Drop every answer if the document index was re-ingested since the last check."""
+        with self._lock:
+            if version != self._index_version:
+                if self._index_version is not None and self._entries:
+                    logger.info(f"Document index changed; dropping {len(self._entries)} cached answers")
+                self._entries.clear()
+                self._matrices.clear()
+                self._index_version = version
+                # Stored answers of the new version are loaded by the next refresh()
+                self._loaded_id = 0
+
+    def refresh(self, prune: bool = False):
+        """
+        Load the newest live answers stored for the current index version that
+        aren't in memory yet. With `prune`, first delete expired answers and
+        those of other index versions from the table.
+        """
+        if not self.persistent:
+            return
+        version = str(self._index_version)
+        with self._db_lock:
+            conn = self._db()
+            if prune:
+                conn.execute("DELETE FROM answers WHERE expires_at < ? OR index_version != ?", (time.time(), version))
+                conn.commit()
+            since = self._loaded_id
+            rows = conn.execute(
+                "SELECT id, industry, response_type, vector, answer, expires_at, cost_ms FROM answers "
+                "WHERE id > ? AND index_version = ? AND expires_at > ? ORDER BY id DESC LIMIT ?",
+                (since, version, time.time(), self.max_entries),
+            ).fetchall()
+        with self._lock:
+            if str(self._index_version) != version or self._loaded_id != since:
+                return  # the version changed or another refresh got there first
+            for row_id, industry, response_type, blob, answer, expires_at, cost_ms in reversed(rows):
+                if row_id not in self._entries:
+                    self._insert(row_id, (industry, response_type), np.frombuffer(blob, dtype=np.float32),
+                                 answer, expires_at, cost_ms)
+                    self.loaded += 1
+            if rows:
+                self._loaded_id = max(self._loaded_id, rows[0][0])
+
+    def lookup(self, emb, industry: str, response_type: str):
+        """Return (answer, similarity) for the closest cached query above the threshold, else None."""
+        start = time.perf_counter()
+        key = self._key(industry, response_type)
+        with self._lock:
+            ids, vectors = self._matrix(key)
+            if vectors is not None:
+                sims = vectors @ self._unit(emb)
+                best = int(np.argmax(sims))
+                entry = self._entries[ids[best]]
+                if sims[best] >= self.threshold:
+                    if entry[3] >= time.time():
+                        self.hits += 1
+                        self.latency_saved_ms += max(0.0, entry[4] - (time.perf_counter() - start) * 1000)
+                        return entry[2], float(sims[best])
+                    self._remove(ids[best])
+            self.misses += 1
+            return None
+
+    def put(self, emb, industry: str, response_type: str, answer: str, cost_ms: float = 0.0):
+        """Cache a formatted answer along with what it cost to produce (and store it, if persistent)."""
+        key = self._key(industry, response_type)
+        vec = self._unit(emb)
+        expires_at = time.time() + self.ttl
+        entry_id = None
+        if self.persistent:
+            with self._db_lock:
+                conn = self._db()
+                entry_id = conn.execute(
+                    "INSERT INTO answers (index_version, industry, response_type, vector, answer, expires_at, "
+                    "cost_ms) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (str(self._index_version), key[0], key[1], vec.tobytes(), answer, expires_at, cost_ms),
+                ).lastrowid
+                conn.commit()
+        with self._lock:
+            if entry_id is None:
+                # Memory only: negative ids never collide with stored rows
+                self._next_id -= 1
+                entry_id = self._next_id
+            self._insert(entry_id, key, vec, answer, expires_at, cost_ms)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._matrices.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "loaded": self.loaded,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "latency_saved_ms": round(self.latency_saved_ms, 1),
+        }
+
+    def close(self):
+        with self._db_lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
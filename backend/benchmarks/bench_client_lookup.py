@@ -0,0 +1,124 @@
+# bench_client_lookup.py – Regex scan vs. indexed normalized lookup on synthetic clients
+#
+# Needs a real mongod (indexes and query plans matter here, so no mocks):
+#   python benchmarks/bench_client_lookup.py --uri mongodb://localhost:27017 --count 1000000
+import os
+import sys
+import time
+import random
+import asyncio
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pymongo import AsyncMongoClient  # noqa: E402
+import client_lookup  # noqa: E402
+
+FIRST_NAMES = ["Anita", "Rahul", "Priya", "John", "Maria", "Wei", "Fatima", "Carlos", "Aisha", "Kenji",
+               "Sofia", "Arjun", "Emma", "Liam", "Noah", "Olivia", "Ravi", "Meera", "David", "Sara"]
+LAST_NAMES = ["Rao", "Sharma", "Patel", "Smith", "Garcia", "Chen", "Khan", "Lopez", "Ahmed", "Tanaka",
+              "Rossi", "Iyer", "Brown", "Wilson", "Singh", "Reddy", "Kumar", "Miller", "Nair", "Das"]
+WORDS = ["Green", "Dynamics", "Blue", "Ocean", "Quantum", "Apex", "Nova", "Bright", "Solutions", "Systems",
+         "Global", "Tech", "Logistics", "Health", "Finance", "Retail", "Energy", "Labs", "Digital", "Works"]
+SUFFIXES = ["Inc", "Pvt Ltd", "LLC", "Ltd", "Corp", "GmbH", ""]
+INDUSTRIES = ["Healthcare", "Finance", "Retail", "Manufacturing", "Logistics", "Energy"]
+
+
+def synthetic_client(i: int, rng: random.Random) -> dict:
+    name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+    company = f"{rng.choice(WORDS)} {rng.choice(WORDS)} {i}"
+    suffix = rng.choice(SUFFIXES)
+    doc = {
+        "company_name": f"{company} {suffix}".strip(),
+        "company_details": {"name": name, "email": f"user{i}@example.com", "phone": f"+1-555-{i:07d}"},
+        "ai_extracted_data": {"structured_data": {
+            "Industry": rng.choice(INDUSTRIES),
+            "Description/tagline": f"{company} builds things.",
+        }},
+    }
+    return client_lookup.with_lookup_keys(doc)
+
+
+async def populate(collection, count: int, rng: random.Random):
+    existing = await collection.estimated_document_count()
+    if existing >= count:
+        print(f"Reusing {existing} existing documents")
+        return
+    await collection.drop()
+    batch = []
+    start = time.perf_counter()
+    for i in range(count):
+        batch.append(synthetic_client(i, rng))
+        if len(batch) == 10000:
+            await collection.insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        await collection.insert_many(batch, ordered=False)
+    print(f"Inserted {count} clients in {time.perf_counter() - start:.1f}s")
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def report(label, samples_ms):
+    print(f"{label:<22} n={len(samples_ms):<5} p50={statistics.median(samples_ms):8.2f}ms "
+          f"p95={percentile(samples_ms, 95):8.2f}ms p99={percentile(samples_ms, 99):8.2f}ms")
+
+
+async def run(args):
+    rng = random.Random(42)
+    client = AsyncMongoClient(args.uri)
+    collection = client[args.db]["clients"]
+
+    await populate(collection, args.count, rng)
+    await client_lookup.ensure_indexes(collection)
+
+    # Queries spoken the way visitors say them: no legal suffix, mixed case
+    probes = []
+    async for doc in collection.aggregate([{"$sample": {"size": args.queries}}]):
+        company = " ".join(doc["company_name"].split()[:3])
+        probes.append((doc["company_details"]["name"].upper(), company.lower(), doc["_id"]))
+
+    regex_ms, indexed_ms, wrong = [], [], []
+    for name, company, expected_id in probes:
+        if not args.skip_regex:
+            start = time.perf_counter()
+            await collection.find_one({"$or": [
+                {"company_name": {"$regex": company, "$options": "i"}},
+                {"company_details.name": {"$regex": name, "$options": "i"}},
+            ]})
+            regex_ms.append((time.perf_counter() - start) * 1000)
+
+        start = time.perf_counter()
+        found = await client_lookup.find_client(name, company, collection=collection)
+        indexed_ms.append((time.perf_counter() - start) * 1000)
+        # Company names carry the client number, so each probe has exactly one right answer
+        if found is None or found["_id"] != expected_id:
+            wrong.append((name, company))
+
+    queries, _, _, _ = client_lookup.build_queries(*probes[0][:2])
+    plan = await collection.find(queries[0]).explain()
+    stages = str(plan.get("queryPlanner", {}).get("winningPlan", {}))
+    print(f"\nIndexed plan uses IXSCAN: {'IXSCAN' in stages}, COLLSCAN: {'COLLSCAN' in stages}")
+    print(f"Indexed lookup returned the probed client for {len(probes) - len(wrong)}/{len(probes)} probes")
+    for name, company in wrong[:5]:
+        print(f"  wrong or missing: {name} / {company}")
+    if regex_ms:
+        report("regex $or scan", regex_ms)
+    report("indexed lookup", indexed_ms)
+    await client.close()
+    if wrong:
+        raise SystemExit(f"{len(wrong)} probes returned the wrong client")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Regex scan vs. indexed client lookup")
+    parser.add_argument("--uri", default=os.getenv("BENCH_MONGO_URI", "mongodb://localhost:27017"))
+    parser.add_argument("--db", default="tekisho_bench")
+    parser.add_argument("--count", type=int, default=1_000_000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--skip-regex", action="store_true", help="only time the indexed path")
+    asyncio.run(run(parser.parse_args()))
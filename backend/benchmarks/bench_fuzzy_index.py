@@ -0,0 +1,188 @@
+# bench_fuzzy_index.py – Recall, precision and latency of the fuzzy client index
+#
+# Known visitors are spoken with STT-style misspellings; unknown visitors (a new
+# name, a new company, or one client's name with another's company) must not be
+# matched confidently. Runs without Mongo; --snapshot searches the saved,
+# memory-mapped index the agent's job processes use instead of the in-memory one:
+#   python benchmarks/bench_fuzzy_index.py --clients 20000 --queries 2000
+#   python benchmarks/bench_fuzzy_index.py --clients 20000 --queries 2000 --snapshot
+#
+# Measured with the defaults (synthetic names come from 20 first x 20 last names,
+# far denser than real ones, so these are pessimistic):
+#   clients  search p50 / p95 / p99      known accepted  precision  new name accepted
+#   5k       0.25 / 0.44 / 0.55 ms      0.71            0.999      0.03
+#   20k      0.31 / 0.60 / 0.81 ms      0.70            0.997      0.05
+#   100k     0.68 / 1.57 / 2.28 ms      0.69            0.984      0.12
+# Visitors not accepted fall back to the indexed Mongo lookup.
+import os
+import sys
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fuzzy_index  # noqa: E402
+from bench_client_lookup import synthetic_client, percentile, LAST_NAMES, WORDS  # noqa: E402
+
+# Sound-alike substitutions speech-to-text commonly produces
+PHONETIC_SWAPS = [("ph", "f"), ("f", "ph"), ("c", "k"), ("k", "c"), ("s", "z"), ("z", "s"),
+                  ("ee", "i"), ("i", "ee"), ("y", "i"), ("ou", "u"), ("th", "t"), ("v", "w")]
+
+# Visitors who aren't clients: first names and company words the synthetic clients never use
+UNKNOWN_FIRST_NAMES = ["Michael", "Hannah", "Yusuf", "Ingrid", "Mateo", "Chloe", "Omar", "Leila", "Pavel", "Zara"]
+UNKNOWN_WORDS = ["Acme", "Zenith", "Harbor", "Pinnacle", "Summit", "Vertex", "Crescent", "Meridian", "Atlas", "Falcon"]
+
+
+def misspell(text: str, rng: random.Random) -> str:
+    """Apply one or two STT-style errors to a word in the text."""
+    words = text.split()
+    for _ in range(rng.choice([1, 1, 2])):
+        i = rng.randrange(len(words))
+        word = words[i]
+        kind = rng.choice(["phonetic", "drop", "double", "swap", "vowel", "merge"])
+        if kind == "phonetic":
+            options = [(a, b) for a, b in PHONETIC_SWAPS if a in word.lower()]
+            if options:
+                a, b = rng.choice(options)
+                word = word.lower().replace(a, b, 1)
+        elif kind == "drop" and len(word) > 3:
+            j = rng.randrange(1, len(word))
+            word = word[:j] + word[j + 1:]
+        elif kind == "double":
+            j = rng.randrange(len(word))
+            word = word[:j] + word[j] + word[j:]
+        elif kind == "swap" and len(word) > 3:
+            j = rng.randrange(1, len(word) - 1)
+            word = word[:j] + word[j + 1] + word[j] + word[j + 2:]
+        elif kind == "vowel":
+            vowels = [j for j, ch in enumerate(word) if ch.lower() in "aeiou"]
+            if vowels:
+                j = rng.choice(vowels)
+                word = word[:j] + rng.choice("aeiou") + word[j + 1:]
+        elif kind == "merge" and i + 1 < len(words):
+            word = word + words.pop(i + 1)
+        words[i] = word
+    return " ".join(words)
+
+
+def spoken_company(doc: dict) -> str:
+    # Visitors rarely say the legal suffix or the synthetic serial number
+    return " ".join(doc["company_name"].split()[:2])
+
+
+def unknown_visitor(kind: str, docs: list, company_words: dict, rng: random.Random):
+    """
+    A (name, company) built the way `kind` says, sharing no company word with
+    any client of that name (synthetic companies reuse 20 words, so a shared
+    word or swapped order is close enough to be the same client). None when
+    the clients are too dense to build one.
+    """
+    for _ in range(1000):
+        doc, other = rng.choice(docs), rng.choice(docs)
+        if kind == "new name":
+            name = f"{rng.choice(UNKNOWN_FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+            company = spoken_company(doc)
+        elif kind == "new company":
+            name = doc["company_details"]["name"]
+            company = f"{rng.choice(UNKNOWN_WORDS)} {rng.choice(WORDS + UNKNOWN_WORDS)}"
+        elif kind == "both new":
+            name = f"{rng.choice(UNKNOWN_FIRST_NAMES)} {rng.choice(UNKNOWN_FIRST_NAMES + LAST_NAMES)}"
+            company = f"{rng.choice(UNKNOWN_WORDS)} {rng.choice(UNKNOWN_WORDS)}"
+        else:  # one client's name with another client's company
+            name = doc["company_details"]["name"]
+            company = spoken_company(other)
+        if not set(company.split()) & company_words.get(name, set()):
+            return name, company
+    return None
+
+
+def main(args):
+    rng = random.Random(7)
+    matcher = fuzzy_index.ClientMatcher()
+    docs = []
+    for i in range(args.clients):
+        doc = synthetic_client(i, rng)
+        doc["_id"] = i
+        docs.append(doc)
+    company_words = {}
+    for doc in docs:
+        company_words.setdefault(doc["company_details"]["name"], set()).update(spoken_company(doc).split())
+
+    start = time.perf_counter()
+    for doc in docs:
+        matcher.upsert(doc)
+    print(f"Indexed {len(matcher)} clients in {time.perf_counter() - start:.2f}s")
+    if args.snapshot:
+        path = tempfile.mkdtemp(prefix="tekisho-fuzzy-")
+        start = time.perf_counter()
+        matcher.save(path)
+        saved = time.perf_counter() - start
+        start = time.perf_counter()
+        matcher = fuzzy_index.ClientSnapshot(path)
+        print(f"Saved the snapshot in {saved:.2f}s, mapped it in {(time.perf_counter() - start) * 1000:.0f}ms")
+
+    hits_at_1 = hits_at_3 = accepted = accepted_right = 0
+    latencies = []
+    for _ in range(args.queries):
+        doc = rng.choice(docs)
+        name = misspell(doc["company_details"]["name"], rng)
+        company = spoken_company(doc)
+        company = misspell(company, rng) if rng.random() < 0.5 else company
+
+        start = time.perf_counter()
+        results = matcher.search(name, company, limit=3)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+        # Synthetic names repeat, so any client with the same name and company counts
+        def same(client_id):
+            other = docs[client_id]
+            return (other["company_details"]["name"], spoken_company(other)) == \
+                (doc["company_details"]["name"], spoken_company(doc))
+        ids = [client_id for client_id, _ in results]
+        hits_at_1 += bool(ids) and same(ids[0])
+        hits_at_3 += any(same(client_id) for client_id in ids)
+        if results and results[0][1] >= fuzzy_index.FUZZY_MIN_CONFIDENCE:
+            accepted += 1
+            accepted_right += same(ids[0])
+
+    n = args.queries
+    print(f"Known visitors (threshold {fuzzy_index.FUZZY_MIN_CONFIDENCE}, "
+          f"field floor {fuzzy_index.FUZZY_MIN_FIELD_SIMILARITY})")
+    print(f"  recall@1={hits_at_1 / n:.3f} recall@3={hits_at_3 / n:.3f} accepted={accepted / n:.3f} "
+          f"precision={accepted_right / max(accepted, 1):.3f}")
+
+    # Whatever the agent accepts for these is someone else's profile
+    print("Unknown visitors, confidently matched to a client (should be ~0)")
+    for kind in ("new name", "new company", "both new", "mixed clients"):
+        wrong = 0
+        for _ in range(args.unknown):
+            visitor = unknown_visitor(kind, docs, company_words, rng)
+            if visitor is None:
+                break
+            name, company = visitor
+            start = time.perf_counter()
+            results = matcher.search(name, company, limit=1)
+            latencies.append((time.perf_counter() - start) * 1000)
+            wrong += bool(results) and results[0][1] >= fuzzy_index.FUZZY_MIN_CONFIDENCE
+        if visitor is None:
+            print(f"  {kind:<14} n/a (every synthetic name has clients at every company word)")
+            continue
+        print(f"  {kind:<14} {wrong / args.unknown:.3f}")
+
+    print(f"latency p50={statistics.median(latencies):.3f}ms p95={percentile(latencies, 95):.3f}ms "
+          f"p99={percentile(latencies, 99):.3f}ms")
+    if args.snapshot:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fuzzy client index recall/precision/latency benchmark")
+    parser.add_argument("--clients", type=int, default=5000)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--unknown", type=int, default=500, help="queries per kind of unknown visitor")
+    parser.add_argument("--snapshot", action="store_true", help="search the saved snapshot, as job processes do")
+    main(parser.parse_args())
@@ -0,0 +1,120 @@
+# bench_greetings.py – Greeting batch job throughput and live greeting latency, stored vs generated
+#
+# Same offline stand-ins and fixtures as bench_hot_path.py. Runs greetings.precompute
+# over the synthetic clients, re-runs it (nothing should regenerate), changes a
+# few profiles (only those should), then times rag.aget_personalized_greeting
+# for clients with and without a stored greeting:
+#   python benchmarks/bench_greetings.py --clients 200 --concurrency 4 16 32
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import asyncio
+import argparse
+import logging
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_hot_path import (SCRATCH_DIR, CORPUS_PATH, KNOWN_VISITORS, install_standins,  # noqa: E402
+                            populate_clients)
+from bench_client_lookup import percentile  # noqa: E402
+import client_lookup  # noqa: E402
+import db  # noqa: E402
+import greetings  # noqa: E402
+import rag  # noqa: E402
+
+
+async def time_greetings(visitors: list, repeats: int) -> list:
+    samples = []
+    for _ in range(repeats):
+        for visitor in visitors:
+            start = time.perf_counter()
+            await rag.aget_personalized_greeting(visitor["name"], visitor["company"])
+            samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def latency_line(label: str, samples: list) -> str:
+    return (f"  {label:<30} p50={percentile(samples, 50):8.2f}ms p95={percentile(samples, 95):8.2f}ms "
+            f"p99={percentile(samples, 99):8.2f}ms")
+
+
+async def run(args):
+    with open(args.corpus, "r", encoding="utf-8") as f:
+        corpus = json.load(f)
+    rng = random.Random(args.seed)
+    install_standins(args)
+    collection = db.get_collection()
+    await populate_clients(collection, corpus, args.clients, rng)
+    total = await collection.count_documents({})
+
+    print(f"Batch over {total} clients (chat {args.chat_ttft_ms:.0f}ms + {args.chat_token_ms:.0f}ms/token)")
+    for concurrency in args.concurrency:
+        start = time.perf_counter()
+        counts = await greetings.precompute(collection, force=True, concurrency=concurrency)
+        wall = time.perf_counter() - start
+        print(f"  concurrency={concurrency:<4} {counts['generated']} generated in {wall:6.1f}s "
+              f"({counts['generated'] / wall:6.1f} greetings/s), failed={counts['failed']}")
+
+    start = time.perf_counter()
+    counts = await greetings.precompute(collection)
+    print(f"  re-run: {dict(counts)} in {time.perf_counter() - start:.2f}s")
+
+    changed = corpus[:args.changed]
+    for visitor in changed:
+        await collection.update_one(
+            {f"{client_lookup.LOOKUP_FIELD}.company": " ".join(client_lookup.company_tokens(visitor["company"]))},
+            {"$set": {"ai_extracted_data.structured_data.Description/tagline": "A new tagline from a rescan."}},
+        )
+    counts = await greetings.precompute(collection)
+    print(f"  after changing {len(changed)} profiles: {dict(counts)}")
+
+    known = corpus[:KNOWN_VISITORS]
+    stored = await time_greetings(known, args.repeats)
+    await collection.update_many({}, {"$unset": {rag.GREETING_FIELD: ""}})
+    generated = await time_greetings(known, args.repeats)
+    print("\nLive greeting (rag.aget_personalized_greeting)")
+    print(latency_line("stored greeting", stored))
+    print(latency_line("generated on the call", generated))
+
+    await rag.aclose()
+    await db.aclose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Greeting precomputation and live greeting latency")
+    parser.add_argument("--corpus", default=CORPUS_PATH)
+    parser.add_argument("--clients", type=int, default=100, help="synthetic clients besides the corpus visitors")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[4, 16, 32])
+    parser.add_argument("--changed", type=int, default=5, help="profiles changed before the incremental run")
+    parser.add_argument("--repeats", type=int, default=5, help="live greetings per known visitor")
+    parser.add_argument("--kb-size", type=int, default=120)
+    parser.add_argument("--embed-ms", type=float, default=60.0)
+    parser.add_argument("--chat-ttft-ms", type=float, default=600.0, help="gpt-4o is slower to first token")
+    parser.add_argument("--chat-token-ms", type=float, default=12.0)
+    parser.add_argument("--pinecone-ms", type=float, default=35.0)
+    parser.add_argument("--mongo-ms", type=float, default=3.0)
+    parser.add_argument("--jitter", type=float, default=0.2)
+    parser.add_argument("--mongo-uri", help="use this mongod instead of mongomock")
+    parser.add_argument("--mongo-db", default="tekisho_bench_greetings")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+    # Fixed for this benchmark; install_standins reads them
+    args.answer_cache = False
+    args.prefetch = False
+    args.memory_caches = False
+    args.draft_answers = False
+
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+    try:
+        asyncio.run(run(args))
+    finally:
+        shutil.rmtree(SCRATCH_DIR, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,442 @@
+# bench_hot_path.py – Offline latency benchmark of the agent's RAG and tool-call hot path
+#
+# Replays visitor turns (search_client_in_database, query_rag,
+# get_tekisho_solutions with speech normalization) at a fixed concurrency
+# against local stand-ins for OpenAI, Pinecone and MongoDB (see standins.py),
+# over a synthetic knowledge base ingested by the real pipeline. Needs no
+# network or API keys. Reports p50/p95/p99 per stage and throughput, and
+# writes them as JSON for comparing versions (the stand-ins need the benchmark
+# requirements: pip install -r benchmarks/requirements.txt):
+#   python benchmarks/bench_hot_path.py --requests 500 --concurrency 8 --out before.json
+#   python benchmarks/bench_hot_path.py --requests 500 --concurrency 8 --out after.json --compare before.json
+#   python benchmarks/bench_hot_path.py --streaming --mongo-uri mongodb://localhost:27017
+#   python benchmarks/bench_hot_path.py --prefetch --think-ms 1500 --compare no_prefetch.json
+#   python benchmarks/bench_hot_path.py --prefetch --draft-answers --think-ms 1500 --compare prefetch.json
+# --single-use runs every turn as a new job process would (LiveKit starts one per
+# session), so only what outlives a process can serve repeat visitors:
+#   python benchmarks/bench_hot_path.py --answer-cache --single-use
+#   python benchmarks/bench_hot_path.py --answer-cache --single-use --memory-caches
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import asyncio
+import argparse
+import platform
+import tempfile
+import subprocess
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+# Every cache and index of the run lives in a scratch dir; set before rag is imported
+SCRATCH_DIR = tempfile.mkdtemp(prefix="tekisho-hot-path-")
+for _var, _name in (("EMBED_CACHE_PATH", "embeddings.sqlite"), ("INGEST_MANIFEST_PATH", "manifest.json"),
+                    ("BM25_INDEX_PATH", "bm25.json"), ("LOCAL_INDEX_DIR", "vectors"),
+                    ("INTENT_CENTROIDS_PATH", "intent_centroids.json"), ("ANSWER_CACHE_PATH", "answers.sqlite"),
+                    ("PROFILE_CACHE_PATH", "profiles.sqlite")):
+    os.environ[_var] = os.path.join(SCRATCH_DIR, _name)
+
+import logging  # noqa: E402
+import mongomock  # noqa: E402
+from pymongo import AsyncMongoClient  # noqa: E402
+
+import agent  # noqa: E402
+import client_lookup  # noqa: E402
+import db  # noqa: E402
+import intent_router  # noqa: E402
+import prefetch  # noqa: E402
+import profile_cache  # noqa: E402
+import rag  # noqa: E402
+from answer_cache import SemanticAnswerCache  # noqa: E402
+from local_index import LocalVectorIndex  # noqa: E402
+from profile_cache import ProfileCache  # noqa: E402
+from speech import normalize_for_speech  # noqa: E402
+from bench_client_lookup import percentile, synthetic_client  # noqa: E402
+from standins import (Latency, StandInOpenAI, StandInAsyncOpenAI, StandInIndex, StandInAsyncIndex,  # noqa: E402
+                      StandInMongoClient, fake_embedding)
+
+CORPUS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "visitor_queries.json")
+# Visitors from the corpus stored as clients; the rest exercise the not-found path
+KNOWN_VISITORS = 20
+
+SERVICE_AREAS = ["Document Intelligence", "Conversational AI", "Computer Vision", "Predictive Maintenance",
+                 "Demand Forecasting", "Process Automation", "Fraud Detection", "Voice Assistants",
+                 "Knowledge Search", "Data Engineering", "Route Optimization", "Claims Automation"]
+INDUSTRIES = ["Healthcare", "Finance", "Retail", "Manufacturing", "Logistics", "Energy", "Insurance", "Legal"]
+TECHNOLOGIES = ["LLMs", "OCR", "RAG", "time-series models", "vision transformers", "speech recognition",
+                "knowledge graphs", "workflow engines"]
+OUTCOMES = ["150-200% ROI", "25-40% cost savings", "3x faster processing", "50-80% productivity improvement",
+            "$1.2M annual savings", "90% fewer manual errors", "6-8 weeks to production"]
+
+
+# ========== FIXTURES ==========
+
+def write_knowledge_base(docs_dir: str, size: int, rng: random.Random):
+    """Services catalog and use case library in the shape of Rag_docs."""
+    services = [{
+        "service_name": f"{area} {i}",
+        "description": f"Tekisho {area.lower()} for {rng.choice(INDUSTRIES).lower()} teams, built on "
+                       f"{rng.choice(TECHNOLOGIES)} and {rng.choice(TECHNOLOGIES)}.",
+        "capabilities": [f"{rng.choice(['Automates', 'Speeds up', 'Monitors', 'Predicts'])} "
+                         f"{rng.choice(['invoices', 'claims', 'tickets', 'shipments', 'inspections', 'contracts'])}"
+                         for _ in range(3)],
+        "industries": rng.sample(INDUSTRIES, 3),
+        "technologies": rng.sample(TECHNOLOGIES, 2),
+    } for i, area in ((i, rng.choice(SERVICE_AREAS)) for i in range(size))]
+    use_cases = [{
+        "use_case_name": f"{area} for a {industry.lower()} client {i}",
+        "industry": industry,
+        "challenge": f"The client handled {rng.choice(['invoices', 'claims', 'orders', 'reports'])} manually "
+                     f"and lost {rng.randint(10, 40)}% of staff time to it.",
+        "solution": f"Tekisho deployed {area.lower()} using {rng.choice(TECHNOLOGIES)}.",
+        "results": {"impact": rng.sample(OUTCOMES, 3), "implementation_time": f"{rng.randint(4, 12)} weeks"},
+    } for i, area, industry in ((i, rng.choice(SERVICE_AREAS), rng.choice(INDUSTRIES)) for i in range(size))]
+
+    os.makedirs(docs_dir, exist_ok=True)
+    with open(os.path.join(docs_dir, "services_catalog.json"), "w", encoding="utf-8") as f:
+        json.dump({"title": "Tekisho Services", "services": services}, f)
+    with open(os.path.join(docs_dir, "use_cases_library.json"), "w", encoding="utf-8") as f:
+        json.dump({"title": "Tekisho Use Cases", "use_cases": use_cases}, f)
+
+
+def visitor_client(visitor: dict) -> dict:
+    return client_lookup.with_lookup_keys({
+        "company_name": visitor["company"],
+        "company_details": {"name": visitor["name"], "email": "", "phone": ""},
+        "ai_extracted_data": {"structured_data": {
+            "Industry": visitor["industry"],
+            "Description/tagline": f"{visitor['company']} is a {visitor['industry'].lower()} company.",
+        }},
+    })
+
+
+async def populate_clients(collection, corpus: list, filler: int, rng: random.Random):
+    await collection.delete_many({})
+    docs = [visitor_client(visitor) for visitor in corpus[:KNOWN_VISITORS]]
+    docs.extend(synthetic_client(i, rng) for i in range(filler))
+    await collection.insert_many(docs)
+    await client_lookup.ensure_indexes(collection)
+
+
+def install_standins(args):
+    """Point rag and db at the stand-ins, then ingest the synthetic knowledge base."""
+    def latency(ms, seed):
+        return Latency(ms, args.jitter, seed=args.seed + seed)
+
+    rag.openai_client = StandInOpenAI(latency(args.embed_ms, 1), latency(args.chat_ttft_ms, 2),
+                                      args.chat_token_ms, rag.EMBED_DIM)
+    rag._async_openai_client = StandInAsyncOpenAI(latency(args.embed_ms, 3), latency(args.chat_ttft_ms, 4),
+                                                  args.chat_token_ms, rag.EMBED_DIM)
+    vectors = LocalVectorIndex(os.environ["LOCAL_INDEX_DIR"], rag.EMBED_DIM)
+    rag.index = StandInIndex(vectors, latency(args.pinecone_ms, 5))
+    rag._async_index = StandInAsyncIndex(vectors, latency(args.pinecone_ms, 6))
+
+    rag.DOCS_DIR = os.path.join(SCRATCH_DIR, "Rag_docs")
+    write_knowledge_base(rag.DOCS_DIR, args.kb_size, random.Random(args.seed))
+    rag.load_and_upsert_documents()
+    rag.init()
+
+    # Centroids from the seed queries, so routing runs as it would when trained
+    rag.get_intent_router().set_centroids(intent_router.train_centroids(
+        (fake_embedding(query, rag.EMBED_DIM), intent) for query, intent, _ in intent_router.labeled_examples()
+    ))
+    if args.memory_caches:
+        rag.answer_cache = SemanticAnswerCache()
+        profile_cache.cache = ProfileCache()
+    if not args.answer_cache:
+        # Cosine similarity never exceeds 1, so every turn runs retrieval and generation
+        rag.answer_cache.threshold = 2.0
+    # Speculation only when asked for; otherwise it would add unmeasured load
+    prefetch.PREFETCH_ENABLED = args.prefetch
+    prefetch.PREFETCH_DRAFT_ANSWERS = args.draft_answers
+
+    if args.mongo_uri:
+        db.DB_NAME = args.mongo_db
+        db._client = AsyncMongoClient(args.mongo_uri)
+    else:
+        db._client = StandInMongoClient(mongomock.MongoClient(), latency(args.mongo_ms, 7))
+
+
+# ========== MEASUREMENT ==========
+
+class StageRecorder:
+    """Latency samples (ms) and error counts per named stage."""
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self.errors = Counter()
+        self.enabled = True
+        self.prefetch = Counter()  # prefetch cache hits/misses summed over sessions
+        self.answer = Counter()  # answer cache stats summed over --single-use job processes
+        self.profile = Counter()  # likewise for the profile cache
+
+    def add(self, stage: str, ms: float):
+        if self.enabled:
+            self.samples[stage].append(ms)
+
+    @contextmanager
+    def timed(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            if self.enabled:
+                self.errors[stage] += 1
+            raise
+        finally:
+            self.add(stage, (time.perf_counter() - start) * 1000)
+
+    def summary(self) -> dict:
+        return {stage: {
+            "n": len(samples),
+            "p50_ms": round(percentile(samples, 50), 3),
+            "p95_ms": round(percentile(samples, 95), 3),
+            "p99_ms": round(percentile(samples, 99), 3),
+            "mean_ms": round(sum(samples) / len(samples), 3),
+            "errors": self.errors.get(stage, 0),
+        } for stage, samples in sorted(self.samples.items())}
+
+
+async def run_turn(visitor: dict, assistant, recorder: StageRecorder, streaming: bool, think_ms: float = 0.0):
+    """One visitor turn: identify the visitor, then (after they speak) answer their challenge."""
+    # With --prefetch each turn is a fresh session whose prefetch the answer may use
+    session = assistant.prefetch if prefetch.PREFETCH_ENABLED else None
+    def formatter(text, context=""):
+        with recorder.timed("normalize_for_speech"):
+            return normalize_for_speech(text, context)
+
+    with recorder.timed("turn"):
+        with recorder.timed("search_client_in_database"):
+            await assistant.search_client_in_database(visitor["name"], visitor["company"])
+        if think_ms:
+            await asyncio.sleep(think_ms / 1000)
+        with recorder.timed("query_rag"):
+            await rag.aquery_rag(visitor["challenge"], top_k=5)
+        with recorder.timed("get_tekisho_solutions"):
+            if streaming:
+                start = time.perf_counter()
+                pieces = agent.SpeechChunker(formatter=formatter).stream(rag.astream_tekisho_solutions(
+                    challenge=visitor["challenge"], industry=visitor["industry"], formatter=formatter,
+                    session=session
+                ))
+                first = True
+                async for _ in pieces:
+                    if first:
+                        recorder.add("first_speech", (time.perf_counter() - start) * 1000)
+                        first = False
+            else:
+                await rag.aget_tekisho_solutions(
+                    challenge=visitor["challenge"], industry=visitor["industry"], formatter=formatter,
+                    session=session
+                )
+    if session is not None:
+        await session.aclose()
+        recorder.prefetch["pool_hits"] += session.pool_hits
+        recorder.prefetch["pool_misses"] += session.pool_misses
+        recorder.prefetch["answer_hits"] += session.answers.hits
+        recorder.prefetch["answer_misses"] += session.answers.misses
+
+
+def start_job_process(recorder: StageRecorder):
+    """Reset the per-process state a new job process starts without, as rag.init() would load it."""
+    old = rag.answer_cache
+    recorder.answer.update({key: value for key, value in old.stats().items() if key in ("hits", "misses", "loaded")})
+    old.close()
+    rag.answer_cache = SemanticAnswerCache(threshold=old.threshold, ttl=old.ttl, max_entries=old.max_entries,
+                                           path=old.path)
+    rag.answer_cache.check_index_version(rag.index_version())
+    rag.answer_cache.refresh(prune=True)
+
+    old = profile_cache.cache
+    recorder.profile.update({"hits": old.hits, "misses": old.misses})
+    old.close()
+    profile_cache.cache = ProfileCache(max_entries=old.max_entries, ttl=old.ttl,
+                                       path=old.path if old.persistent else None)
+
+
+async def replay(corpus: list, requests: int, concurrency: int, recorder: StageRecorder, streaming: bool,
+                 rng: random.Random, think_ms: float = 0.0, single_use: bool = False) -> float:
+    """Run `requests` turns drawn from the corpus, `concurrency` at a time; return wall seconds."""
+    queue = asyncio.Queue()
+    for _ in range(requests):
+        queue.put_nowait(rng.choice(corpus))
+
+    async def worker():
+        # One agent per concurrent session, as in the worker
+        assistant = agent.Assistant()
+        while not queue.empty():
+            visitor = queue.get_nowait()
+            if single_use:
+                start_job_process(recorder)
+            if prefetch.PREFETCH_ENABLED or single_use:
+                assistant = agent.Assistant()
+            try:
+                await run_turn(visitor, assistant, recorder, streaming, think_ms)
+            except Exception as e:
+                print(f"turn failed: {e!r}")
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return time.perf_counter() - start
+
+
+def git_version() -> str:
+    try:
+        return subprocess.run(["git", "describe", "--always", "--dirty"], cwd=BACKEND_DIR,
+                              capture_output=True, text=True, timeout=10).stdout.strip() or "unknown"
+    except Exception:
+        return "unknown"
+
+
+def compare(current: dict, baseline: dict, threshold: float):
+    """Print per-stage p50/p95/p99 changes against a saved run, flagging regressions."""
+    print(f"\nvs. {baseline.get('version', '?')} ({baseline.get('timestamp', '?')})")
+    for stage, stats in current["stages"].items():
+        before = baseline.get("stages", {}).get(stage)
+        if not before:
+            continue
+        changes = []
+        regressed = False
+        for key in ("p50_ms", "p95_ms", "p99_ms"):
+            delta = (stats[key] - before[key]) / before[key] if before[key] else 0.0
+            regressed |= delta > threshold
+            changes.append(f"{key[:3]} {delta:+.1%}")
+        print(f"  {stage:<26} {'  '.join(changes)}{'  REGRESSION' if regressed else ''}")
+    before_rps = baseline.get("throughput_rps")
+    if before_rps:
+        print(f"  {'throughput':<26} {(current['throughput_rps'] - before_rps) / before_rps:+.1%}")
+
+
+def report(result: dict):
+    print(f"\n{result['requests']} turns at concurrency {result['concurrency']}: "
+          f"{result['throughput_rps']:.1f} turns/s over {result['wall_seconds']:.1f}s")
+    for stage, stats in result["stages"].items():
+        print(f"  {stage:<26} n={stats['n']:<6} p50={stats['p50_ms']:8.2f}ms p95={stats['p95_ms']:8.2f}ms "
+              f"p99={stats['p99_ms']:8.2f}ms errors={stats['errors']}")
+    print(f"  caches: {json.dumps(result['caches'])}")
+
+
+async def run(args):
+    with open(args.corpus, "r", encoding="utf-8") as f:
+        corpus = json.load(f)
+    rng = random.Random(args.seed)
+
+    install_standins(args)
+    await populate_clients(db.get_collection(), corpus, args.clients, rng)
+
+    recorder = StageRecorder()
+    # rag reports embed/route/retrieve/generate per solutions call through _log_timings
+    log_timings = rag._log_timings
+
+    def record_timings(label, timings):
+        for stage, ms in timings.items():
+            recorder.add(f"rag.{stage}", ms)
+        log_timings(label, timings)
+    rag._log_timings = record_timings
+
+    if args.warmup:
+        recorder.enabled = False
+        await replay(corpus, args.warmup, args.concurrency, recorder, args.streaming, rng, args.think_ms,
+                     args.single_use)
+        recorder.enabled = True
+        recorder.prefetch.clear()
+        recorder.answer.clear()
+        recorder.profile.clear()
+        rag.answer_cache.hits = rag.answer_cache.misses = rag.answer_cache.loaded = 0
+        profile_cache.cache.hits = profile_cache.cache.misses = 0
+    wall = await replay(corpus, args.requests, args.concurrency, recorder, args.streaming, rng, args.think_ms,
+                        args.single_use)
+    if args.single_use:
+        start_job_process(recorder)
+        answer_stats = dict(recorder.answer)
+        lookups = answer_stats.get("hits", 0) + answer_stats.get("misses", 0)
+        answer_stats["hit_rate"] = round(answer_stats.get("hits", 0) / lookups, 4) if lookups else 0.0
+        profile_stats = dict(recorder.profile)
+    else:
+        answer_stats = rag.answer_cache.stats()
+        profile_stats = {"hits": profile_cache.cache.hits, "misses": profile_cache.cache.misses}
+
+    result = {
+        "version": git_version(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "config": {key: value for key, value in vars(args).items() if key not in ("out", "compare")},
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "wall_seconds": round(wall, 3),
+        "throughput_rps": round(args.requests / wall, 3),
+        "stages": recorder.summary(),
+        "caches": {
+            "embedding": rag.embedding_cache.stats(),
+            "answer": answer_stats,
+            "profile": profile_stats,
+            "intent_router": rag.get_intent_router().stats(),
+            "prefetch": dict(recorder.prefetch),
+        },
+    }
+    report(result)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+        print(f"Wrote {args.out}")
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            compare(result, json.load(f), args.regression_threshold)
+    await rag.aclose()
+    await db.aclose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline latency benchmark of the RAG and tool-call hot path")
+    parser.add_argument("--corpus", default=CORPUS_PATH, help="JSON list of {name, company, industry, challenge}")
+    parser.add_argument("--requests", type=int, default=200, help="turns measured")
+    parser.add_argument("--warmup", type=int, default=20, help="turns run before measuring")
+    parser.add_argument("--concurrency", type=int, default=4, help="sessions replaying turns at once")
+    parser.add_argument("--streaming", action="store_true", help="stream answers as the agent does with RAG_STREAMING")
+    parser.add_argument("--answer-cache", action="store_true", help="let repeated questions hit the answer cache")
+    parser.add_argument("--prefetch", action="store_true",
+                        help="one session per turn, with the industry prefetch started on identification")
+    parser.add_argument("--draft-answers", action="store_true",
+                        help="with --prefetch, also draft answers to the likely questions")
+    parser.add_argument("--single-use", action="store_true",
+                        help="each turn in a fresh job process, one at a time (caches start from what is stored)")
+    parser.add_argument("--memory-caches", action="store_true",
+                        help="keep answers and profiles in process memory only, as before the shared stores")
+    parser.add_argument("--think-ms", type=float, default=0.0,
+                        help="pause between identification and the question (the visitor talking)")
+    parser.add_argument("--kb-size", type=int, default=120, help="services and use cases in the knowledge base")
+    parser.add_argument("--clients", type=int, default=1000,
+                        help="synthetic clients besides the corpus visitors (mongomock scans, so keep it modest)")
+    parser.add_argument("--embed-ms", type=float, default=60.0)
+    parser.add_argument("--chat-ttft-ms", type=float, default=400.0, help="time to the first completion token")
+    parser.add_argument("--chat-token-ms", type=float, default=8.0, help="time per further completion token")
+    parser.add_argument("--pinecone-ms", type=float, default=35.0)
+    parser.add_argument("--mongo-ms", type=float, default=3.0)
+    parser.add_argument("--jitter", type=float, default=0.2, help="+/- fraction of each simulated latency")
+    parser.add_argument("--mongo-uri", help="use this mongod instead of mongomock")
+    parser.add_argument("--mongo-db", default="tekisho_bench_hot_path")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--out", help="write results as JSON here")
+    parser.add_argument("--compare", help="results JSON of a previous run to compare against")
+    parser.add_argument("--regression-threshold", type=float, default=0.10, help="flag stages slower by this fraction")
+    parser.add_argument("--verbose", action="store_true", help="keep the backend's INFO logs")
+    args = parser.parse_args()
+
+    if args.single_use:
+        args.concurrency = 1
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+    try:
+        asyncio.run(run(args))
+    finally:
+        shutil.rmtree(SCRATCH_DIR, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
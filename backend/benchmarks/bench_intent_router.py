@@ -0,0 +1,68 @@
+# bench_intent_router.py – Routing accuracy and latency of the embedding intent router vs. keywords
+#
+# Evaluates leave-one-out over the seed queries plus an optional labeled file
+# (same format as `python intent_router.py --labeled`), in the industry-expanded
+# form the agent routes; every phrasing of the held-out query is left out. Needs OpenAI access for
+# the query embeddings (cached after the first run):
+#   python benchmarks/bench_intent_router.py --labeled labeled_queries.json --margins 0 0.02 0.03 0.05
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import rag  # noqa: E402
+from intent_router import IntentRouter, labeled_examples, train_centroids  # noqa: E402
+from bench_client_lookup import percentile  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate the embedding intent router")
+    parser.add_argument("--labeled", help='JSON list of {"query": ..., "intent": ...}')
+    parser.add_argument("--margins", type=float, nargs="+", default=[0.0, 0.02, 0.03, 0.05])
+    args = parser.parse_args()
+
+    labeled = labeled_examples(args.labeled)
+    embedded = [(query, intent, source, rag.get_openai_embedding(query)) for query, intent, source in labeled]
+    embedded = [item for item in embedded if item[3] is not None]
+    print(f"{len(embedded)} routing queries from {len({item[2] for item in embedded})} labeled queries")
+
+    # The keyword check the router replaces, on the same (already enhanced) queries
+    correct = sum(rag._plan_solutions_query(query)[3] == intent for query, intent, _, _ in embedded)
+    print(f"keywords        accuracy={correct / len(embedded):.3f}  (always 2 retrieval queries)")
+
+    for margin in args.margins:
+        confident = correct = confident_correct = 0
+        latencies = []
+        routers = {}
+        for query, intent, source, emb in embedded:
+            router = routers.get(source)
+            if router is None:
+                router = routers[source] = IntentRouter(path=os.devnull, min_margin=margin)
+                router.set_centroids(train_centroids(
+                    (other_emb, other_intent) for _, other_intent, other_source, other_emb in embedded
+                    if other_source != source
+                ))
+            start = time.perf_counter()
+            routed = router.route(emb)
+            latencies.append((time.perf_counter() - start) * 1e6)
+            if routed is None:
+                # Dual query: the keyword plan picks the answer style
+                correct += rag._plan_solutions_query(query)[3] == intent
+                continue
+            confident += 1
+            correct += routed[0] == intent
+            confident_correct += routed[0] == intent
+        total = len(embedded)
+        queries_per_request = (confident + 2 * (total - confident)) / total
+        print(
+            f"margin={margin:<6} accuracy={correct / total:.3f}  confident={confident / total:.3f}  "
+            f"confident_accuracy={confident_correct / max(confident, 1):.3f}  "
+            f"retrieval_queries={queries_per_request:.2f}/request  "
+            f"route p50={percentile(latencies, 50):.1f}us p99={percentile(latencies, 99):.1f}us"
+        )
+
+
+if __name__ == "__main__":
+    main()
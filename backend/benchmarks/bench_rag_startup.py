@@ -0,0 +1,125 @@
+# bench_rag_startup.py – Time importing rag and initializing its clients/index
+#
+# Each measurement runs in a fresh interpreter so module caches don't hide the
+# cost a new worker process pays:
+#   python benchmarks/bench_rag_startup.py --runs 5
+#
+# --first-query instead checks that init() left nothing for the first solutions
+# question to load (tokenizer, clients, indexes, caches): a fresh process runs
+# init(), then two questions against the offline stand-ins of bench_hot_path.py,
+# and exits non-zero if the first one loaded anything:
+#   python benchmarks/bench_rag_startup.py --first-query
+import os
+import sys
+import json
+import shutil
+import random
+import argparse
+import statistics
+import subprocess
+from types import SimpleNamespace
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Imports rag, then calls init(), and prints both timings as JSON
+PROBE = """
+import json, time
+start = time.perf_counter()
+import rag
+imported = time.perf_counter()
+rag.init()
+ready = time.perf_counter()
+print(json.dumps({"import_ms": (imported - start) * 1000, "init_ms": (ready - imported) * 1000}))
+"""
+
+# Runs init(), swaps in the offline OpenAI stand-ins (the clients init() created
+# are replaced, not created), then times two questions and lists what the first
+# one loaded: tokenizer fetches and rag/doc_chunker globals that were still None
+FIRST_QUERY_PROBE = """
+import sys, json, time, asyncio
+sys.path.insert(0, "benchmarks")
+import tiktoken
+import rag
+import doc_chunker
+from standins import Latency, StandInOpenAI, StandInAsyncOpenAI
+
+rag.init()
+rag.openai_client = StandInOpenAI(Latency(20), Latency(50), 1.0, rag.EMBED_DIM)
+rag._async_openai_client = StandInAsyncOpenAI(Latency(20), Latency(50), 1.0, rag.EMBED_DIM)
+
+loads = []
+get_encoding = tiktoken.get_encoding
+def recording_get_encoding(name):
+    loads.append(f"tiktoken.get_encoding({name!r})")
+    return get_encoding(name)
+tiktoken.get_encoding = recording_get_encoding
+unset = {module: [name for name, value in vars(module).items() if value is None] for module in (rag, doc_chunker)}
+
+async def ask(visitor):
+    start = time.perf_counter()
+    await rag.aget_tekisho_solutions(challenge=visitor["challenge"], industry=visitor["industry"])
+    return (time.perf_counter() - start) * 1000
+
+first_visitor, second_visitor = json.loads(sys.argv[1])
+first_ms = asyncio.run(ask(first_visitor))
+loads += [f"{module.__name__}.{name}" for module, names in unset.items()
+          for name in names if getattr(module, name) is not None]
+second_ms = asyncio.run(ask(second_visitor))
+print(json.dumps({"lazy_loads": loads, "first_ms": first_ms, "second_ms": second_ms}))
+"""
+
+
+def measure_once() -> dict:
+    result = subprocess.run(
+        [sys.executable, "-c", PROBE], cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def check_first_query(seed: int) -> list:
+    """Ingest the synthetic knowledge base, then run FIRST_QUERY_PROBE in a fresh process; returns its loads."""
+    # The probe reads the ingested vectors from disk, so ingest into the local backend
+    os.environ["VECTOR_BACKEND"] = "local"
+    os.environ.setdefault("OPENAI_API_KEY", "offline-stand-in")
+    from bench_hot_path import SCRATCH_DIR, CORPUS_PATH, install_standins
+
+    try:
+        install_standins(SimpleNamespace(jitter=0.0, seed=seed, embed_ms=0.0, chat_ttft_ms=0.0, chat_token_ms=0.0,
+                                         pinecone_ms=0.0, kb_size=60, memory_caches=False, answer_cache=False,
+                                         prefetch=False, draft_answers=False, mongo_uri=None, mongo_ms=0.0))
+        with open(CORPUS_PATH, "r", encoding="utf-8") as f:
+            visitors = random.Random(seed).sample(json.load(f), 2)
+        result = subprocess.run(
+            [sys.executable, "-c", FIRST_QUERY_PROBE, json.dumps(visitors)],
+            cwd=BACKEND_DIR, capture_output=True, text=True, check=True, env=os.environ.copy(),
+        )
+    finally:
+        shutil.rmtree(SCRATCH_DIR, ignore_errors=True)
+    run = json.loads(result.stdout.strip().splitlines()[-1])
+    print(f"first question  {run['first_ms']:8.1f}ms")
+    print(f"second question {run['second_ms']:8.1f}ms")
+    print(f"loaded by the first question: {', '.join(run['lazy_loads']) or 'nothing'}")
+    return run["lazy_loads"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time rag import and init() in fresh processes")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--first-query", action="store_true",
+                        help="check that the first question after init() loads nothing")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    if args.first_query:
+        if check_first_query(args.seed):
+            raise SystemExit("the first question still loads state init() should have")
+        return
+
+    runs = [measure_once() for _ in range(args.runs)]
+    for key in ("import_ms", "init_ms"):
+        values = [run[key] for run in runs]
+        print(f"{key:10s} median {statistics.median(values):8.1f}  min {min(values):8.1f}  max {max(values):8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+# bench_retrieval.py – Recall@k and latency of vector-only vs. hybrid (BM25 + vector) retrieval
+#
+# Needs an ingested index (python rag.py) and OpenAI access for query embeddings
+# (cached after the first run). Queries come from a JSON file of
+#   [{"query": "...", "relevant": ["Section > Title", "source.json#3", ...]}]
+# or, without --queries, are generated from the section titles of the corpus:
+#   python benchmarks/bench_retrieval.py --ks 3 5 10 15
+#   python benchmarks/bench_retrieval.py --queries labeled_queries.json
+import os
+import sys
+import json
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import rag  # noqa: E402
+from bench_client_lookup import percentile  # noqa: E402
+
+MODES = ("vector", "hybrid")
+
+
+def _key(hit: dict) -> str:
+    return f"{hit['source']}#{hit['chunk_id']}"
+
+
+def load_queries(path: str) -> list:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def generated_queries(limit: int, seed: int) -> list:
+    """One known-item query per section: its title, relevant to every chunk of that section."""
+    sections = {}
+    for doc in rag.get_lexical_index().documents():
+        if doc["section"]:
+            sections.setdefault(doc["section"], []).append(f"{doc['source']}#{doc['chunk_id']}")
+    items = sorted(sections.items())
+    random.Random(seed).shuffle(items)
+    return [{"query": section.split(" > ")[-1], "relevant": keys} for section, keys in items[:limit]]
+
+
+def is_relevant(hit: dict, relevant: set) -> bool:
+    return _key(hit) in relevant or hit.get("section") in relevant
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare vector-only and hybrid retrieval")
+    parser.add_argument("--queries", help="JSON file of labeled queries")
+    parser.add_argument("--limit", type=int, default=200, help="generated queries at most")
+    parser.add_argument("--ks", type=int, nargs="+", default=[3, 5, 10, 15])
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rag.init()
+    queries = load_queries(args.queries) if args.queries else generated_queries(args.limit, args.seed)
+    if not queries:
+        sys.exit("No queries: ingest documents first or pass --queries")
+    embedded = [(q["query"], set(q["relevant"]), rag.get_openai_embedding(q["query"])) for q in queries]
+    embedded = [item for item in embedded if item[2] is not None]
+    max_k = max(args.ks)
+
+    print(f"{len(embedded)} queries")
+    recall_at = {}
+    for mode in MODES:
+        latencies = []
+        hits_at = {k: 0 for k in args.ks}
+        for query, relevant, emb in embedded:
+            start = time.perf_counter()
+            hits = rag.retrieve(query, emb, top_k=max_k, retrieval=mode)
+            latencies.append((time.perf_counter() - start) * 1000)
+            for k in args.ks:
+                hits_at[k] += any(is_relevant(hit, relevant) for hit in hits[:k])
+        recall_at[mode] = {k: hits_at[k] / len(embedded) for k in args.ks}
+        recalls = "  ".join(f"R@{k}={recall_at[mode][k]:.3f}" for k in args.ks)
+        print(f"{mode:7s} {recalls}  p50={percentile(latencies, 50):.2f}ms p95={percentile(latencies, 95):.2f}ms")
+
+    # Smallest hybrid k that keeps vector-only recall at the largest k
+    target = recall_at["vector"][max_k]
+    smallest = next((k for k in sorted(args.ks) if recall_at["hybrid"][k] >= target), None)
+    if smallest is not None:
+        print(f"hybrid top_k={smallest} matches vector-only recall@{max_k} ({target:.3f})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+# bench_room_pool.py – Time-to-greeting with and without a warm room pool (local stand-in, no LiveKit)
+#
+# Visitors arrive at --rate per second; each takes a room from a RoomPool backed
+# by LocalProvisioner. A warm room greets after --greeting seconds, a cold one
+# first pays the agent's --warmup. Sizes the pool for an arrival rate:
+#   python benchmarks/bench_room_pool.py --sizes 0 2 5 10 --rate 2 --visitors 200
+# --quiet pauses arrivals halfway for that many seconds; with a quiet spell
+# longer than --max-idle every room must have been replaced in the background:
+#   python benchmarks/bench_room_pool.py --sizes 5 --max-idle 45 --quiet 60
+import os
+import sys
+import time
+import random
+import asyncio
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from room_pool import RoomPool, LocalProvisioner  # noqa: E402
+from bench_client_lookup import percentile  # noqa: E402
+
+
+async def run_size(size: int, args) -> dict:
+    provisioner = LocalProvisioner(warmup=args.warmup, failure_rate=args.failure_rate)
+    pool = RoomPool(provisioner, size=size, max_idle=args.max_idle, concurrency=args.concurrency)
+    pool.start()
+    # Let the pool fill before the first visitor, as after a deploy
+    await asyncio.sleep(args.warmup * 1.3 * max(1, -(-size // args.concurrency)))
+
+    rng = random.Random(7)
+    token_ms, greeting_s, warm = [], [], 0
+    for i in range(args.visitors):
+        if i == args.visitors // 2 and args.quiet:
+            await asyncio.sleep(args.quiet)
+        await asyncio.sleep(rng.expovariate(args.rate))
+        start = time.perf_counter()
+        room, is_warm = await pool.acquire()
+        token_ms.append((time.perf_counter() - start) * 1000)
+        warm += is_warm
+        greeting_s.append(args.greeting + (0.0 if is_warm else args.warmup))
+        # The visitor's session ends; the room is theirs, not the pool's
+        provisioner.rooms.discard(room)
+    await pool.stop()
+
+    return {
+        "size": size,
+        "warm": warm / args.visitors,
+        "acquire_p99": percentile(token_ms, 99),
+        "greeting_p50": percentile(greeting_s, 50),
+        "greeting_p95": percentile(greeting_s, 95),
+        "leaked": len(provisioner.rooms),
+    }
+
+
+async def run(args):
+    print(f"{args.visitors} visitors at {args.rate}/s, warmup {args.warmup}s, greeting {args.greeting}s, "
+          f"max idle {args.max_idle:.0f}s, quiet spell {args.quiet:.0f}s")
+    for size in args.sizes:
+        r = await run_size(size, args)
+        print(f"pool={r['size']:<3} warm handouts={r['warm']:6.1%}  acquire p99={r['acquire_p99']:6.2f}ms  "
+              f"time-to-greeting p50={r['greeting_p50']:.2f}s p95={r['greeting_p95']:.2f}s  "
+              f"rooms left behind={r['leaked']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Warm room pool sizing with the local stand-in")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[0, 2, 5, 10])
+    parser.add_argument("--rate", type=float, default=2.0, help="visitor arrivals per second")
+    parser.add_argument("--visitors", type=int, default=200)
+    parser.add_argument("--warmup", type=float, default=3.0, help="seconds to create a room and warm its agent")
+    parser.add_argument("--greeting", type=float, default=0.8, help="seconds from join to first word when warm")
+    parser.add_argument("--concurrency", type=int, default=4, help="rooms warming at once")
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--max-idle", type=float, default=600.0, help="seconds a warm agent waits for a visitor")
+    parser.add_argument("--quiet", type=float, default=0.0, help="pause in arrivals halfway through, in seconds")
+    asyncio.run(run(parser.parse_args()))
@@ -0,0 +1,68 @@
+# bench_session_start.py – Cold vs. prewarmed per-job setup cost of the agent
+#
+# Times what entrypoint() has to do before a session can run (VAD, RAG
+# clients/index/caches, and mapping the fuzzy client index that client_sync.py
+# saves in FUZZY_INDEX_DIR), in a fresh process each time, with and without
+# agent.prewarm() having run first:
+#   python benchmarks/bench_session_start.py --runs 3
+#   VECTOR_BACKEND=local python benchmarks/bench_session_start.py
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Mirrors the resource handling in agent.entrypoint()
+PROBE = """
+import sys, json, time, types, asyncio
+import agent
+from agent import silero, rag, fuzzy_index
+
+mode = sys.argv[1]
+proc = types.SimpleNamespace(userdata={})
+prewarm_ms = 0.0
+if mode == "warm":
+    start = time.perf_counter()
+    agent.prewarm(proc)
+    prewarm_ms = (time.perf_counter() - start) * 1000
+
+async def job_setup():
+    userdata = proc.userdata
+    vad = userdata.get("vad") or silero.VAD.load()
+    if not userdata.get("prewarmed"):
+        await asyncio.to_thread(rag.init)
+    await fuzzy_index.start()
+    return vad
+
+start = time.perf_counter()
+asyncio.run(job_setup())
+setup_ms = (time.perf_counter() - start) * 1000
+print(json.dumps({"setup_ms": setup_ms, "prewarm_ms": prewarm_ms}))
+"""
+
+
+def measure_once(mode: str) -> dict:
+    result = subprocess.run(
+        [sys.executable, "-c", PROBE, mode],
+        cwd=BACKEND_DIR, capture_output=True, text=True, check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare cold and prewarmed job setup time")
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    for mode in ("cold", "warm"):
+        runs = [measure_once(mode) for _ in range(args.runs)]
+        setup = statistics.median(run["setup_ms"] for run in runs)
+        prewarm = statistics.median(run["prewarm_ms"] for run in runs)
+        print(f"{mode}: job setup median {setup:8.1f}ms  (prewarm, off the critical path: {prewarm:8.1f}ms)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+# bench_speech.py – Correctness table and micro-benchmark of speech.py vs. the old formatter
+#
+# Every case is checked whole, streamed one character at a time, and through the
+# agent's SpeechChunker. Exits non-zero if any expected normalization is wrong:
+#   python benchmarks/bench_speech.py --iterations 20000
+import os
+import re
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from speech import normalize_for_speech, SpeechNormalizer  # noqa: E402
+from agent import SpeechChunker  # noqa: E402
+
+# (input, expected speech)
+CASES = [
+    ("Our clients see 150-200% ROI in 6-8 weeks.",
+     "Our clients see one hundred and fifty to two hundred percent ROI in six to eight weeks."),
+    ("25-35% cost reduction", "twenty five to thirty five percent cost reduction"),
+    ("up to 40%", "up to forty percent"),
+    ("0.5% error rate", "zero point five percent error rate"),
+    ("10 - 20 days", "ten to twenty days"),
+    ("1,250 employees", "one thousand two hundred and fifty employees"),
+    ("10,000,000 records", "ten million records"),
+    ("2,000.75", "two thousand point seven five"),
+    ("5 million users", "five million users"),
+    ("$1.2M in savings", "one point two million dollars in savings"),
+    ("a $500K deal", "a five hundred thousand dollars deal"),
+    ("$1-2M budget", "one to two million dollars budget"),
+    ("$12.50 per seat", "twelve dollars and fifty cents per seat"),
+    ("$1 fee", "one dollar fee"),
+    ("€3bn", "three billion euros"),
+    ("£2.99", "two pounds and ninety nine pence"),
+    ("$0.99 per call", "ninety nine cents per call"),
+    ("$1.01", "one dollar and one cent"),
+    ("2.5x faster", "two point five times faster"),
+    ("3X throughput", "three times throughput"),
+    ("the 1st, 2nd, 3rd, 11th, 22nd and 40th", "the first, second, third, eleventh, twenty second and fortieth"),
+    ("since 2019", "since twenty nineteen"),
+    ("in 2005", "in two thousand five"),
+    ("2023-2025 roadmap", "twenty twenty three to twenty twenty five roadmap"),
+    ("Q3 2024 results", "Q3 twenty twenty four results"),
+    ("launched in March 2024", "launched in March twenty twenty four"),
+    ("live since September 30th, 2023", "live since September thirtieth, twenty twenty three"),
+    ("H2 2025 rollout", "H2 twenty twenty five rollout"),
+    ("2024 employees", "two thousand twenty four employees"),
+    ("call 555-123-4567", "call 555-123-4567"),
+    ("24/7 support", "24/7 support"),
+    ("at 10:30", "at 10:30"),
+    ("Python 3.11.2", "Python 3.11.2"),
+    ("GPT-4o and COVID-19", "GPT-4o and COVID-19"),
+    ("a 3m cable", "a 3m cable"),
+]
+
+# Representative generated answer for the timing loop
+SAMPLE = ("Our clients typically see 150-200% ROI within 6-8 weeks, with 25-35% cost reduction "
+          "and 2.5x faster processing. One 2024 rollout saved $1.2M across 1,250 employees; "
+          "the 3rd phase added another 40% productivity boost in 3-4 months.")
+
+
+# The formatter agent.py used before speech.py, kept for comparison
+def legacy_format_numbers_for_speech(text: str) -> str:
+    """
+    Convert numeric patterns to speech-friendly format.
+    Examples:
+    - "150-200%" -> "one fifty to two hundred percent"
+    - "25-35%" -> "twenty five to thirty five percent"
+    - "6-8 weeks" -> "six to eight weeks"
+    """
+    
+    def number_to_words(num_str):
+        """Convert number string to words (simple version for common cases)"""
+        num = int(num_str)
+        
+        # Handle special cases
+        if num == 0:
+            return "zero"
+        
+        ones = ["", "one", "two", "three", "four", "five", "six", "seven", "eight", "nine"]
+        teens = ["ten", "eleven", "twelve", "thirteen", "fourteen", "fifteen", 
+                 "sixteen", "seventeen", "eighteen", "nineteen"]
+        tens = ["", "", "twenty", "thirty", "forty", "fifty", "sixty", "seventy", "eighty", "ninety"]
+        
+        if num < 10:
+            return ones[num]
+        elif num < 20:
+            return teens[num - 10]
+        elif num < 100:
+            return tens[num // 10] + (" " + ones[num % 10] if num % 10 != 0 else "")
+        elif num < 1000:
+            hundreds = ones[num // 100] + " hundred"
+            remainder = num % 100
+            if remainder == 0:
+                return hundreds
+            elif remainder < 10:
+                return hundreds + " and " + ones[remainder]
+            elif remainder < 20:
+                return hundreds + " and " + teens[remainder - 10]
+            else:
+                return hundreds + " and " + tens[remainder // 10] + (" " + ones[remainder % 10] if remainder % 10 != 0 else "")
+        else:
+            return num_str  # Fallback for large numbers
+    
+    # Pattern for percentage ranges like "150-200%"
+    def replace_percent_range(match):
+        start = match.group(1)
+        end = match.group(2)
+        start_words = number_to_words(start)
+        end_words = number_to_words(end)
+        return f"{start_words} to {end_words} percent"
+    
+    # Pattern for simple ranges like "6-8 weeks"
+    def replace_number_range(match):
+        start = match.group(1)
+        end = match.group(2)
+        unit = match.group(3)
+        start_words = number_to_words(start)
+        end_words = number_to_words(end)
+        return f"{start_words} to {end_words} {unit}"
+    
+    # Pattern for single percentages like "25%"
+    def replace_single_percent(match):
+        num = match.group(1)
+        num_words = number_to_words(num)
+        return f"{num_words} percent"
+    
+    # Apply replacements
+    # Range with percentage: 150-200%
+    text = re.sub(r'(\d+)-(\d+)%', replace_percent_range, text)
+    
+    # Range with unit: 6-8 weeks, 25-35 days
+    text = re.sub(r'(\d+)-(\d+)\s+(weeks|days|months|hours)', replace_number_range, text)
+    
+    # Single percentage: 25%
+    text = re.sub(r'(\d+)%', replace_single_percent, text)
+    
+    return text
+
+
+def check_cases() -> int:
+    failures = 0
+    for text, expected in CASES:
+        got = normalize_for_speech(text)
+        streamed = SpeechNormalizer()
+        fed = "".join(streamed.feed(ch) for ch in text) + streamed.flush()
+        chunker = SpeechChunker(formatter=normalize_for_speech)
+        chunked = "".join(piece for ch in text for piece in chunker.feed(ch)) + "".join(chunker.flush())
+        ok = got == expected and fed == expected and chunked == expected
+        failures += not ok
+        print(f"{'ok  ' if ok else 'FAIL'} {text!r} -> {got!r}" + ("" if fed == got else f" (streamed {fed!r})")
+              + ("" if chunked == got else f" (chunked {chunked!r})"))
+    return failures
+
+
+def timed(fn, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn(SAMPLE)
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check and time speech normalization")
+    parser.add_argument("--iterations", type=int, default=20000)
+    args = parser.parse_args()
+
+    failures = check_cases()
+    print()
+    legacy = timed(legacy_format_numbers_for_speech, args.iterations)
+    current = timed(normalize_for_speech, args.iterations)
+    print(f"legacy format_numbers_for_speech: {legacy:7.2f} us/call")
+    print(f"normalize_for_speech:             {current:7.2f} us/call ({legacy / current:.2f}x)")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+# bench_stream_failure.py – What the agent speaks and caches when the answer stream fails
+#
+# Same offline stand-ins and knowledge base as bench_hot_path.py. Streams a
+# solutions answer through the agent's SpeechChunker and speak_with_fallback
+# while the OpenAI stand-in drops the stream, before the first token and
+# mid-answer, then asks again with a healthy stream. Exits non-zero if a
+# truncated answer is cached or the wrong fallback line is spoken:
+#   python benchmarks/bench_stream_failure.py --fail-after 30
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import asyncio
+import argparse
+import logging
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_hot_path import SCRATCH_DIR, CORPUS_PATH, install_standins  # noqa: E402
+from standins import CANNED_ANSWER  # noqa: E402
+import agent  # noqa: E402
+import db  # noqa: E402
+import rag  # noqa: E402
+
+
+async def speak(visitor: dict) -> tuple:
+    """(spoken pieces, seconds) for one streamed answer, as the agent's tool speaks it."""
+    start = time.perf_counter()
+    deltas = rag.astream_tekisho_solutions(challenge=visitor["challenge"], industry=visitor["industry"],
+                                           formatter=agent.format_for_speech)
+    spoken = [piece async for piece in agent.speak_with_fallback(agent.SpeechChunker().stream(deltas))]
+    return spoken, time.perf_counter() - start
+
+
+def check(label: str, ok: bool, detail: str) -> int:
+    print(f"{'ok  ' if ok else 'FAIL'} {label}: {detail}")
+    return not ok
+
+
+async def run(args) -> int:
+    with open(args.corpus, "r", encoding="utf-8") as f:
+        visitor = random.Random(args.seed).choice(json.load(f))
+    install_standins(args)
+    completions = rag._async_openai_client.chat.completions
+    failures = 0
+
+    completions.fail_after = 0
+    spoken, seconds = await speak(visitor)
+    fallback = agent.format_for_speech(rag.GENERATION_FALLBACK)
+    failures += check("stream fails before the first token", "".join(spoken).split() == fallback.split()
+                      and rag.answer_cache.stats()["entries"] == 0,
+                      f"spoke {len(spoken)} pieces ending {spoken[-1][:40]!r} in {seconds:.2f}s, "
+                      f"cached {rag.answer_cache.stats()['entries']}")
+
+    completions.fail_after = args.fail_after
+    spoken, seconds = await speak(visitor)
+    failures += check(f"stream fails after {args.fail_after} tokens", len(spoken) > 1
+                      and spoken[-1] == agent.SOLUTIONS_INTERRUPTED and rag.answer_cache.stats()["entries"] == 0,
+                      f"spoke {len(spoken)} pieces ending {spoken[-1][:40]!r} in {seconds:.2f}s, "
+                      f"cached {rag.answer_cache.stats()['entries']}")
+
+    completions.fail_after = None
+    spoken, seconds = await speak(visitor)
+    answer = agent.format_for_speech(CANNED_ANSWER)
+    failures += check("same question, healthy stream", "".join(spoken).split() == answer.split()
+                      and rag.answer_cache.stats()["entries"] == 1,
+                      f"spoke the whole answer in {seconds:.2f}s, cached {rag.answer_cache.stats()['entries']}")
+
+    spoken, seconds = await speak(visitor)
+    failures += check("asked again", "".join(spoken).split() == answer.split()
+                      and rag.answer_cache.stats()["hits"] == 1,
+                      f"answered from the cache in {seconds * 1000:.1f}ms")
+
+    await rag.aclose()
+    await db.aclose()
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Streamed answer failures: spoken fallback and answer cache")
+    parser.add_argument("--corpus", default=CORPUS_PATH)
+    parser.add_argument("--fail-after", type=int, default=30, help="tokens streamed before the mid-answer failure")
+    parser.add_argument("--kb-size", type=int, default=60)
+    parser.add_argument("--embed-ms", type=float, default=20.0)
+    parser.add_argument("--chat-ttft-ms", type=float, default=100.0)
+    parser.add_argument("--chat-token-ms", type=float, default=2.0)
+    parser.add_argument("--pinecone-ms", type=float, default=10.0)
+    parser.add_argument("--mongo-ms", type=float, default=1.0)
+    parser.add_argument("--jitter", type=float, default=0.2)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+    # Fixed for this check; install_standins reads them
+    args.answer_cache = True
+    args.prefetch = False
+    args.memory_caches = False
+    args.draft_answers = False
+    args.mongo_uri = None
+
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.CRITICAL)
+    try:
+        failures = asyncio.run(run(args))
+    finally:
+        shutil.rmtree(SCRATCH_DIR, ignore_errors=True)
+    if failures:
+        raise SystemExit(f"{failures} check(s) failed")
+
+
+if __name__ == "__main__":
+    main()
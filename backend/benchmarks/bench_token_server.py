@@ -0,0 +1,121 @@
+# bench_token_server.py – Load test of /getToken: requests/sec and latency under concurrent joins
+#
+# Starts server.py under uvicorn in a subprocess (or targets --url, e.g. an
+# older server for comparison) and fires visitor joins at each concurrency
+# level. Every token is decoded to check that no two visitors got the same room:
+#   python benchmarks/bench_token_server.py --concurrency 50 200 400 --requests 4000
+#   python benchmarks/bench_token_server.py --url http://localhost:5001
+import os
+import sys
+import time
+import socket
+import asyncio
+import argparse
+import subprocess
+
+import httpx
+import jwt
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_client_lookup import percentile  # noqa: E402
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(port: int, workers: int) -> subprocess.Popen:
+    env = dict(os.environ)
+    # Signing needs credentials, not a reachable LiveKit server
+    env.setdefault("LIVEKIT_API_KEY", "bench-key")
+    env.setdefault("LIVEKIT_API_SECRET", "bench-secret-bench-secret-bench-secret")
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "server:app", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning", "--no-access-log"],
+        cwd=BACKEND_DIR, env=env,
+    )
+
+
+async def wait_ready(url: str, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                await client.get(f"{url}/getToken", params={"name": "probe"})
+                return
+            except httpx.TransportError:
+                await asyncio.sleep(0.2)
+    raise RuntimeError(f"Server at {url} did not come up")
+
+
+async def run_level(url: str, concurrency: int, requests: int) -> dict:
+    latencies = []
+    rooms = set()
+    errors = 0
+    remaining = iter(range(requests))
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(limits=limits, timeout=30.0) as client:
+        async def visitor():
+            nonlocal errors
+            for i in remaining:
+                start = time.perf_counter()
+                try:
+                    response = await client.get(f"{url}/getToken", params={"name": f"visitor-{i}"})
+                    response.raise_for_status()
+                except httpx.HTTPError:
+                    errors += 1
+                    continue
+                latencies.append((time.perf_counter() - start) * 1000)
+                claims = jwt.decode(response.text, options={"verify_signature": False})
+                rooms.add(claims["video"]["room"])
+
+        start = time.perf_counter()
+        await asyncio.gather(*(visitor() for _ in range(concurrency)))
+        wall = time.perf_counter() - start
+
+    return {
+        "concurrency": concurrency,
+        "ok": len(latencies),
+        "errors": errors,
+        "rps": len(latencies) / wall,
+        "p50": percentile(latencies, 50) if latencies else 0.0,
+        "p95": percentile(latencies, 95) if latencies else 0.0,
+        "p99": percentile(latencies, 99) if latencies else 0.0,
+        "duplicate_rooms": len(latencies) - len(rooms),
+    }
+
+
+async def run(args):
+    server = None
+    url = args.url
+    if url is None:
+        port = free_port()
+        url = f"http://127.0.0.1:{port}"
+        server = start_server(port, args.workers)
+    try:
+        await wait_ready(url)
+        print(f"Target {url}")
+        for concurrency in args.concurrency:
+            result = await run_level(url, concurrency, args.requests)
+            print(f"concurrency={result['concurrency']:<4} ok={result['ok']:<6} errors={result['errors']:<4} "
+                  f"{result['rps']:8.0f} req/s  p50={result['p50']:7.2f}ms p95={result['p95']:7.2f}ms "
+                  f"p99={result['p99']:7.2f}ms  duplicate rooms={result['duplicate_rooms']}")
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test the token endpoint")
+    parser.add_argument("--url", help="server to test; default starts server.py under uvicorn")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers for the started server")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[50, 200, 400])
+    parser.add_argument("--requests", type=int, default=4000, help="joins per concurrency level")
+    asyncio.run(run(parser.parse_args()))
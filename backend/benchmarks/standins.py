@@ -0,0 +1,253 @@
+# standins.py – Local stand-ins for OpenAI, Pinecone and MongoDB with configurable latency
+#
+# Used by the offline benchmarks: each stand-in implements only the calls the
+# backend makes, answers from local state, and sleeps for a simulated network
+# round trip so concurrency and queueing behave like the real services.
+import os
+import sys
+import time
+import random
+import asyncio
+import hashlib
+from types import SimpleNamespace
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bm25_index import tokenize  # noqa: E402
+
+
+class Latency:
+    """A simulated round trip of `ms` milliseconds, +/- `jitter` (a fraction of it)."""
+
+    def __init__(self, ms: float, jitter: float = 0.2, seed: int = 0):
+        self.ms = ms
+        self.jitter = jitter
+        self._rng = random.Random(seed)
+
+    def seconds(self, extra_ms: float = 0.0) -> float:
+        total = self.ms + extra_ms
+        return max(0.0, total * (1 + self._rng.uniform(-self.jitter, self.jitter))) / 1000
+
+    def sleep(self, extra_ms: float = 0.0):
+        time.sleep(self.seconds(extra_ms))
+
+    async def asleep(self, extra_ms: float = 0.0):
+        await asyncio.sleep(self.seconds(extra_ms))
+
+
+# ========== OPENAI ==========
+
+def fake_embedding(text: str, dim: int) -> list:
+    """
+    Deterministic hashed bag-of-words embedding: texts sharing terms get
+    similar vectors, so retrieval and routing return sensible results.
+    """
+    vec = np.zeros(dim, dtype=np.float32)
+    for term in tokenize(text) or [text]:
+        digest = hashlib.blake2b(term.encode("utf-8"), digest_size=8).digest()
+        slot = int.from_bytes(digest[:4], "little") % dim
+        vec[slot] += 1.0 if digest[4] & 1 else -1.0
+    vec[0] += 0.01  # never a zero vector
+    return (vec / np.linalg.norm(vec)).tolist()
+
+
+# A spoken-style answer with the numbers the speech normalizer has to handle
+CANNED_ANSWER = (
+    "For a team like yours, we'd start with an AI document pipeline that reads invoices and contracts, "
+    "extracts the key fields and routes exceptions to the right person. Clients in similar industries "
+    "typically see 150-200% ROI within 6-8 weeks, cost savings of 25-40%, and processing that's 3x faster. "
+    "One logistics client saved $1.2M in 2024 across 12,000 documents a month. Would you like to see how "
+    "that maps to your current workflow?"
+)
+
+
+def _embedding_response(texts: list, dim: int):
+    return SimpleNamespace(data=[
+        SimpleNamespace(index=i, embedding=fake_embedding(text, dim)) for i, text in enumerate(texts)
+    ])
+
+
+def _completion(content: str):
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+def _stream_chunk(content: str):
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=content))])
+
+
+class _Embeddings:
+    def __init__(self, latency: Latency, dim: int):
+        self._latency = latency
+        self._dim = dim
+
+    def create(self, input, model: str, **kwargs):
+        texts = [input] if isinstance(input, str) else list(input)
+        self._latency.sleep()
+        return _embedding_response(texts, self._dim)
+
+
+class _AsyncEmbeddings(_Embeddings):
+    async def create(self, input, model: str, **kwargs):
+        texts = [input] if isinstance(input, str) else list(input)
+        await self._latency.asleep()
+        return _embedding_response(texts, self._dim)
+
+
+class _Completions:
+    """Chat completions: time to first token, then `token_ms` per generated token."""
+
+    def __init__(self, first_token: Latency, token_ms: float, answer: str):
+        self._first_token = first_token
+        self._token_ms = token_ms
+        self._answer = answer
+        self._pieces = [word + " " for word in answer.split(" ")]
+
+    def create(self, messages, stream: bool = False, **kwargs):
+        self._first_token.sleep(self._token_ms * len(self._pieces))
+        return _completion(self._answer)
+
+
+class _AsyncStream:
+    def __init__(self, pieces: list, token_ms: float, fail_after: int = None):
+        self._pieces = pieces
+        self._token_ms = token_ms
+        self._fail_after = fail_after
+
+    async def __aiter__(self):
+        for i, piece in enumerate(self._pieces):
+            if i == self._fail_after:
+                raise ConnectionError("stand-in stream dropped")
+            await asyncio.sleep(self._token_ms / 1000)
+            yield _stream_chunk(piece)
+
+
+class _AsyncCompletions(_Completions):
+    # Set to drop every stream after this many pieces (0: before the first)
+    fail_after = None
+
+    async def create(self, messages, stream: bool = False, **kwargs):
+        if stream:
+            await self._first_token.asleep()
+            return _AsyncStream(self._pieces, self._token_ms, self.fail_after)
+        await self._first_token.asleep(self._token_ms * len(self._pieces))
+        return _completion(self._answer)
+
+
+class StandInOpenAI:
+    """Drop-in for openai.OpenAI (embeddings and chat completions)."""
+
+    def __init__(self, embed: Latency, first_token: Latency, token_ms: float, dim: int, answer: str = CANNED_ANSWER):
+        self.embeddings = _Embeddings(embed, dim)
+        self.chat = SimpleNamespace(completions=_Completions(first_token, token_ms, answer))
+
+
+class StandInAsyncOpenAI:
+    """Drop-in for openai.AsyncOpenAI."""
+
+    def __init__(self, embed: Latency, first_token: Latency, token_ms: float, dim: int, answer: str = CANNED_ANSWER):
+        self.embeddings = _AsyncEmbeddings(embed, dim)
+        self.chat = SimpleNamespace(completions=_AsyncCompletions(first_token, token_ms, answer))
+
+    async def close(self):
+        pass
+
+
+# ========== PINECONE ==========
+
+class StandInIndex:
+    """
+    Pinecone index stand-in: the repo's LocalVectorIndex behind a simulated
+    query round trip. Writes (ingestion) are not delayed.
+    """
+
+    def __init__(self, local_index, latency: Latency):
+        self._local = local_index
+        self._latency = latency
+
+    def query(self, **kwargs) -> dict:
+        self._latency.sleep()
+        return self._local.query(**kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._local, name)
+
+
+class StandInAsyncIndex:
+    """Pinecone IndexAsyncio stand-in over the same local index."""
+
+    def __init__(self, local_index, latency: Latency):
+        self._local = local_index
+        self._latency = latency
+
+    async def query(self, **kwargs) -> dict:
+        await self._latency.asleep()
+        return self._local.query(**kwargs)
+
+    async def close(self):
+        pass
+
+
+# ========== MONGODB ==========
+
+class _AsyncCursor:
+    def __init__(self, cursor, latency: Latency):
+        self._cursor = cursor
+        self._latency = latency
+
+    def limit(self, n: int):
+        self._cursor = self._cursor.limit(n)
+        return self
+
+    async def to_list(self, length=None):
+        await self._latency.asleep()
+        docs = list(self._cursor)
+        return docs if length is None else docs[:length]
+
+    async def __aiter__(self):
+        await self._latency.asleep()
+        for doc in self._cursor:
+            yield doc
+
+
+class _AsyncCollection:
+    """pymongo AsyncCollection stand-in over a mongomock (or any sync) collection."""
+
+    def __init__(self, collection, latency: Latency):
+        self._collection = collection
+        self._latency = latency
+
+    def find(self, *args, **kwargs):
+        return _AsyncCursor(self._collection.find(*args, **kwargs), self._latency)
+
+    def __getattr__(self, name):
+        method = getattr(self._collection, name)
+
+        async def call(*args, **kwargs):
+            await self._latency.asleep()
+            return method(*args, **kwargs)
+        return call
+
+
+class StandInMongoClient:
+    """AsyncMongoClient stand-in: client[db][collection] returns async collections."""
+
+    def __init__(self, sync_client, latency: Latency):
+        self._client = sync_client
+        self._latency = latency
+
+    def __getitem__(self, db_name):
+        return _AsyncDatabase(self._client[db_name], self._latency)
+
+    async def close(self):
+        self._client.close()
+
+
+class _AsyncDatabase:
+    def __init__(self, database, latency: Latency):
+        self._database = database
+        self._latency = latency
+
+    def __getitem__(self, name):
+        return _AsyncCollection(self._database[name], self._latency)
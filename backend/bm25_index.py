@@ -0,0 +1,166 @@
+# bm25_index.py – Local BM25 inverted index over the ingested chunks, plus rank fusion
+import os
+import re
+import json
+import math
+import logging
+from collections import Counter, defaultdict
+
+logger = logging.getLogger("TekishoBM25")
+
+# Okapi BM25 parameters
+K1 = 1.5
+B = 0.75
+# Reciprocal rank fusion constant (the usual 60)
+RRF_K = 60
+
+WORD = re.compile(r"[a-z0-9]+(?:[.'][a-z0-9]+)*")
+STOPWORDS = frozenset("""
+a an and are as at be by can do does for from has have how i in is it its me my of on or our
+so that the their them they this to us was we what when which who will with you your
+""".split())
+
+
+def tokenize(text: str) -> list:
+    """Lowercased terms without stopwords, with plurals folded ("invoices" -> "invoice")."""
+    terms = []
+    for word in WORD.findall(text.lower()):
+        if word in STOPWORDS:
+            continue
+        if len(word) > 4 and word.endswith("ies"):
+            word = word[:-3] + "y"
+        elif len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        terms.append(word)
+    return terms
+
+
+class BM25Index:
+    """
+    Inverted index of chunk text keyed by the same ids as the vector index.
+    Chunks and their metadata are persisted as JSON; postings are rebuilt on
+    load. Mutations stay in memory until save().
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._docs = {}  # id -> {"text", "source", "doc_type", "chunk_id", "section"}
+        self._postings = defaultdict(dict)  # term -> {id: term frequency}
+        self._lengths = {}  # id -> number of terms
+        self._total_length = 0
+        self.load()
+
+    def __len__(self):
+        return len(self._docs)
+
+    def documents(self):
+        """The indexed chunks' text and metadata."""
+        return list(self._docs.values())
+
+    # ---------- persistence ----------
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "r", encoding="utf-8") as f:
+            docs = json.load(f)["docs"]
+        self._docs, self._postings, self._lengths, self._total_length = {}, defaultdict(dict), {}, 0
+        for doc_id, doc in docs.items():
+            self._add(doc_id, doc)
+        logger.info(f"Loaded BM25 index with {len(self)} chunks from {self.path}")
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"docs": self._docs}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    # ---------- mutation ----------
+
+    def _add(self, doc_id: str, doc: dict):
+        terms = Counter(tokenize(doc["text"]))
+        for term, tf in terms.items():
+            self._postings[term][doc_id] = tf
+        length = sum(terms.values())
+        self._lengths[doc_id] = length
+        self._total_length += length
+        self._docs[doc_id] = doc
+
+    def upsert(self, chunks: list):
+        """Add or replace ingestion chunk records ({"id", "text", "source", ...})."""
+        self.delete(chunk["id"] for chunk in chunks)
+        for chunk in chunks:
+            self._add(chunk["id"], {
+                "text": chunk["text"],
+                "source": chunk["source"],
+                "doc_type": chunk["doc_type"],
+                "chunk_id": chunk["chunk_id"],
+                "section": chunk.get("section", ""),
+            })
+
+    def delete(self, ids=None, delete_all: bool = False):
+        if delete_all:
+            self._docs, self._postings, self._lengths, self._total_length = {}, defaultdict(dict), {}, 0
+            return
+        for doc_id in ids or []:
+            doc = self._docs.pop(doc_id, None)
+            if doc is None:
+                continue
+            for term in set(tokenize(doc["text"])):
+                postings = self._postings.get(term)
+                if postings is not None:
+                    postings.pop(doc_id, None)
+                    if not postings:
+                        del self._postings[term]
+            self._total_length -= self._lengths.pop(doc_id)
+
+    # ---------- query ----------
+
+    def search(self, query: str, top_k: int = 15, doc_type_filter: str = None) -> list:
+        """Top-k chunks by BM25 score, shaped like rag.search_index() results."""
+        if not self._docs:
+            return []
+        count = len(self._docs)
+        avg_length = self._total_length / count
+        scores = defaultdict(float)
+        for term in set(tokenize(query)):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc_id, tf in postings.items():
+                norm = tf + K1 * (1 - B + B * self._lengths[doc_id] / avg_length)
+                scores[doc_id] += idf * tf * (K1 + 1) / norm
+
+        if doc_type_filter:
+            scores = {doc_id: s for doc_id, s in scores.items() if self._docs[doc_id]["doc_type"] == doc_type_filter}
+        ranked = sorted(scores.items(), key=lambda pair: pair[1], reverse=True)[:top_k]
+        return [{
+            "source": self._docs[doc_id]["source"],
+            "doc_type": self._docs[doc_id]["doc_type"],
+            "chunk_id": self._docs[doc_id]["chunk_id"],
+            "section": self._docs[doc_id]["section"],
+            "score": score,
+            "text": self._docs[doc_id]["text"],
+        } for doc_id, score in ranked]
+
+
+def reciprocal_rank_fusion(result_lists: list, top_k: int, k: int = RRF_K) -> list:
+    """
+    Merge ranked hit lists by reciprocal rank fusion. Hits are matched on
+    (source, chunk_id); each fused hit's score is its RRF score relative to
+    the best one (0-1], so it still works as a relevance for context packing.
+    """
+    fused = {}
+    rrf = defaultdict(float)
+    for hits in result_lists:
+        for rank, hit in enumerate(hits):
+            key = (hit["source"], hit["chunk_id"])
+            rrf[key] += 1.0 / (k + rank + 1)
+            fused.setdefault(key, hit)
+    ranked = sorted(rrf.items(), key=lambda pair: pair[1], reverse=True)[:top_k]
+    if not ranked:
+        return []
+    best = ranked[0][1]
+    return [{**fused[key], "score": score / best} for key, score in ranked]
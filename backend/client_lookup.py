@@ -0,0 +1,345 @@
+# client_lookup.py – Indexed, normalized client lookup for scanned business cards
+import os
+import re
+import json
+import asyncio
+import hashlib
+import logging
+import unicodedata
+from dotenv import load_dotenv
+from bson import ObjectId
+from pymongo import ASCENDING, UpdateOne
+from pymongo.errors import OperationFailure
+
+import db
+
+# ========== CONFIG ==========
+load_dotenv()
+
+# Bump when normalization rules change so the backfill rewrites every document
+LOOKUP_VERSION = 1
+LOOKUP_FIELD = "lookup"
+# Precomputed greeting written by greetings.py: {text, model, prompt_version,
+# profile_hash, generated_at}. Profiles carry its text only while it was written
+# from the same profile, with the model and prompt rag generates greetings with
+GREETING_FIELD = "greeting"
+GREETING_MODEL = "gpt-4o"
+# Bump when rag._greeting_messages changes so greetings.py regenerates stored greetings
+GREETING_PROMPT_VERSION = 1
+
+# Shortest token prefix stored (and matched) for partial names like "Green Dyn"
+MIN_PREFIX_LENGTH = 3
+MAX_CANDIDATES = int(os.getenv("CLIENT_LOOKUP_MAX_CANDIDATES", "25"))
+BACKFILL_BATCH_SIZE = 1000
+# How often maintain() re-runs the backfill when the deployment has no change streams
+LOOKUP_BACKFILL_INTERVAL = float(os.getenv("LOOKUP_BACKFILL_INTERVAL", "60"))
+
+# Trailing words dropped from company names so "Green Dynamics Pvt Ltd" == "Green Dynamics"
+LEGAL_SUFFIXES = {
+    "inc", "incorporated", "llc", "llp", "lp", "ltd", "limited", "pvt", "private",
+    "corp", "corporation", "co", "company", "plc", "gmbh", "ag", "sa", "bv", "nv",
+    "pte", "pty", "srl", "spa", "oy", "ab", "kk",
+}
+
+# Fields needed to build a profile; keeps candidate documents small on the wire
+PROFILE_PROJECTION = {
+    "company_name": 1,
+    "company_details.name": 1,
+    "company_details.email": 1,
+    "company_details.phone": 1,
+    "ai_extracted_data.structured_data": 1,
+    LOOKUP_FIELD: 1,
+    GREETING_FIELD: 1,
+}
+
+logger = logging.getLogger("TekishoClientLookup")
+
+_NON_ALNUM = re.compile(r"[^0-9a-z]+")
+
+
+# ========== NORMALIZATION ==========
+
+def normalize(text: str) -> str:
+    """Casefold, strip accents and punctuation, and collapse whitespace."""
+    if not text:
+        return ""
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(ch for ch in text if not unicodedata.combining(ch)).casefold()
+    return _NON_ALNUM.sub(" ", text).strip()
+
+
+def company_tokens(company: str) -> list:
+    """Normalized company tokens with trailing legal suffixes removed."""
+    tokens = normalize(company).split()
+    while len(tokens) > 1 and tokens[-1] in LEGAL_SUFFIXES:
+        tokens.pop()
+    return tokens
+
+
+def name_tokens(name: str) -> list:
+    """Normalized person-name tokens."""
+    return normalize(name).split()
+
+
+def token_prefixes(tokens) -> list:
+    """All prefixes of each token from MIN_PREFIX_LENGTH up to the full token."""
+    prefixes = set()
+    for token in tokens:
+        if len(token) < MIN_PREFIX_LENGTH:
+            prefixes.add(token)
+            continue
+        for end in range(MIN_PREFIX_LENGTH, len(token) + 1):
+            prefixes.add(token[:end])
+    return sorted(prefixes)
+
+
+def lookup_keys(name: str, company: str) -> dict:
+    """Build the normalized lookup sub-document stored on each client."""
+    c_tokens = company_tokens(company)
+    n_tokens = name_tokens(name)
+    tokens = sorted(set(c_tokens) | set(n_tokens))
+    return {
+        "company": " ".join(c_tokens),
+        "name": " ".join(n_tokens),
+        "tokens": tokens,
+        "prefixes": token_prefixes(tokens),
+        "version": LOOKUP_VERSION,
+    }
+
+
+def with_lookup_keys(client_doc: dict) -> dict:
+    """Return the client document with fresh lookup keys; call before inserting."""
+    doc = dict(client_doc)
+    doc[LOOKUP_FIELD] = lookup_keys(
+        (doc.get("company_details") or {}).get("name", ""),
+        doc.get("company_name", ""),
+    )
+    return doc
+
+
+def flatten_profile(client_doc: dict) -> dict:
+    """Flatten the nested business-card schema into the fields the agent uses."""
+    company_details = client_doc.get("company_details") or {}
+    ai_data = client_doc.get("ai_extracted_data") or {}
+    structured_data = ai_data.get("structured_data") or {}
+    profile = {
+        "record_id": str(client_doc.get("_id", "")),
+        "client_name": company_details.get("name", ""),
+        "company": client_doc.get("company_name", ""),
+        "mail_id": company_details.get("email", ""),
+        "phone_no": company_details.get("phone", ""),
+        "company_summary": structured_data.get("Description/tagline", ""),
+        "research_about_company": structured_data.get("Industry", ""),
+    }
+    # greetings.py rewrites stale ones
+    profile["greeting"] = stored_greeting(client_doc, profile) or ""
+    return profile
+
+
+def stored_greeting(client_doc: dict, profile: dict = None):
+    """The client's precomputed greeting if it was written from this profile, model and prompt, else None."""
+    greeting = client_doc.get(GREETING_FIELD) or {}
+    if not (greeting.get("model") == GREETING_MODEL and greeting.get("prompt_version") == GREETING_PROMPT_VERSION):
+        return None
+    profile = profile if profile is not None else flatten_profile(client_doc)
+    if greeting.get("profile_hash") != greeting_fingerprint(profile):
+        return None
+    return greeting.get("text") or None
+
+
+def greeting_fingerprint(profile: dict) -> str:
+    """Hash of the profile fields a greeting is written from; when it changes, so should the greeting."""
+    fields = {key: profile.get(key) or "" for key in
+              ("client_name", "company", "company_summary", "research_about_company")}
+    return hashlib.sha256(json.dumps(fields, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def to_object_id(record_id: str):
+    """Turn a flattened profile's record_id back into the document _id."""
+    return ObjectId(record_id) if ObjectId.is_valid(record_id) else record_id
+
+
+# ========== INDEXES & BACKFILL ==========
+
+async def ensure_indexes(collection=None):
+    """Create the indexes that serve find_client. Idempotent."""
+    collection = collection if collection is not None else db.get_collection()
+    await collection.create_index(
+        [(f"{LOOKUP_FIELD}.company", ASCENDING), (f"{LOOKUP_FIELD}.name", ASCENDING)],
+        name="lookup_company_name",
+    )
+    await collection.create_index([(f"{LOOKUP_FIELD}.name", ASCENDING)], name="lookup_name")
+    await collection.create_index([(f"{LOOKUP_FIELD}.prefixes", ASCENDING)], name="lookup_prefixes")
+
+
+async def backfill(collection=None) -> int:
+    """Write lookup keys on every client whose keys are missing or outdated."""
+    collection = collection if collection is not None else db.get_collection()
+    stale = {f"{LOOKUP_FIELD}.version": {"$ne": LOOKUP_VERSION}}
+    projection = {"company_name": 1, "company_details.name": 1}
+
+    updated = 0
+    batch = []
+    async for doc in collection.find(stale, projection):
+        keys = with_lookup_keys(doc)[LOOKUP_FIELD]
+        batch.append(UpdateOne({"_id": doc["_id"]}, {"$set": {LOOKUP_FIELD: keys}}))
+        if len(batch) >= BACKFILL_BATCH_SIZE:
+            await collection.bulk_write(batch, ordered=False)
+            updated += len(batch)
+            batch = []
+    if batch:
+        await collection.bulk_write(batch, ordered=False)
+        updated += len(batch)
+
+    # maintain() re-runs this on a timer; only say so when something changed
+    (logger.info if updated else logger.debug)(f"Backfilled lookup keys on {updated} clients")
+    return updated
+
+
+async def _key_changes(collection):
+    """Write lookup keys on each inserted or edited client from the change stream."""
+    pipeline = [{"$match": {"operationType": {"$in": ["insert", "update", "replace"]}}}]
+    async with await collection.watch(pipeline, full_document="updateLookup") as stream:
+        logger.info("Watching clients collection for new lookup keys")
+        async for change in stream:
+            doc = change.get("fullDocument")
+            if not doc:
+                continue
+            keys = with_lookup_keys(doc)[LOOKUP_FIELD]
+            # Our own $set comes back as an update with the same keys, so this doesn't loop
+            if doc.get(LOOKUP_FIELD) != keys:
+                await collection.update_one({"_id": doc["_id"]}, {"$set": {LOOKUP_FIELD: keys}})
+
+
+async def maintain(collection=None):
+    """
+    Keep lookup keys on clients written by other apps (the card scanner):
+    index and backfill once, then key each insert or edit from the change
+    stream. Without change streams, re-runs the backfill every
+    LOOKUP_BACKFILL_INTERVAL, which keys new clients but not edited names.
+    Runs until cancelled.
+    """
+    collection = collection if collection is not None else db.get_collection()
+    try:
+        await ensure_indexes(collection)
+        await backfill(collection)
+        await _key_changes(collection)
+    except OperationFailure as e:
+        # Standalone servers reject $changeStream
+        logger.info(f"Change stream not available ({e.code}), backfilling every {LOOKUP_BACKFILL_INTERVAL}s")
+    except Exception as e:
+        logger.warning(f"Lookup key change stream stopped, backfilling instead: {e}")
+    while True:
+        await asyncio.sleep(LOOKUP_BACKFILL_INTERVAL)
+        try:
+            await backfill(collection)
+        except Exception as e:
+            logger.warning(f"Lookup key backfill failed: {e}")
+
+
+# ========== LOOKUP ==========
+
+def _score(candidate: dict, name_key: str, company_key: str, query_tokens: set) -> float:
+    """Rank a candidate: exact company/name matches first, then token overlap."""
+    keys = candidate.get(LOOKUP_FIELD) or {}
+    score = 0.0
+    if company_key and keys.get("company") == company_key:
+        score += 2.0
+    if name_key and keys.get("name") == name_key:
+        score += 2.0
+
+    doc_tokens = keys.get("tokens") or []
+    if query_tokens and doc_tokens:
+        matched = sum(
+            1 for q in query_tokens
+            if any(t == q or (len(q) >= MIN_PREFIX_LENGTH and t.startswith(q)) for t in doc_tokens)
+        )
+        # Share of the spoken tokens found on the card, penalized for extra card tokens
+        score += matched / len(query_tokens) * (matched / max(len(doc_tokens), matched))
+    return score
+
+
+def build_queries(name: str, company: str):
+    """Return (queries, name_key, company_key, query_tokens).
+
+    `queries` are tried in order until one matches, each served by a lookup
+    index: name and company together, either key alone, then token prefixes.
+    Empty when the spoken name and company normalize to nothing.
+    """
+    company_key = " ".join(company_tokens(company))
+    name_key = " ".join(name_tokens(name))
+    query_tokens = set(company_key.split()) | set(name_key.split())
+
+    queries = []
+    # Ahead of the $or: a common name or company alone can fill MAX_CANDIDATES
+    # before the client that matches both comes back
+    if company_key and name_key:
+        queries.append({f"{LOOKUP_FIELD}.company": company_key, f"{LOOKUP_FIELD}.name": name_key})
+    exact_clauses = []
+    if company_key:
+        exact_clauses.append({f"{LOOKUP_FIELD}.company": company_key})
+    if name_key:
+        exact_clauses.append({f"{LOOKUP_FIELD}.name": name_key})
+    if exact_clauses:
+        queries.append({"$or": exact_clauses})
+    if query_tokens:
+        queries.append({f"{LOOKUP_FIELD}.prefixes": {"$in": sorted(query_tokens)}})
+    return queries, name_key, company_key, query_tokens
+
+
+async def find_clients(name: str, company: str, collection=None, limit: int = 3) -> list:
+    """Return up to `limit` (score, client_doc) pairs, best match first.
+
+    The exact name + company key is tried first, then either key alone, and
+    partial token prefixes only when no exact key matches.
+    """
+    collection = collection if collection is not None else db.get_collection()
+    queries, name_key, company_key, query_tokens = build_queries(name, company)
+
+    candidates = []
+    for query in queries:
+        candidates = await collection.find(query, PROFILE_PROJECTION).limit(MAX_CANDIDATES).to_list(None)
+        if candidates:
+            break
+
+    ranked = sorted(
+        ((_score(doc, name_key, company_key, query_tokens), doc) for doc in candidates),
+        key=lambda pair: pair[0],
+        reverse=True,
+    )
+    return [(score, doc) for score, doc in ranked if score > 0][:limit]
+
+
+async def get_client_by_id(client_id, collection=None):
+    """Fetch one client by _id with the profile projection."""
+    collection = collection if collection is not None else db.get_collection()
+    return await collection.find_one({"_id": client_id}, PROFILE_PROJECTION)
+
+
+async def find_client(name: str, company: str, collection=None):
+    """Return the best-matching client document, or None."""
+    matches = await find_clients(name, company, collection=collection, limit=1)
+    return matches[0][1] if matches else None
+
+
+# ========== MAIN BACKFILL ==========
+if __name__ == "__main__":
+    import argparse
+
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Index the clients collection and key every client for lookups")
+    parser.add_argument("--watch", action="store_true",
+                        help="then keep keying new and edited clients until stopped (run exactly one)")
+    args = parser.parse_args()
+
+    async def _main():
+        try:
+            if args.watch:
+                await maintain()
+            else:
+                await ensure_indexes()
+                await backfill()
+        finally:
+            await db.aclose()
+
+    asyncio.run(_main())
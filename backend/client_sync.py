@@ -0,0 +1,63 @@
+# client_sync.py – Keeps this host's shared client data in sync with MongoDB
+#
+# LiveKit runs every session in its own short-lived job process, so the agent
+# reads client data that outlives the job from files on the host: the profile
+# cache (profile_cache.py) and the fuzzy client index (fuzzy_index.py). This
+# process builds the index once, keeps both current and re-saves the index
+# when clients change. Run one per agent host, next to agent.py:
+#   python client_sync.py
+import time
+import asyncio
+import logging
+from dotenv import load_dotenv
+
+import db
+import fuzzy_index
+import profile_cache
+
+load_dotenv()
+
+logger = logging.getLogger("TekishoClientSync")
+
+
+async def _keep_fuzzy_index(collection):
+    """Build the fuzzy index, then save it whenever it changes and reconcile it periodically."""
+    matcher = fuzzy_index.matcher
+    await matcher.load(collection)
+    saved_version = None
+    last_refresh = time.monotonic()
+    while True:
+        if matcher.version != saved_version:
+            # Runs on the loop, so no change event lands halfway through the save
+            start = time.perf_counter()
+            matcher.save()
+            saved_version = matcher.version
+            logger.info(f"Saved the fuzzy client index ({len(matcher)} clients) in "
+                        f"{time.perf_counter() - start:.2f}s")
+        await asyncio.sleep(fuzzy_index.FUZZY_SNAPSHOT_INTERVAL)
+        if time.monotonic() - last_refresh >= fuzzy_index.FUZZY_REFRESH_INTERVAL:
+            last_refresh = time.monotonic()
+            try:
+                await matcher.refresh(collection)
+            except Exception as e:
+                logger.warning(f"Fuzzy index refresh failed: {e}")
+
+
+async def run():
+    """Keep the shared client data current until cancelled."""
+    collection = db.get_collection()
+    tasks = [_keep_fuzzy_index(collection)]
+    if profile_cache.cache.persistent:
+        # The change stream also feeds the fuzzy index between reconciliations
+        tasks.append(profile_cache.keep_current(collection))
+    else:
+        logger.warning("PROFILE_CACHE_PATH is empty; job processes cache profiles privately")
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        await db.aclose()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(run())
@@ -0,0 +1,130 @@
+# context_packer.py – Assemble retrieved chunks into a compact, diverse prompt context
+import os
+import re
+import logging
+from dotenv import load_dotenv
+
+from doc_chunker import count_tokens
+
+# ========== CONFIG ==========
+load_dotenv()
+
+# Upper bound on context tokens sent to the answer model
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1200"))
+# Word-set Jaccard similarity above which two chunks count as duplicates
+CONTEXT_DEDUP_THRESHOLD = float(os.getenv("CONTEXT_DEDUP_THRESHOLD", "0.8"))
+# MMR trade-off: 1.0 ranks purely by relevance, lower values favour diversity
+CONTEXT_MMR_LAMBDA = float(os.getenv("CONTEXT_MMR_LAMBDA", "0.7"))
+# Chunks considered at most (the old fixed cut-off)
+MAX_CANDIDATES = 15
+# Longest text shared by the end of one chunk and the start of the next
+MAX_OVERLAP_CHARS = 2000
+
+WORD = re.compile(r"[a-z0-9]+")
+
+logger = logging.getLogger("TekishoContext")
+
+
+def _format(chunk: dict) -> str:
+    return f"[{chunk['doc_type'].upper()}] {chunk['text']}"
+
+
+def _body(chunk: dict) -> str:
+    """Chunk text without its breadcrumb line, which sibling chunks share."""
+    text = chunk["text"]
+    section = chunk.get("section")
+    if section and text.startswith(section):
+        return text[len(section):]
+    return text
+
+
+def _jaccard(a: frozenset, b: frozenset) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def _join(first: str, second: str, second_section: str = None) -> str:
+    """Concatenate neighbouring chunks, dropping a repeated breadcrumb and any overlapping text."""
+    if second_section and second.startswith(second_section) and second_section in first:
+        second = second[len(second_section):].lstrip("\n")
+    # Overlap from a hard token-window split: the longest tail of `first` that starts `second`
+    probe = second[:20]
+    start = first.find(probe, max(0, len(first) - MAX_OVERLAP_CHARS)) if len(probe) == 20 else -1
+    while start != -1:
+        if second.startswith(first[start:]):
+            return first + second[len(first) - start:]
+        start = first.find(probe, start + 1)
+    return first + "\n" + second
+
+
+def _merge_adjacent(selected: list) -> list:
+    """Fuse selected chunks that are consecutive pieces of the same source, best group first."""
+    groups = []
+    for chunk in sorted(selected, key=lambda c: (c["source"], c["chunk_id"])):
+        last = groups[-1] if groups else None
+        if last and last["source"] == chunk["source"] and last["last_chunk_id"] + 1 == chunk["chunk_id"]:
+            last["text"] = _join(last["text"], chunk["text"], chunk.get("section"))
+            last["last_chunk_id"] = chunk["chunk_id"]
+            last["score"] = max(last["score"], chunk["score"])
+        else:
+            groups.append({**chunk, "last_chunk_id": chunk["chunk_id"]})
+    groups.sort(key=lambda c: c["score"], reverse=True)
+    return groups
+
+
+def pack_context(chunks: list, token_budget: int = CONTEXT_TOKEN_BUDGET,
+                 mmr_lambda: float = CONTEXT_MMR_LAMBDA) -> str:
+    """
+    Build the prompt context from retrieved chunks: drop repeats and
+    near-duplicates, pick chunks by maximal marginal relevance until the
+    token budget is used, then merge neighbouring chunks of the same source.
+    Logs the tokens saved against joining every chunk.
+    """
+    candidates = sorted(chunks, key=lambda c: c["score"], reverse=True)[:MAX_CANDIDATES]
+    baseline_tokens = count_tokens("\n\n".join(_format(chunk) for chunk in candidates))
+
+    # Same chunk from both filtered queries, or near-identical text
+    unique = []
+    seen = set()
+    for chunk in candidates:
+        key = (chunk["source"], chunk["chunk_id"])
+        if key in seen:
+            continue
+        seen.add(key)
+        words = frozenset(WORD.findall(_body(chunk).lower()))
+        if any(_jaccard(words, kept[1]) >= CONTEXT_DEDUP_THRESHOLD for kept in unique):
+            continue
+        unique.append((chunk, words))
+
+    # Maximal marginal relevance under the token budget
+    selected = []
+    used = 0
+    remaining = [(chunk, words, count_tokens(_format(chunk)) + 1) for chunk, words in unique]
+    while remaining:
+        best, best_value = None, None
+        for i, (chunk, words, tokens) in enumerate(remaining):
+            if used + tokens > token_budget:
+                continue
+            redundancy = max((_jaccard(words, chosen[1]) for chosen in selected), default=0.0)
+            value = mmr_lambda * chunk["score"] - (1 - mmr_lambda) * redundancy
+            if best_value is None or value > best_value:
+                best, best_value = i, value
+        if best is None:
+            if not selected:
+                # Never send an empty context just because the best chunk is large
+                best = 0
+            else:
+                break
+        chunk, words, tokens = remaining.pop(best)
+        selected.append((chunk, words))
+        used += tokens
+
+    context = "\n\n".join(_format(chunk) for chunk in _merge_adjacent([chunk for chunk, _ in selected]))
+    if candidates:
+        packed_tokens = count_tokens(context)
+        logger.info(
+            f"Packed {len(candidates)} chunks into {len(selected)} ({len(unique)} unique): "
+            f"{packed_tokens} context tokens, saved {baseline_tokens - packed_tokens} of {baseline_tokens}"
+        )
+    return context
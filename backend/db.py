@@ -0,0 +1,82 @@
+# db.py – Process-wide async MongoDB connection pool
+import os
+import logging
+from dotenv import load_dotenv
+from pymongo import AsyncMongoClient
+
+# -------------------------------------
+# Environment Setup
+# -------------------------------------
+load_dotenv()
+
+MONGO_URI = os.getenv("MONGO_URI")
+DB_NAME = os.getenv("MONGO_DB_NAME", "tekisho_db")
+COLLECTION_NAME = os.getenv("MONGO_COLLECTION", "clients")
+
+# Pool sizing, timeouts and health checks (all optional)
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "20"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "1"))
+MONGO_MAX_IDLE_MS = int(os.getenv("MONGO_MAX_IDLE_MS", "300000"))
+MONGO_CONNECT_TIMEOUT_MS = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "3000"))
+MONGO_SOCKET_TIMEOUT_MS = int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", "5000"))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "3000"))
+MONGO_HEARTBEAT_MS = int(os.getenv("MONGO_HEARTBEAT_MS", "10000"))
+
+logger = logging.getLogger("TekishoDB")
+
+# One client per worker process. The LiveKit worker runs each job in its own
+# process by default, so every session in that process shares this pool.
+_client = None
+
+
+# =====================================
+# Client Lifecycle
+# =====================================
+def new_client() -> AsyncMongoClient:
+    """Create a client with the pool settings above (callers own its lifecycle)."""
+    return AsyncMongoClient(
+        MONGO_URI,
+        maxPoolSize=MONGO_MAX_POOL_SIZE,
+        minPoolSize=MONGO_MIN_POOL_SIZE,
+        maxIdleTimeMS=MONGO_MAX_IDLE_MS,
+        connectTimeoutMS=MONGO_CONNECT_TIMEOUT_MS,
+        socketTimeoutMS=MONGO_SOCKET_TIMEOUT_MS,
+        serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        heartbeatFrequencyMS=MONGO_HEARTBEAT_MS,
+        appname="tekisho-agent",
+    )
+
+
+def get_client() -> AsyncMongoClient:
+    """Return the process-wide async client, creating it on first use."""
+    global _client
+    if _client is None:
+        logger.info(
+            f"Opening MongoDB pool (min={MONGO_MIN_POOL_SIZE}, max={MONGO_MAX_POOL_SIZE})"
+        )
+        _client = new_client()
+    return _client
+
+
+def get_collection(name: str = COLLECTION_NAME):
+    """Return a collection handle from the shared client."""
+    return get_client()[DB_NAME][name]
+
+
+async def ping() -> bool:
+    """Health check: round-trip a ping to the server."""
+    try:
+        await get_client().admin.command("ping")
+        return True
+    except Exception as e:
+        logger.error(f"MongoDB health check failed: {e}")
+        return False
+
+
+async def aclose():
+    """Close the shared client. Safe to call more than once."""
+    global _client
+    if _client is not None:
+        client, _client = _client, None
+        await client.close()
+        logger.info("MongoDB pool closed.")
@@ -0,0 +1,303 @@
+# doc_chunker.py – Structure-aware, token-budgeted chunking of the JSON knowledge base
+import os
+import re
+import json
+import logging
+from dotenv import load_dotenv
+
+# ========== CONFIG ==========
+load_dotenv()
+
+# Tokenizer of the text-embedding-3 models
+CHUNK_TOKEN_ENCODING = os.getenv("CHUNK_TOKEN_ENCODING", "cl100k_base")
+# Bytes read from a document at a time while streaming it
+READ_BLOCK_SIZE = 64 * 1024
+# Keys whose string value names the object they belong to
+TITLE_KEYS = ("title", "name", "service_name", "use_case_name", "use_case", "service", "heading", "category")
+# Bumped whenever chunk boundaries or text change, so ingestion re-chunks every file
+CHUNKER_VERSION = 2
+
+SENTENCE_SPLIT = re.compile(r"(?<=[.!?])\s+")
+
+logger = logging.getLogger("TekishoChunker")
+
+
+# ========== TOKENS ==========
+
+_encoding = None
+_encoding_failed = False
+
+
+def _get_encoding():
+    global _encoding, _encoding_failed
+    if _encoding is None and not _encoding_failed:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding(CHUNK_TOKEN_ENCODING)
+        except Exception as e:
+            # tiktoken fetches its BPE file on first use; offline we estimate instead
+            _encoding_failed = True
+            logger.warning(f"Tokenizer {CHUNK_TOKEN_ENCODING} unavailable, estimating 4 chars per token: {e}")
+    return _encoding
+
+
+def load_tokenizer() -> bool:
+    """Load the tokenizer now rather than on the first count (it may download its BPE file); False if estimating."""
+    return _get_encoding() is not None
+
+
+def count_tokens(text: str) -> int:
+    """Tokens in text under the embedding model's tokenizer (estimated if it can't load)."""
+    encoding = _get_encoding()
+    if encoding is None:
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def _split_tokens(text: str, max_tokens: int, overlap: int) -> list:
+    """Hard-split text into windows of at most max_tokens with `overlap` tokens shared."""
+    step = max(1, max_tokens - overlap)
+    encoding = _get_encoding()
+    if encoding is not None:
+        tokens = encoding.encode(text, disallowed_special=())
+        return [encoding.decode(tokens[i:i + max_tokens]).strip() for i in range(0, len(tokens), step)]
+    words = text.split()
+    # ~0.75 words per token
+    max_words, step_words = max(1, max_tokens * 3 // 4), max(1, step * 3 // 4)
+    return [" ".join(words[i:i + max_words]) for i in range(0, len(words), step_words)]
+
+
+# ========== STREAMING JSON ==========
+
+class _JsonStream:
+    """
+    Reads a JSON document incrementally: the top-level container and the
+    containers directly inside it are walked value by value, so only one
+    record (one service, one use case) is decoded in memory at a time.
+    """
+
+    def __init__(self, fp):
+        self._fp = fp
+        self._buffer = ""
+        self._pos = 0
+        self._eof = False
+        self._decoder = json.JSONDecoder()
+
+    def _fill(self) -> bool:
+        if self._eof:
+            return False
+        # Grow geometrically so a record spanning many blocks isn't re-decoded per block
+        block = self._fp.read(max(READ_BLOCK_SIZE, len(self._buffer) - self._pos))
+        if not block:
+            self._eof = True
+            return False
+        self._buffer = self._buffer[self._pos:] + block
+        self._pos = 0
+        return True
+
+    def peek(self) -> str:
+        """Next non-whitespace character, without consuming it ("" at the end)."""
+        while True:
+            while self._pos < len(self._buffer) and self._buffer[self._pos].isspace():
+                self._pos += 1
+            if self._pos < len(self._buffer) or not self._fill():
+                return self._buffer[self._pos:self._pos + 1]
+
+    def expect(self, chars: str) -> str:
+        char = self.peek()
+        if not char or char not in chars:
+            raise ValueError(f"Expected one of {chars!r} in JSON, found {char!r}")
+        self._pos += 1
+        return char
+
+    def value(self):
+        """Decode the next complete value."""
+        self.peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._pos)
+                # A number at the very end of the buffer may continue in the next block
+                if end < len(self._buffer) or self._eof:
+                    self._pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self._eof:
+                    raise
+            self._fill()
+
+    def items(self):
+        """Iterate over an object's keys; the caller consumes each value."""
+        self.expect("{")
+        if self.peek() == "}":
+            self._pos += 1
+            return
+        while True:
+            key = self.value()
+            self.expect(":")
+            yield key
+            if self.expect(",}") == "}":
+                return
+
+    def elements(self):
+        """Iterate over an array; the caller consumes each element."""
+        self.expect("[")
+        if self.peek() == "]":
+            self._pos += 1
+            return
+        while True:
+            yield
+            if self.expect(",]") == "]":
+                return
+
+
+def _label(key: str) -> str:
+    text = str(key).replace("_", " ").strip()
+    return text[:1].upper() + text[1:]
+
+
+def _title_of(obj: dict):
+    for key in TITLE_KEYS:
+        if isinstance(obj.get(key), str) and obj[key].strip():
+            return key, obj[key].strip()
+    return None, None
+
+
+def iter_records(fp):
+    """
+    Stream a JSON document as (breadcrumbs, value) pairs: every element of a
+    top-level array and every value under a top-level key, with arrays under
+    top-level keys walked element by element (their scalars grouped into one
+    value). The document's own title, when it comes first, prefixes every
+    breadcrumb.
+    """
+    stream = _JsonStream(fp)
+    first = stream.peek()
+    if first == "[":
+        for _ in stream.elements():
+            yield [], stream.value()
+        return
+    if first != "{":
+        yield [], stream.value()
+        return
+
+    doc_title = None
+    overview = {}
+    for key in stream.items():
+        crumbs = [doc_title] if doc_title else []
+        if stream.peek() == "[":
+            scalars = []
+            for _ in stream.elements():
+                element = stream.value()
+                if isinstance(element, (dict, list)):
+                    yield crumbs + [_label(key)], element
+                else:
+                    scalars.append(element)
+            if scalars:
+                yield crumbs + [_label(key)], scalars
+            continue
+        value = stream.value()
+        if isinstance(value, (dict, list)):
+            yield crumbs + [_label(key)], value
+        elif key in TITLE_KEYS and doc_title is None and isinstance(value, str):
+            doc_title = value.strip()
+        else:
+            overview[key] = value
+    if overview:
+        yield [doc_title] if doc_title else [], overview
+
+
+# ========== RECORDS TO TEXT ==========
+
+def _is_record_list(value) -> bool:
+    return isinstance(value, list) and bool(value) and all(isinstance(v, dict) for v in value) \
+        and any(_title_of(v)[1] for v in value)
+
+
+def _render(value) -> str:
+    if isinstance(value, dict):
+        return ", ".join(f"{_label(k)}: {_render(v)}" for k, v in value.items() if v not in (None, "", [], {}))
+    if isinstance(value, list):
+        return "; ".join(_render(v) for v in value if v not in (None, "", [], {}))
+    return str(value).strip()
+
+
+def _sections(crumbs: list, value):
+    """Yield (breadcrumbs, lines) for one record and any titled sub-records inside it."""
+    if isinstance(value, list):
+        if _is_record_list(value):
+            for item in value:
+                yield from _sections(crumbs, item)
+        else:
+            text = _render(value)
+            if text:
+                yield crumbs, [text]
+        return
+    if not isinstance(value, dict):
+        text = _render(value)
+        if text:
+            yield crumbs, [text]
+        return
+
+    title_key, title = _title_of(value)
+    own = crumbs + [title] if title else crumbs
+    lines = []
+    children = []
+    for key, field in value.items():
+        if key == title_key or field in (None, "", [], {}):
+            continue
+        if _is_record_list(field):
+            children.append((own + [_label(key)], field))
+        elif isinstance(field, list) and all(not isinstance(v, (dict, list)) for v in field):
+            lines.append(f"{_label(key)}: " + "; ".join(str(v).strip() for v in field))
+        elif isinstance(field, list):
+            lines.append(f"{_label(key)}:")
+            lines.extend(f"- {_render(item)}" for item in field if item not in (None, "", [], {}))
+        else:
+            lines.append(f"{_label(key)}: {_render(field)}")
+    if lines:
+        yield own, lines
+    for child_crumbs, items in children:
+        for item in items:
+            yield from _sections(child_crumbs, item)
+
+
+def _pack(header: str, lines: list, max_tokens: int, overlap: int) -> list:
+    """Group a record's lines into chunks of at most max_tokens, each led by the header."""
+    budget = max(32, max_tokens - count_tokens(header) - 1)
+    pieces = []
+    for line in lines:
+        if count_tokens(line) <= budget:
+            pieces.append(line)
+            continue
+        # An oversized field: split at sentences, then hard-split any run-on sentence
+        for sentence in SENTENCE_SPLIT.split(line):
+            if count_tokens(sentence) <= budget:
+                pieces.append(sentence)
+            else:
+                pieces.extend(_split_tokens(sentence, budget, overlap))
+
+    chunks = []
+    current, used = [], 0
+    for piece in pieces:
+        size = count_tokens(piece) + 1
+        if current and used + size > budget:
+            chunks.append(current)
+            current, used = [], 0
+        current.append(piece)
+        used += size
+    if current:
+        chunks.append(current)
+    return [(header + "\n" if header else "") + "\n".join(chunk) for chunk in chunks]
+
+
+def chunk_json(fp, max_tokens: int, overlap: int):
+    """
+    Yield (section, text) chunks from a JSON document read from fp: one chunk
+    per service / use case (split further only if it exceeds max_tokens),
+    each starting with its "Parent > Title" breadcrumb.
+    """
+    for crumbs, value in iter_records(fp):
+        for section_crumbs, lines in _sections(crumbs, value):
+            header = " > ".join(section_crumbs)
+            for text in _pack(header, lines, max_tokens, overlap):
+                yield header, text
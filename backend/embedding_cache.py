@@ -0,0 +1,149 @@
+# embedding_cache.py – Two-tier (memory LRU + SQLite) content-addressed embedding cache
+import os
+import sqlite3
+import hashlib
+import logging
+import threading
+from array import array
+from collections import OrderedDict
+from dotenv import load_dotenv
+
+# ========== CONFIG ==========
+load_dotenv()
+
+EMBED_CACHE_PATH = os.getenv(
+    "EMBED_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "embeddings.sqlite"),
+)
+EMBED_CACHE_MEMORY_ENTRIES = int(os.getenv("EMBED_CACHE_MEMORY_ENTRIES", "4096"))
+
+logger = logging.getLogger("TekishoEmbeddingCache")
+
+
+def cache_key(text: str, model: str, dim: int) -> str:
+    """Content address of one embedding: hash of model, dimensions and text."""
+    return hashlib.sha256(f"{model}\x00{dim}\x00{text}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Embeddings keyed by cache_key(). Tier 1 is an in-memory LRU, tier 2 an
+    on-disk SQLite table of float32 blobs that survives restarts. Safe to share
+    between threads; the database is opened on first use. SQLite work never
+    holds the memory tier's lock, so get_memory() doesn't wait on disk I/O.
+    """
+
+    def __init__(self, path: str = EMBED_CACHE_PATH, max_memory_entries: int = EMBED_CACHE_MEMORY_ENTRIES):
+        self.path = path
+        self.max_memory_entries = max_memory_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()  # memory tier and counters
+        self._db_lock = threading.Lock()  # the SQLite connection
+        self._conn = None
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _db(self):
+        if self._conn is None:
+            if self.path != ":memory:":
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+        return self._conn
+
+    def _remember(self, key: str, emb: list):
+        self._memory[key] = emb
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def get_many(self, texts, model: str, dim: int) -> dict:
+        """Return {text: embedding} for every text already cached."""
+        found = {}
+        missing = {}
+        with self._lock:
+            for text in texts:
+                key = cache_key(text, model, dim)
+                emb = self._memory.get(key)
+                if emb is not None:
+                    self._memory.move_to_end(key)
+                    found[text] = emb
+                    self.memory_hits += 1
+                else:
+                    missing[key] = text
+        if not missing:
+            return found
+
+        keys = list(missing)
+        rows = []
+        with self._db_lock:
+            # Stay well under SQLite's bound-parameter limit
+            for i in range(0, len(keys), 500):
+                batch = keys[i:i + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows += self._db().execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall()
+        with self._lock:
+            for key, blob in rows:
+                emb = array("f", blob).tolist()
+                self._remember(key, emb)
+                found[missing.pop(key)] = emb
+                self.disk_hits += 1
+            self.misses += len(missing)
+        return found
+
+    def get(self, text: str, model: str, dim: int):
+        """Return the cached embedding for one text, or None."""
+        return self.get_many([text], model, dim).get(text)
+
+    def get_memory(self, text: str, model: str, dim: int):
+        """The embedding if it is in the memory tier, else None; never touches disk (a miss isn't counted)."""
+        key = cache_key(text, model, dim)
+        with self._lock:
+            emb = self._memory.get(key)
+            if emb is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+        return emb
+
+    def put_many(self, items, model: str, dim: int):
+        """Store (text, embedding) pairs in both tiers."""
+        rows = []
+        with self._lock:
+            for text, emb in items:
+                key = cache_key(text, model, dim)
+                self._remember(key, emb)
+                rows.append((key, array("f", emb).tobytes()))
+        if rows:
+            with self._db_lock:
+                conn = self._db()
+                conn.executemany("INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)", rows)
+                conn.commit()
+
+    def put(self, text: str, emb: list, model: str, dim: int):
+        self.put_many([(text, emb)], model, dim)
+
+    def open(self):
+        """Open the on-disk tier now rather than on the first lookup."""
+        with self._db_lock:
+            self._db()
+
+    def stats(self) -> dict:
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "memory_entries": len(self._memory),
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_ratio": round((self.memory_hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+        }
+
+    def close(self):
+        with self._db_lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
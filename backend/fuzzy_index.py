@@ -0,0 +1,507 @@
+# fuzzy_index.py – Fuzzy/phonetic index of client names and companies, shared through a memory-mapped snapshot
+#
+# client_sync.py builds the index from Mongo once per host, keeps it current
+# and saves it to FUZZY_INDEX_DIR; job processes map the saved snapshot
+# instead of scanning the clients collection themselves.
+import os
+import json
+import time
+import glob
+import asyncio
+import logging
+from bisect import bisect_left
+from itertools import chain
+from collections import Counter, defaultdict
+import numpy as np
+from bson import ObjectId
+from dotenv import load_dotenv
+from metaphone import doublemetaphone
+
+import db
+import client_lookup
+
+# ========== CONFIG ==========
+load_dotenv()
+
+# Minimum confidence (0-1) for a fuzzy hit to be trusted without the Mongo fallback
+FUZZY_MIN_CONFIDENCE = float(os.getenv("FUZZY_MIN_CONFIDENCE", "0.7"))
+# Name and company must each be at least this similar to the client's; a known
+# name at an unknown company (or the reverse) is a different person
+FUZZY_MIN_FIELD_SIMILARITY = float(os.getenv("FUZZY_MIN_FIELD_SIMILARITY", "0.6"))
+# How often client_sync.py reconciles the index with Mongo (seconds): new
+# business cards on a standalone mongod, and anything a change stream missed
+FUZZY_REFRESH_INTERVAL = float(os.getenv("FUZZY_REFRESH_INTERVAL", "30"))
+# Snapshot written by client_sync.py and mapped by every job process on the host
+FUZZY_INDEX_DIR = os.getenv(
+    "FUZZY_INDEX_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "fuzzy_clients"),
+)
+# How often client_sync.py re-saves the snapshot after clients changed (seconds)
+FUZZY_SNAPSHOT_INTERVAL = float(os.getenv("FUZZY_SNAPSHOT_INTERVAL", "10"))
+# Names, then clients, re-scored exactly after the trigram/phonetic pre-filter
+MAX_RESCORED = 50
+# Posting-list entries visited per query before common features are skipped
+POSTING_BUDGET = int(os.getenv("FUZZY_POSTING_BUDGET", "4000"))
+
+# Weight of character trigram similarity vs. phonetic token similarity
+TRIGRAM_WEIGHT = 0.6
+PHONETIC_WEIGHT = 0.4
+
+logger = logging.getLogger("TekishoFuzzyIndex")
+
+
+# ========== FEATURES ==========
+
+def trigrams(text: str) -> frozenset:
+    """Word-padded character trigrams of already-normalized text."""
+    if not text:
+        return frozenset()
+    padded = f"  {text} "
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+def phonetic_codes(tokens) -> frozenset:
+    """Double Metaphone primary and secondary codes of each token."""
+    codes = set()
+    for token in tokens:
+        for code in doublemetaphone(token):
+            if code:
+                codes.add(code)
+    return frozenset(codes)
+
+
+def _dice(a: frozenset, b: frozenset) -> float:
+    if not a or not b:
+        return 0.0
+    return 2 * len(a & b) / (len(a) + len(b))
+
+
+class _Field:
+    """Trigram and phonetic features of one normalized field."""
+
+    __slots__ = ("text", "grams", "codes")
+
+    def __init__(self, tokens):
+        self.text = " ".join(tokens)
+        self.grams = trigrams(self.text)
+        self.codes = phonetic_codes(tokens)
+
+    def similarity(self, other: "_Field") -> float:
+        if not self.text or not other.text:
+            return 0.0
+        if self.text == other.text:
+            return 1.0
+        return TRIGRAM_WEIGHT * _dice(self.grams, other.grams) + PHONETIC_WEIGHT * _dice(self.codes, other.codes)
+
+    def features(self) -> set:
+        """Posting keys: trigrams, and phonetic codes prefixed with "#"."""
+        return set(self.grams) | {"#" + code for code in self.codes}
+
+
+def _count_shared(postings: dict, keys, candidates=None) -> Counter:
+    """
+    How many of `keys` each posted item shares, visiting the rarest (most
+    discriminative) keys first and skipping the very common ones once the
+    posting budget is spent. Only items in `candidates` count, when given.
+    """
+    lists = sorted((postings[key] for key in keys if key in postings), key=len)
+    shared = Counter()
+    visited = 0
+    for items in lists:
+        if candidates is not None:
+            items = items & candidates
+        if visited and visited + len(items) > POSTING_BUDGET:
+            break
+        shared.update(items)
+        visited += len(items)
+    return shared
+
+
+# ========== INDEX ==========
+
+_PROJECTION = {"company_name": 1, "company_details.name": 1}
+
+
+def _client_fields(client_doc: dict) -> tuple:
+    """Normalized (name tokens, company tokens) the index matches on."""
+    return (client_lookup.name_tokens((client_doc.get("company_details") or {}).get("name", "")),
+            client_lookup.company_tokens(client_doc.get("company_name", "")))
+
+
+class ClientMatcher:
+    """
+    Trigram + Double Metaphone index over every client's name and company.
+    Names are indexed once per distinct name (many clients share one), companies
+    per client. Built from Mongo and updated in place by client_sync.py, which
+    saves it for the job processes with save().
+    """
+
+    def __init__(self):
+        self._entries = {}  # record_id -> (name text, company _Field)
+        self._ids = {}  # record_id -> the document's raw _id
+        self._names = {}  # name text -> (name _Field, record_ids)
+        self._name_postings = defaultdict(set)  # name feature -> name texts
+        self._company_postings = defaultdict(set)  # company feature -> record_ids
+        self.version = 0  # bumped on every change, so callers know when to save
+        self.ready = False
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def _unpost(postings: dict, keys, item):
+        for key in keys:
+            items = postings.get(key)
+            if items is not None:
+                items.discard(item)
+                if not items:
+                    del postings[key]
+
+    def upsert(self, client_doc: dict):
+        """Add or replace one client document."""
+        record_id = str(client_doc["_id"])
+        self.remove(record_id)
+        name_tokens, company_tokens = _client_fields(client_doc)
+        name_field = _Field(name_tokens)
+        company_field = _Field(company_tokens)
+        self._entries[record_id] = (name_field.text, company_field)
+        self._ids[record_id] = client_doc["_id"]
+
+        if name_field.text not in self._names:
+            self._names[name_field.text] = (name_field, set())
+            for key in name_field.features():
+                self._name_postings[key].add(name_field.text)
+        self._names[name_field.text][1].add(record_id)
+        for key in company_field.features():
+            self._company_postings[key].add(record_id)
+        self.version += 1
+
+    def remove(self, record_id: str):
+        """Drop one client from the index, if present."""
+        entry = self._entries.pop(record_id, None)
+        if entry is None:
+            return
+        del self._ids[record_id]
+        name_text, company_field = entry
+        name_field, record_ids = self._names[name_text]
+        record_ids.discard(record_id)
+        if not record_ids:
+            del self._names[name_text]
+            self._unpost(self._name_postings, name_field.features(), name_text)
+        self._unpost(self._company_postings, company_field.features(), record_id)
+        self.version += 1
+
+    def search(self, name: str, company: str, limit: int = 3) -> list:
+        """
+        Return up to `limit` (_id, confidence) pairs, best first, among clients
+        whose name and company each reach FUZZY_MIN_FIELD_SIMILARITY.
+        """
+        query_name = _Field(client_lookup.name_tokens(name))
+        query_company = _Field(client_lookup.company_tokens(company))
+        if not (query_name.text and query_company.text):
+            return []
+
+        # Names first: far fewer distinct names than clients
+        name_sims = {}
+        for text, _ in _count_shared(self._name_postings, query_name.features()).most_common(MAX_RESCORED):
+            name_field, record_ids = self._names[text]
+            sim = query_name.similarity(name_field)
+            if sim >= FUZZY_MIN_FIELD_SIMILARITY:
+                for record_id in record_ids:
+                    name_sims[record_id] = sim
+        if not name_sims:
+            return []
+
+        # Then the companies of the clients with those names, pre-filtered the
+        # same way when a common name leaves too many to score
+        candidates = name_sims.keys()
+        if len(candidates) > MAX_RESCORED:
+            shared = _count_shared(self._company_postings, query_company.features(), set(candidates))
+            candidates = [record_id for record_id, _ in shared.most_common(MAX_RESCORED)]
+
+        results = []
+        for record_id in candidates:
+            company_sim = query_company.similarity(self._entries[record_id][1])
+            if company_sim >= FUZZY_MIN_FIELD_SIMILARITY:
+                confidence = (name_sims[record_id] + company_sim) / 2
+                results.append((self._ids[record_id], round(confidence, 4)))
+
+        results.sort(key=lambda pair: pair[1], reverse=True)
+        return results[:limit]
+
+    async def load(self, collection=None):
+        """Build the index from every client in Mongo."""
+        collection = collection if collection is not None else db.get_collection()
+        async for doc in collection.find({}, _PROJECTION):
+            self.upsert(doc)
+        self.ready = True
+        logger.info(f"Fuzzy client index loaded with {len(self)} clients")
+
+    async def refresh(self, collection=None) -> int:
+        """
+        Reconcile with Mongo: add new clients, re-index edited names and
+        companies, drop deleted clients. Returns the number of changes.
+        """
+        collection = collection if collection is not None else db.get_collection()
+        seen = set()
+        changed = 0
+        async for doc in collection.find({}, _PROJECTION):
+            record_id = str(doc["_id"])
+            seen.add(record_id)
+            entry = self._entries.get(record_id)
+            name_tokens, company_tokens = _client_fields(doc)
+            if entry is None or entry[0] != " ".join(name_tokens) or entry[1].text != " ".join(company_tokens):
+                self.upsert(doc)
+                changed += 1
+        for record_id in set(self._entries) - seen:
+            self.remove(record_id)
+            changed += 1
+        if changed:
+            logger.info(f"Fuzzy client index reconciled {changed} changed clients")
+        return changed
+
+    def save(self, path: str = FUZZY_INDEX_DIR):
+        """
+        Write the index as int32 posting lists plus a JSON sidecar that a
+        ClientSnapshot maps read-only. The sidecar is replaced last, atomically,
+        and names the postings file it belongs to.
+        """
+        names = list(self._names)
+        name_numbers = {text: i for i, text in enumerate(names)}
+        record_ids = list(self._entries)
+        keys = set(self._name_postings) | set(self._company_postings)
+        codes = sorted(key for key in keys if key.startswith("#"))
+        features = sorted(keys.difference(codes)) + codes
+        feature_numbers = {key: i for i, key in enumerate(features)}
+
+        def numbered(field):
+            return ([feature_numbers[gram] for gram in field.grams]
+                    + [feature_numbers["#" + code] for code in field.codes])
+
+        name_features = _csr([numbered(self._names[text][0]) for text in names])
+        company_features = _csr([numbered(self._entries[record_id][1]) for record_id in record_ids])
+        client_names = np.fromiter((name_numbers[self._entries[record_id][0]] for record_id in record_ids),
+                                   dtype=np.int32, count=len(record_ids))
+        segments = {}
+        arrays = []
+        offset = 0
+        for segment, (pointers, items) in (
+            ("name_features", name_features),
+            ("company_features", company_features),
+            ("name_postings", _invert(*name_features, len(features))),
+            ("company_postings", _invert(*company_features, len(features))),
+            ("name_clients", _invert(np.arange(len(record_ids) + 1, dtype=np.int32), client_names, len(names))),
+        ):
+            for name, array in ((segment + "_ptr", pointers), (segment, items)):
+                segments[name] = [offset, len(array)]
+                arrays.append(array)
+                offset += len(array)
+        segments["client_names"] = [offset, len(client_names)]
+        arrays.append(client_names)
+
+        os.makedirs(path, exist_ok=True)
+        postings_name = f"postings-{time.time_ns()}.i32"
+        np.concatenate(arrays).astype(np.int32).tofile(os.path.join(path, postings_name))
+        meta_path = os.path.join(path, "index.json")
+        with open(meta_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({
+                "postings": postings_name,
+                "segments": segments,
+                "features": features,
+                "first_code": len(features) - len(codes),
+                "names": names,
+                "companies": [self._entries[record_id][1].text for record_id in record_ids],
+                "ids": [_encode_id(self._ids[record_id]) for record_id in record_ids],
+            }, f, ensure_ascii=False)
+        os.replace(meta_path + ".tmp", meta_path)
+        # Processes that mapped an older file keep reading it after the unlink
+        for old in glob.glob(os.path.join(path, "postings-*.i32")):
+            if os.path.basename(old) != postings_name:
+                os.remove(old)
+
+
+def _csr(rows: list) -> tuple:
+    """(row pointers, items) of lists of ints, each row sorted."""
+    lengths = np.fromiter(map(len, rows), dtype=np.int32, count=len(rows))
+    pointers = np.zeros(len(rows) + 1, dtype=np.int32)
+    np.cumsum(lengths, out=pointers[1:])
+    items = np.fromiter(chain.from_iterable(rows), dtype=np.int32, count=int(pointers[-1]))
+    row_numbers = np.repeat(np.arange(len(rows), dtype=np.int32), lengths)
+    return pointers, items[np.lexsort((items, row_numbers))]
+
+
+def _invert(pointers, items, columns: int) -> tuple:
+    """Column -> sorted rows containing it, for a _csr matrix."""
+    row_numbers = np.repeat(np.arange(len(pointers) - 1, dtype=np.int32), np.diff(pointers))
+    inverted = np.zeros(columns + 1, dtype=np.int32)
+    np.cumsum(np.bincount(items, minlength=columns), out=inverted[1:])
+    return inverted, row_numbers[np.argsort(items, kind="stable")]
+
+
+def _encode_id(raw_id):
+    return {"$oid": str(raw_id)} if isinstance(raw_id, ObjectId) else raw_id
+
+
+def _decode_id(value):
+    return ObjectId(value["$oid"]) if isinstance(value, dict) else value
+
+
+def _dice_count(shared: int, a: int, b: int) -> float:
+    return 2 * shared / (a + b) if a and b else 0.0
+
+
+class ClientSnapshot:
+    """
+    Read-only ClientMatcher saved by ClientMatcher.save(), memory-mapped so the
+    job processes on a host share one copy. Same search() results, up to the
+    order of ties at the MAX_RESCORED cut.
+    """
+
+    def __init__(self, path: str = FUZZY_INDEX_DIR):
+        self.path = path
+        meta_path = os.path.join(path, "index.json")
+        self.mtime_ns = os.stat(meta_path).st_mtime_ns
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        # Plain ndarray views of the mapping: slicing a memmap is several times slower
+        postings = np.memmap(os.path.join(path, meta["postings"]), dtype=np.int32, mode="r").view(np.ndarray)
+        for segment, (offset, length) in meta["segments"].items():
+            setattr(self, "_" + segment, postings[offset:offset + length])
+        self._features = {key: i for i, key in enumerate(meta["features"])}
+        self._first_code = meta["first_code"]
+        self._names = meta["names"]
+        self._companies = meta["companies"]
+        self._ids = [_decode_id(value) for value in meta["ids"]]
+        self.ready = True
+
+    def __len__(self):
+        return len(self._ids)
+
+    def changed_on_disk(self) -> bool:
+        """True when client_sync.py has saved a newer snapshot since this one."""
+        try:
+            return os.stat(os.path.join(self.path, "index.json")).st_mtime_ns != self.mtime_ns
+        except FileNotFoundError:
+            return False
+
+    @staticmethod
+    def _slice(pointers, items, number: int):
+        return items[pointers[number]:pointers[number + 1]]
+
+    def _count_shared(self, pointers, items, keys, candidates=None):
+        """
+        _count_shared over the mapped posting lists; returns the top item
+        numbers. `candidates`, when given, is a boolean mask over item numbers.
+        """
+        lists = sorted((self._slice(pointers, items, self._features[key]) for key in keys if key in self._features),
+                       key=len)
+        chosen = []
+        visited = 0
+        for posted in lists:
+            if candidates is not None:
+                posted = posted[candidates[posted]]
+            if visited and visited + len(posted) > POSTING_BUDGET:
+                break
+            chosen.append(posted)
+            visited += len(posted)
+        if not chosen:
+            return []
+        numbers, counts = np.unique(np.concatenate(chosen), return_counts=True)
+        return numbers[np.argsort(-counts, kind="stable")[:MAX_RESCORED]].tolist()
+
+    def _query_numbers(self, query: _Field) -> tuple:
+        """Feature numbers of a query field's (trigrams, phonetic codes) known to the index."""
+        features = self._features
+        return ({features[gram] for gram in query.grams if gram in features},
+                {features["#" + code] for code in query.codes if "#" + code in features})
+
+    def _similarity(self, query: _Field, query_numbers: tuple, text: str, feature_numbers) -> float:
+        """_Field.similarity against a stored field's text and sorted feature numbers."""
+        if not query.text or not text:
+            return 0.0
+        if query.text == text:
+            return 1.0
+        numbers = feature_numbers.tolist()
+        split = bisect_left(numbers, self._first_code)
+        grams, codes = query_numbers
+        return (TRIGRAM_WEIGHT * _dice_count(len(grams.intersection(numbers[:split])), len(query.grams), split)
+                + PHONETIC_WEIGHT * _dice_count(len(codes.intersection(numbers[split:])), len(query.codes),
+                                                len(numbers) - split))
+
+    def search(self, name: str, company: str, limit: int = 3) -> list:
+        """Same contract as ClientMatcher.search."""
+        query_name = _Field(client_lookup.name_tokens(name))
+        query_company = _Field(client_lookup.company_tokens(company))
+        if not (query_name.text and query_company.text):
+            return []
+        name_keys = query_name.features()
+        company_keys = query_company.features()
+
+        name_numbers = self._query_numbers(query_name)
+        name_sims = {}
+        for number in self._count_shared(self._name_postings_ptr, self._name_postings, name_keys):
+            sim = self._similarity(query_name, name_numbers, self._names[number],
+                                   self._slice(self._name_features_ptr, self._name_features, number))
+            if sim >= FUZZY_MIN_FIELD_SIMILARITY:
+                name_sims[number] = sim
+        if not name_sims:
+            return []
+
+        clients = np.concatenate([self._slice(self._name_clients_ptr, self._name_clients, number)
+                                  for number in name_sims])
+        if len(clients) > MAX_RESCORED:
+            candidates = np.zeros(len(self._ids), dtype=bool)
+            candidates[clients] = True
+            clients = self._count_shared(self._company_postings_ptr, self._company_postings, company_keys,
+                                         candidates)
+        else:
+            clients = clients.tolist()
+
+        company_numbers = self._query_numbers(query_company)
+        results = []
+        for client in clients:
+            company_sim = self._similarity(query_company, company_numbers, self._companies[client],
+                                           self._slice(self._company_features_ptr, self._company_features, client))
+            if company_sim >= FUZZY_MIN_FIELD_SIMILARITY:
+                confidence = (name_sims[int(self._client_names[client])] + company_sim) / 2
+                results.append((self._ids[client], round(confidence, 4)))
+
+        results.sort(key=lambda pair: pair[1], reverse=True)
+        return results[:limit]
+
+
+# ========== PROCESS-WIDE MATCHER ==========
+
+# client_sync.py builds and updates this one; job processes replace it with the
+# mapped snapshot
+matcher = ClientMatcher()
+
+
+def _open_snapshot() -> bool:
+    global matcher
+    try:
+        matcher = ClientSnapshot()
+    except FileNotFoundError:
+        logger.warning(f"No fuzzy client index at {FUZZY_INDEX_DIR} (is client_sync.py running?); "
+                       f"using Mongo lookups only")
+        return False
+    logger.info(f"Fuzzy client index mapped with {len(matcher)} clients")
+    return True
+
+
+def preload():
+    """Map the host's saved index (worker prewarm). No Mongo access."""
+    try:
+        _open_snapshot()
+    except Exception as e:
+        logger.warning(f"Fuzzy index preload failed, retrying at job start: {e}")
+
+
+async def start():
+    """At job start, map a snapshot saved since prewarm (idle processes can wait a long time)."""
+    if isinstance(matcher, ClientSnapshot) and not matcher.changed_on_disk():
+        return
+    try:
+        await asyncio.to_thread(_open_snapshot)
+    except Exception as e:
+        logger.warning(f"Fuzzy index reload failed: {e}")
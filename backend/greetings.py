@@ -0,0 +1,105 @@
+# greetings.py – Batch precomputation of personalized greetings stored on client documents
+#
+# Run after ingesting business cards (and after changing the greeting prompt or
+# model); only clients whose stored greeting is missing or stale are regenerated:
+#   python greetings.py
+#   python greetings.py --force --concurrency 4
+import os
+import asyncio
+import argparse
+import logging
+from collections import Counter
+from datetime import datetime, timezone
+from dotenv import load_dotenv
+
+import db
+import rag
+import client_lookup
+
+# ========== CONFIG ==========
+load_dotenv()
+
+# Greetings generated at once; keeps the job under the OpenAI rate limit
+GREETING_CONCURRENCY = int(os.getenv("GREETING_CONCURRENCY", "8"))
+
+logger = logging.getLogger("TekishoGreetings")
+
+
+async def _generate(profile: dict) -> dict:
+    """The greeting sub-document for a flattened profile."""
+    text = await rag.agenerate_greeting(profile["client_name"], profile["company"], rag.greeting_context(profile))
+    return {
+        "text": text,
+        "model": rag.GREETING_COMPLETION_PARAMS["model"],
+        "prompt_version": rag.GREETING_PROMPT_VERSION,
+        "profile_hash": rag.greeting_fingerprint(profile),
+        "generated_at": datetime.now(timezone.utc),
+    }
+
+
+async def precompute(collection=None, force: bool = False, concurrency: int = GREETING_CONCURRENCY,
+                     client_ids: list = None) -> Counter:
+    """
+    Generate and store greetings for clients (all, or `client_ids`) whose stored
+    greeting is missing or was written from another profile, model or prompt
+    version. Returns counts of generated, current, skipped and failed clients.
+    """
+    collection = collection if collection is not None else db.get_collection()
+    query = {"_id": {"$in": client_ids}} if client_ids is not None else {}
+    slots = asyncio.Semaphore(max(1, concurrency))
+    counts = Counter()
+    pending = set()
+
+    async def refresh(doc: dict):
+        profile = client_lookup.flatten_profile(doc)
+        async with slots:
+            try:
+                greeting = await _generate(profile)
+            except Exception as e:
+                counts["failed"] += 1
+                logger.warning(f"Greeting for {profile['client_name']} ({doc['_id']}) failed: {e}")
+                return
+        # Written one by one: a generation costs far more than the write, and an
+        # interrupted run keeps what it finished
+        try:
+            await collection.update_one({"_id": doc["_id"]}, {"$set": {rag.GREETING_FIELD: greeting}})
+        except Exception as e:
+            counts["failed"] += 1
+            logger.warning(f"Storing the greeting for {profile['client_name']} ({doc['_id']}) failed: {e}")
+            return
+        counts["generated"] += 1
+
+    async for doc in collection.find(query, rag.GREETING_PROJECTION):
+        if not force and rag.stored_greeting(doc) is not None:
+            counts["current"] += 1
+            continue
+        if not (client_lookup.flatten_profile(doc)["client_name"] and doc.get("company_name")):
+            counts["skipped"] += 1
+            continue
+        # Keep the cursor from running far ahead of the generations
+        if len(pending) >= 2 * concurrency:
+            _, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        pending.add(asyncio.create_task(refresh(doc)))
+
+    if pending:
+        await asyncio.wait(pending)
+    logger.info(f"Greetings: {dict(counts)}")
+    return counts
+
+
+# ========== MAIN ==========
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Precompute personalized greetings for the clients collection")
+    parser.add_argument("--force", action="store_true", help="regenerate current greetings too")
+    parser.add_argument("--concurrency", type=int, default=GREETING_CONCURRENCY)
+    args = parser.parse_args()
+
+    async def _main():
+        # The live path reads greetings through the lookup indexes
+        await client_lookup.ensure_indexes()
+        await precompute(force=args.force, concurrency=args.concurrency)
+        await rag.aclose()
+        await db.aclose()
+
+    asyncio.run(_main())
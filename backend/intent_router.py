@@ -0,0 +1,192 @@
+# intent_router.py – Route solutions queries to services vs. use cases by embedding centroids
+#
+# Train the centroids offline (embeds the seed and any labeled queries in the
+# form the agent routes them, then writes INTENT_CENTROIDS_PATH):
+#   python intent_router.py --labeled labeled_queries.json
+import os
+import json
+import time
+import logging
+import numpy as np
+from dotenv import load_dotenv
+
+# ========== CONFIG ==========
+load_dotenv()
+
+INTENT_CENTROIDS_PATH = os.getenv(
+    "INTENT_CENTROIDS_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "intent_centroids.json"),
+)
+# Cosine-similarity lead the best intent needs over the runner-up to skip the dual query
+INTENT_MIN_MARGIN = float(os.getenv("INTENT_MIN_MARGIN", "0.03"))
+
+logger = logging.getLogger("TekishoIntentRouter")
+
+# The agent routes "<challenge> in <industry> industry"; training queries without
+# their own industry are expanded over these (None keeps the bare query)
+TRAINING_INDUSTRIES = [None, "Retail", "Healthcare", "Manufacturing", "Logistics", "Finance", "Technology",
+                       "Energy", "Insurance"]
+
+# Labeled examples every centroid starts from; extend with --labeled
+SEED_QUERIES = {
+    "services": [
+        "What services does Tekisho offer?",
+        "Do you build custom AI chatbots?",
+        "Can you help us automate document processing?",
+        "What technologies do you work with?",
+        "Do you offer computer vision solutions?",
+        "We need help with data engineering and analytics",
+        "Can Tekisho build a voice assistant for our call center?",
+        "What is your approach to digital transformation?",
+        "Do you provide machine learning consulting?",
+        "Our invoices are processed manually, can you automate that?",
+    ],
+    "use_cases": [
+        "What ROI have your clients seen?",
+        "Show me a case study in healthcare",
+        "How much cost saving can we expect?",
+        "Give me an example of a retail implementation",
+        "What results did you achieve for a bank?",
+        "How long does implementation usually take?",
+        "What productivity improvements have customers reported?",
+        "What was the revenue impact for similar companies?",
+        "Tell me about invoice processing use case with ROI",
+        "What business impact did the AI rollout have in manufacturing?",
+    ],
+}
+
+
+class IntentRouter:
+    """
+    Nearest-centroid classifier over query embeddings. route() returns the
+    best intent only when it beats the runner-up by at least `min_margin`
+    in cosine similarity, so callers can fall back to querying every intent.
+    """
+
+    def __init__(self, path: str = INTENT_CENTROIDS_PATH, min_margin: float = INTENT_MIN_MARGIN):
+        self.path = path
+        self.min_margin = min_margin
+        self.intents = []
+        self._centroids = None  # (intents, dim) matrix of unit vectors
+        self.confident = 0
+        self.fallbacks = 0
+        self.route_seconds = 0.0
+
+    @property
+    def ready(self) -> bool:
+        return self._centroids is not None
+
+    def load(self, embed_model: str, embed_dim: int) -> bool:
+        """Load centroids trained for this embedding model; False if there are none."""
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                saved = json.load(f)
+        except FileNotFoundError:
+            logger.info(f"No intent centroids at {self.path}; using keyword routing with dual retrieval")
+            return False
+        if (saved.get("embed_model"), saved.get("embed_dim")) != (embed_model, embed_dim):
+            logger.warning("Intent centroids were trained for another embedding model; ignoring them")
+            return False
+        self.set_centroids(saved["centroids"])
+        logger.info(f"Loaded intent centroids for {self.intents} (trained on {saved.get('examples')} queries)")
+        return True
+
+    def set_centroids(self, centroids: dict):
+        self.intents = sorted(centroids)
+        self._centroids = np.array([centroids[intent] for intent in self.intents], dtype=np.float32)
+
+    def scores(self, emb) -> np.ndarray:
+        vec = np.asarray(emb, dtype=np.float32)
+        norm = np.linalg.norm(vec)
+        return self._centroids @ (vec / norm if norm else vec)
+
+    def route(self, emb):
+        """Return (intent, margin) if confident, else None."""
+        if self._centroids is None or emb is None:
+            return None
+        start = time.perf_counter()
+        sims = self.scores(emb)
+        order = np.argsort(sims)[::-1]
+        margin = float(sims[order[0]] - sims[order[1]]) if len(order) > 1 else 1.0
+        self.route_seconds += time.perf_counter() - start
+        if margin < self.min_margin:
+            self.fallbacks += 1
+            return None
+        self.confident += 1
+        return self.intents[order[0]], margin
+
+    def stats(self) -> dict:
+        decisions = self.confident + self.fallbacks
+        return {
+            "decisions": decisions,
+            "confident": self.confident,
+            "fallbacks": self.fallbacks,
+            "avg_route_us": round(self.route_seconds / decisions * 1e6, 1) if decisions else 0.0,
+        }
+
+
+def train_centroids(examples) -> dict:
+    """Mean unit embedding per intent from (embedding, intent) pairs."""
+    sums = {}
+    for emb, intent in examples:
+        vec = np.asarray(emb, dtype=np.float32)
+        vec = vec / (np.linalg.norm(vec) or 1.0)
+        sums[intent] = sums.get(intent, 0) + vec
+    return {intent: (total / (np.linalg.norm(total) or 1.0)).tolist() for intent, total in sums.items()}
+
+
+def routing_query(challenge: str, industry: str = None) -> str:
+    """The query text the solutions path embeds and routes for a challenge."""
+    return f"{challenge} in {industry} industry" if industry else challenge
+
+
+def labeled_examples(path: str = None) -> list:
+    """
+    (query, intent, source) triples: the seed queries plus a JSON list of
+    {"query", "intent"[, "industry"]}, each as routing_query() phrases it for
+    its own industry or for every TRAINING_INDUSTRIES entry. `source` numbers
+    the labeled query a triple came from.
+    """
+    items = [{"query": query, "intent": intent} for intent, queries in SEED_QUERIES.items() for query in queries]
+    if path:
+        with open(path, "r", encoding="utf-8") as f:
+            items.extend(json.load(f))
+    return [
+        (routing_query(item["query"], industry), item["intent"], source)
+        for source, item in enumerate(items)
+        for industry in ([item["industry"]] if item.get("industry") else TRAINING_INDUSTRIES)
+    ]
+
+
+def save_centroids(centroids: dict, embed_model: str, embed_dim: int, examples: int, path: str = INTENT_CENTROIDS_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"embed_model": embed_model, "embed_dim": embed_dim, "examples": examples,
+                   "centroids": centroids}, f)
+    os.replace(tmp_path, path)
+
+
+if __name__ == "__main__":
+    import argparse
+    import rag
+
+    parser = argparse.ArgumentParser(description="Train intent centroids from labeled queries")
+    parser.add_argument("--labeled",
+                        help='JSON list of {"query": ..., "intent": "services"|"use_cases", "industry": optional}')
+    args = parser.parse_args()
+
+    labeled = labeled_examples(args.labeled)
+    embeddings = {}
+    for positions, embs in rag.iter_openai_embeddings([query for query, _, _ in labeled]):
+        for position, emb in zip(positions, embs):
+            # Failed batches yield None; train on what was embedded
+            if emb is not None:
+                embeddings[position] = emb
+    examples = [(embeddings[i], intent) for i, (_, intent, _) in enumerate(labeled) if i in embeddings]
+    if not examples:
+        raise SystemExit("No labeled query could be embedded; centroids not written")
+    if len(examples) < len(labeled):
+        logger.warning(f"{len(labeled) - len(examples)} of {len(labeled)} labeled queries failed to embed")
+    save_centroids(train_centroids(examples), rag.EMBED_MODEL, rag.EMBED_DIM, len(examples))
+    logger.info(f"Wrote centroids for {len(examples)} labeled queries to {INTENT_CENTROIDS_PATH}")
@@ -0,0 +1,169 @@
+# local_index.py – In-process vector index mirroring the subset of the Pinecone API rag.py uses
+import os
+import json
+import logging
+import numpy as np
+
+logger = logging.getLogger("TekishoLocalIndex")
+
+
+class LocalVectorIndex:
+    """
+    Normalized float32 embeddings in a memory-mapped matrix file plus a JSON
+    sidecar of ids and metadata. Supports upsert/delete/query like a Pinecone
+    index, with vectorized cosine top-k and equality filters on metadata
+    (e.g. {"doc_type": {"$eq": "services"}}). Mutations stay in memory until
+    save().
+    """
+
+    def __init__(self, path: str, dim: int):
+        self.path = path
+        self.dim = dim
+        self._vectors_path = os.path.join(path, "vectors.f32")
+        self._meta_path = os.path.join(path, "meta.json")
+        self._ids = []
+        self._metadata = []
+        self._matrix = np.zeros((0, dim), dtype=np.float32)
+        self._rows = {}  # id -> row
+        self._filter_rows = {}  # (field, value) -> row indices
+        self.load()
+
+    def __len__(self):
+        return len(self._ids)
+
+    # ---------- persistence ----------
+
+    def load(self):
+        """Memory-map the saved index, if there is one."""
+        if not os.path.exists(self._meta_path):
+            return
+        with open(self._meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        count = len(meta["ids"])
+        if meta["dim"] != self.dim:
+            logger.warning(f"Local index at {self.path} has dim {meta['dim']}, expected {self.dim}; ignoring it")
+            return
+        if count:
+            self._matrix = np.memmap(self._vectors_path, dtype=np.float32, mode="r", shape=(count, self.dim))
+        else:
+            self._matrix = np.zeros((0, self.dim), dtype=np.float32)
+        self._ids = meta["ids"]
+        self._metadata = meta["metadata"]
+        self._reindex()
+        logger.info(f"Loaded local vector index with {count} vectors from {self.path}")
+
+    def save(self):
+        """Write the matrix and metadata atomically, then re-map the saved file."""
+        os.makedirs(self.path, exist_ok=True)
+        tmp_vectors = self._vectors_path + ".tmp"
+        np.ascontiguousarray(self._matrix, dtype=np.float32).tofile(tmp_vectors)
+        tmp_meta = self._meta_path + ".tmp"
+        with open(tmp_meta, "w", encoding="utf-8") as f:
+            json.dump({"dim": self.dim, "ids": self._ids, "metadata": self._metadata}, f, ensure_ascii=False)
+        os.replace(tmp_vectors, self._vectors_path)
+        os.replace(tmp_meta, self._meta_path)
+        self.load()
+
+    # ---------- mutation ----------
+
+    def _reindex(self):
+        self._rows = {vector_id: row for row, vector_id in enumerate(self._ids)}
+        self._filter_rows = {}
+
+    def _writable(self) -> np.ndarray:
+        if isinstance(self._matrix, np.memmap):
+            self._matrix = np.array(self._matrix)
+        return self._matrix
+
+    def upsert(self, vectors: list, **kwargs):
+        """Insert or replace {"id", "values", "metadata"} records."""
+        matrix = self._writable()
+        new_rows = []
+        for vector in vectors:
+            values = np.asarray(vector["values"], dtype=np.float32)
+            norm = np.linalg.norm(values)
+            values = values / norm if norm else values
+            row = self._rows.get(vector["id"])
+            if row is not None:
+                matrix[row] = values
+                self._metadata[row] = vector.get("metadata", {})
+            else:
+                self._rows[vector["id"]] = len(self._ids)
+                self._ids.append(vector["id"])
+                self._metadata.append(vector.get("metadata", {}))
+                new_rows.append(values)
+        if new_rows:
+            self._matrix = np.vstack([matrix, np.stack(new_rows)])
+        self._filter_rows = {}
+        return {"upserted_count": len(vectors)}
+
+    def delete(self, ids: list = None, delete_all: bool = False, **kwargs):
+        """Delete vectors by id, or everything."""
+        if delete_all:
+            self._ids, self._metadata = [], []
+            self._matrix = np.zeros((0, self.dim), dtype=np.float32)
+            self._reindex()
+            return
+        doomed = {self._rows[vector_id] for vector_id in ids or [] if vector_id in self._rows}
+        if not doomed:
+            return
+        keep = [row for row in range(len(self._ids)) if row not in doomed]
+        self._matrix = np.asarray(self._matrix)[keep]
+        self._ids = [self._ids[row] for row in keep]
+        self._metadata = [self._metadata[row] for row in keep]
+        self._reindex()
+
+    # ---------- query ----------
+
+    def _rows_matching(self, filter_dict: dict):
+        """Row indices matching an equality/$eq/$in filter, or None for no filter."""
+        if not filter_dict:
+            return None
+        rows = None
+        for field, condition in filter_dict.items():
+            if isinstance(condition, dict) and "$in" in condition:
+                values = tuple(condition["$in"])
+            else:
+                values = (condition["$eq"] if isinstance(condition, dict) else condition,)
+            cache_key = (field, values)
+            if cache_key not in self._filter_rows:
+                self._filter_rows[cache_key] = np.array(
+                    [row for row, meta in enumerate(self._metadata) if meta.get(field) in values], dtype=np.int64
+                )
+            matched = self._filter_rows[cache_key]
+            rows = matched if rows is None else np.intersect1d(rows, matched)
+        return rows
+
+    def query(self, vector, top_k: int, include_metadata: bool = False, filter: dict = None,
+              include_values: bool = False, **kwargs) -> dict:
+        """Cosine top-k, shaped like a Pinecone query response (values are the normalized vectors)."""
+        if not self._ids:
+            return {"matches": []}
+        q = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(q)
+        q = q / norm if norm else q
+
+        rows = self._rows_matching(filter)
+        if rows is not None and not len(rows):
+            return {"matches": []}
+        # Score every row in one GEMV, then select; cheaper than gathering rows
+        scores = self._matrix @ q
+        if rows is not None:
+            scores = scores[rows]
+
+        k = min(top_k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        matches = []
+        for i in top:
+            row = int(i) if rows is None else int(rows[i])
+            match = {"id": self._ids[row], "score": float(scores[i])}
+            if include_metadata:
+                match["metadata"] = self._metadata[row]
+            if include_values:
+                match["values"] = self._matrix[row].tolist()
+            matches.append(match)
+        return {"matches": matches}
+
+    def describe_index_stats(self, **kwargs) -> dict:
+        return {"dimension": self.dim, "total_vector_count": len(self._ids)}
@@ -0,0 +1,175 @@
+# prefetch.py – Speculative per-session RAG work once the client's industry is known
+import os
+import asyncio
+import logging
+import numpy as np
+from dotenv import load_dotenv
+from answer_cache import SemanticAnswerCache
+import rag
+import telemetry
+
+# ========== CONFIG ==========
+load_dotenv()
+
+PREFETCH_ENABLED = os.getenv("PREFETCH_ENABLED", "1") == "1"
+# Chunks fetched (with vectors) per doc type, nearest the industry first. A pool
+# holding the whole doc type serves every query exactly; a partial one only
+# those close enough to the industry anchor (see CandidatePool)
+PREFETCH_POOL_SIZE = int(os.getenv("PREFETCH_POOL_SIZE", "200"))
+# Also generate answers to the likely questions below, not just fetch candidates.
+# Off by default: it costs len(DRAFT_QUESTIONS) retrievals and gpt-4o-mini
+# answers per identified visitor, whether or not they ever ask a question
+PREFETCH_DRAFT_ANSWERS = os.getenv("PREFETCH_DRAFT_ANSWERS", "0") == "1"
+# Speculative RAG calls in flight at once, across all sessions in this process
+PREFETCH_MAX_CONCURRENCY = int(os.getenv("PREFETCH_MAX_CONCURRENCY", "2"))
+
+# What the candidate pools are centred on, per doc type
+ANCHOR_QUERIES = {
+    "services": "AI services and solutions for the {industry} industry",
+    "use_cases": "AI use cases, ROI and results in the {industry} industry",
+}
+# Likely first questions, phrased as the agent passes challenges to
+# get_tekisho_solutions; the industry is appended by rag._plan_solutions_query
+DRAFT_QUESTIONS = [
+    "How can AI help our business",
+    "What ROI and cost savings can we expect from AI",
+    "Automating manual processes and workflows",
+    "Improving customer experience with AI",
+]
+
+# Float32 scores from the index aren't exact; stay on the safe side of the bound
+ANGLE_EPSILON = 1e-3
+
+logger = logging.getLogger("TekishoPrefetch")
+
+# Shared by every session in the process so speculation can't crowd out live turns
+_budget = asyncio.Semaphore(max(1, PREFETCH_MAX_CONCURRENCY))
+
+
+def _unit(vec) -> np.ndarray:
+    vec = np.asarray(vec, dtype=np.float32)
+    norm = np.linalg.norm(vec)
+    return vec / norm if norm else vec
+
+
+class CandidatePool:
+    """
+    The chunks of one doc type nearest to an anchor query, with their vectors.
+    search() ranks them against a new query in memory and returns the top-k
+    only when they must be the index's own top-k: every chunk outside the pool
+    is at least `radius` (angle) from the anchor, so by the triangle inequality
+    it is at least radius - angle(anchor, query) from the query.
+    """
+
+    def __init__(self, anchor, hits: list, complete: bool):
+        self.anchor = _unit(anchor)
+        self.hits = [{key: value for key, value in hit.items() if key != "values"} for hit in hits]
+        self.vectors = np.stack([_unit(hit["values"]) for hit in hits])
+        self.radius = float(np.arccos(np.clip(min(hit["score"] for hit in hits), -1.0, 1.0)))
+        # The pool holds every chunk of its doc type, so any ranking from it is exact
+        self.complete = complete
+
+    def search(self, emb, top_k: int):
+        q = _unit(emb)
+        sims = self.vectors @ q
+        if len(sims) < top_k and not self.complete:
+            return None
+        top = np.argsort(-sims)[:top_k]
+        if not self.complete:
+            offset = float(np.arccos(np.clip(self.anchor @ q, -1.0, 1.0)))
+            kth = float(np.arccos(np.clip(sims[top[-1]], -1.0, 1.0)))
+            if kth > self.radius - offset - ANGLE_EPSILON:
+                return None
+        return [{**self.hits[i], "score": float(sims[i])} for i in top]
+
+
+class SessionPrefetch:
+    """
+    One session's speculative RAG state for the client's industry: candidate
+    pools per doc type (so retrieval can skip the vector index) and drafted
+    answers to likely questions (matched like answer_cache). rag's solutions
+    functions consult it through their `session` argument.
+    """
+
+    def __init__(self, formatter=None):
+        self.formatter = formatter
+        self.industry = None
+        self.pools = {}
+        self.answers = SemanticAnswerCache(max_entries=len(DRAFT_QUESTIONS))
+        self.pool_hits = 0
+        self.pool_misses = 0
+        self._task = None
+
+    def start(self, industry: str):
+        """Prefetch for `industry` in the background, replacing any earlier prefetch."""
+        if not PREFETCH_ENABLED or not industry or industry == self.industry:
+            return
+        self.cancel()
+        self.pools = {}
+        self.answers.clear()
+        self.industry = industry
+        self._task = asyncio.create_task(self._run(industry))
+
+    def cancel(self):
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+
+    async def aclose(self):
+        """Cancel speculative work still running (call on session shutdown)."""
+        self.cancel()
+        if self._task is not None:
+            await asyncio.gather(self._task, return_exceptions=True)
+            logger.info(f"Prefetch stats: {self.stats()}")
+
+    def stats(self) -> dict:
+        return {"industry": self.industry, "pools": {doc_type: len(pool.hits) for doc_type, pool in self.pools.items()},
+                "pool_hits": self.pool_hits, "pool_misses": self.pool_misses, "answers": self.answers.stats()}
+
+    async def _run(self, industry: str):
+        with telemetry.span("rag.prefetch", industry=industry):
+            # Candidates first: cheap, and they serve any question; then the drafts
+            await asyncio.gather(*(self._fetch_pool(doc_type, query.format(industry=industry))
+                                   for doc_type, query in ANCHOR_QUERIES.items()))
+            if PREFETCH_DRAFT_ANSWERS:
+                await asyncio.gather(*(self._draft(question, industry) for question in DRAFT_QUESTIONS))
+        logger.info(f"Prefetched for {industry}: {self.stats()}")
+
+    async def _fetch_pool(self, doc_type: str, query: str):
+        async with _budget:
+            try:
+                emb, hits = await rag.aprefetch_candidates(query, doc_type, PREFETCH_POOL_SIZE)
+            except Exception as e:
+                logger.warning(f"Prefetching {doc_type} candidates failed: {e}")
+                return
+        if hits:
+            self.pools[doc_type] = CandidatePool(emb, hits, complete=len(hits) < PREFETCH_POOL_SIZE)
+
+    async def _draft(self, question: str, industry: str):
+        async with _budget:
+            try:
+                await rag.aprefetch_answer(question, industry, self)
+            except Exception as e:
+                logger.warning(f"Drafting an answer to {question!r} failed: {e}")
+
+    # ------------------
+    # Used by rag
+    # ------------------
+    def vector_hits(self, emb, doc_type: str, top_k: int):
+        """The index's top-k for `emb` from the prefetched candidates, or None if they can't tell."""
+        pool = self.pools.get(doc_type)
+        hits = pool.search(emb, top_k) if pool is not None and emb is not None else None
+        if hits is None:
+            self.pool_misses += 1
+        else:
+            self.pool_hits += 1
+        telemetry.cache_lookup("prefetch_pool", hits is not None)
+        return hits
+
+    # Keyed on the industry the query was planned with, like rag's answer cache
+    def remember_answer(self, emb, industry: str, response_type: str, answer: str):
+        self.answers.put(emb, industry, response_type, answer)
+
+    def lookup_answer(self, emb, industry: str, response_type: str):
+        hit = self.answers.lookup(emb, industry, response_type) if emb is not None else None
+        telemetry.cache_lookup("prefetch_answer", hit is not None)
+        return hit[0] if hit else None
@@ -0,0 +1,272 @@
+# profile_cache.py – TTL/LRU cache of flattened client profiles, shared by this host's job processes
+import os
+import json
+import time
+import sqlite3
+import asyncio
+import logging
+import threading
+from dotenv import load_dotenv
+from pymongo.errors import OperationFailure
+
+import db
+import client_lookup
+import fuzzy_index
+
+# ========== CONFIG ==========
+load_dotenv()
+
+PROFILE_CACHE_MAX_ENTRIES = int(os.getenv("PROFILE_CACHE_MAX_ENTRIES", "1000"))
+PROFILE_CACHE_TTL = float(os.getenv("PROFILE_CACHE_TTL", "86400"))  # repeat visits within a day
+# SQLite file shared by every job process on this host, so returning visitors and
+# reconnects hit the cache after the session that cached them has exited.
+# Empty keeps the cache in the process, where it dies with the job.
+PROFILE_CACHE_PATH = os.getenv(
+    "PROFILE_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "profiles.sqlite"),
+) or None
+# Used when the deployment has no change streams (standalone mongod)
+PROFILE_CACHE_POLL_INTERVAL = float(os.getenv("PROFILE_CACHE_POLL_INTERVAL", "30"))
+# Spoken (name, company) keys remembered per cached profile
+MAX_QUERY_KEYS = 8
+
+logger = logging.getLogger("TekishoProfileCache")
+
+
+# ========== CACHE ==========
+
+class ProfileCache:
+    """
+    Bounded cache of flattened profiles keyed by record id, plus a map from
+    normalized spoken (name, company) to record id so repeat lookups skip Mongo.
+    Entries expire after `ttl` seconds and the least recently used is evicted.
+    Stored in SQLite at `path` so it outlives the job process; every call does
+    file I/O, so async callers run it in a thread.
+    Hit/miss counters are per process and per cache probe (get or get_by_id).
+    """
+
+    def __init__(self, max_entries: int = PROFILE_CACHE_MAX_ENTRIES, ttl: float = PROFILE_CACHE_TTL,
+                 path: str = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.path = path or ":memory:"
+        self._lock = threading.Lock()
+        self._conn = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def __len__(self):
+        with self._lock:
+            return self._db().execute("SELECT COUNT(*) FROM profiles").fetchone()[0]
+
+    def _db(self):
+        if self._conn is None:
+            if self.path != ":memory:":
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=5.0)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS profiles (record_id TEXT PRIMARY KEY, profile TEXT, "
+                "expires_at REAL, used_at REAL)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS queries (key TEXT PRIMARY KEY, record_id TEXT, added_at REAL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS queries_record ON queries (record_id, added_at)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS profiles_used ON profiles (used_at)")
+        return self._conn
+
+    @property
+    def persistent(self) -> bool:
+        return self.path != ":memory:"
+
+    @staticmethod
+    def query_key(name: str, company: str) -> str:
+        return client_lookup.normalize(name) + "|" + " ".join(client_lookup.company_tokens(company))
+
+    @staticmethod
+    def _drop(conn, record_id: str):
+        conn.execute("DELETE FROM profiles WHERE record_id = ?", (record_id,))
+        conn.execute("DELETE FROM queries WHERE record_id = ?", (record_id,))
+
+    def _get(self, conn, record_id: str):
+        row = conn.execute("SELECT profile, expires_at FROM profiles WHERE record_id = ?", (record_id,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        now = time.time()
+        if row[1] < now:
+            with conn:
+                self._drop(conn, record_id)
+            self.expirations += 1
+            self.misses += 1
+            return None
+        with conn:
+            conn.execute("UPDATE profiles SET used_at = ? WHERE record_id = ?", (now, record_id))
+        self.hits += 1
+        return json.loads(row[0])
+
+    def get_by_id(self, record_id: str):
+        """Return the cached profile for a record id, or None."""
+        with self._lock:
+            return self._get(self._db(), record_id)
+
+    def get(self, name: str, company: str):
+        """Return the cached profile previously found for this name/company, or None."""
+        with self._lock:
+            conn = self._db()
+            row = conn.execute("SELECT record_id FROM queries WHERE key = ?",
+                               (self.query_key(name, company),)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            return self._get(conn, row[0])
+
+    def put(self, profile: dict, name: str = None, company: str = None):
+        """Cache a profile, optionally remembering the spoken name/company that found it."""
+        record_id = profile["record_id"]
+        now = time.time()
+        with self._lock:
+            conn = self._db()
+            with conn:
+                conn.execute("INSERT OR REPLACE INTO profiles VALUES (?, ?, ?, ?)",
+                             (record_id, json.dumps(profile), now + self.ttl, now))
+                if name is not None or company is not None:
+                    conn.execute("INSERT OR REPLACE INTO queries VALUES (?, ?, ?)",
+                                 (self.query_key(name or "", company or ""), record_id, now))
+                    conn.execute(
+                        "DELETE FROM queries WHERE key IN (SELECT key FROM queries WHERE record_id = ? "
+                        "ORDER BY added_at DESC LIMIT -1 OFFSET ?)", (record_id, MAX_QUERY_KEYS))
+                excess = conn.execute("SELECT COUNT(*) FROM profiles").fetchone()[0] - self.max_entries
+                if excess > 0:
+                    oldest = conn.execute("SELECT record_id FROM profiles ORDER BY used_at LIMIT ?",
+                                          (excess,)).fetchall()
+                    for (oldest_id,) in oldest:
+                        self._drop(conn, oldest_id)
+                    self.evictions += len(oldest)
+
+    def replace(self, profile: dict) -> bool:
+        """Refresh a cached profile in place, keeping its expiry; returns True if it was cached."""
+        with self._lock:
+            conn = self._db()
+            with conn:
+                cursor = conn.execute("UPDATE profiles SET profile = ? WHERE record_id = ?",
+                                      (json.dumps(profile), profile["record_id"]))
+        return cursor.rowcount > 0
+
+    def invalidate(self, record_id: str) -> bool:
+        """Forget one profile; returns True if it was cached."""
+        with self._lock:
+            conn = self._db()
+            with conn:
+                cursor = conn.execute("DELETE FROM profiles WHERE record_id = ?", (record_id,))
+                conn.execute("DELETE FROM queries WHERE record_id = ?", (record_id,))
+        if cursor.rowcount == 0:
+            return False
+        self.invalidations += 1
+        return True
+
+    def snapshot(self) -> dict:
+        """Record id -> profile for every cached entry (no LRU or metric side effects)."""
+        with self._lock:
+            rows = self._db().execute("SELECT record_id, profile FROM profiles").fetchall()
+        return {record_id: json.loads(profile) for record_id, profile in rows}
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+        }
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+cache = ProfileCache(path=PROFILE_CACHE_PATH)
+
+
+# ========== INVALIDATION ==========
+# Run once per host by client_sync.py, not per session: one change stream (or
+# poll) keeps the shared cache current for every job process.
+
+def _apply_change(change: dict):
+    """Refresh or drop the cached profile and update the fuzzy index for one change event."""
+    # client_lookup.maintain only rewrites the lookup keys; greetings.py changes
+    # the profile's greeting but nothing the fuzzy index matches on
+    description = change.get("updateDescription") or {}
+    updated = {field.split(".")[0] for field in
+               list(description.get("updatedFields") or {}) + list(description.get("removedFields") or [])}
+    if updated and updated <= {client_lookup.LOOKUP_FIELD}:
+        return
+    record_id = str(change["documentKey"]["_id"])
+    doc = change.get("fullDocument")
+    if change["operationType"] == "delete" or doc is None:
+        cache.invalidate(record_id)
+    else:
+        cache.replace(client_lookup.flatten_profile(doc))
+    if updated and updated <= {client_lookup.LOOKUP_FIELD, client_lookup.GREETING_FIELD}:
+        return
+    if change["operationType"] == "delete":
+        fuzzy_index.matcher.remove(record_id)
+    elif doc:
+        fuzzy_index.matcher.upsert(doc)
+
+
+async def _watch_change_stream(collection):
+    pipeline = [{"$match": {"operationType": {"$in": ["insert", "update", "replace", "delete"]}}}]
+    async with await collection.watch(pipeline, full_document="updateLookup") as stream:
+        logger.info("Watching clients collection for profile changes")
+        async for change in stream:
+            _apply_change(change)
+
+
+async def _poll_cached_profiles(collection):
+    """Re-read the cached records and refresh or drop any that changed or disappeared."""
+    logger.info(f"Change streams unavailable; polling cached profiles every {PROFILE_CACHE_POLL_INTERVAL}s")
+    while True:
+        await asyncio.sleep(PROFILE_CACHE_POLL_INTERVAL)
+        cached = cache.snapshot()
+        if not cached:
+            continue
+        try:
+            current = {}
+            ids = [client_lookup.to_object_id(record_id) for record_id in cached]
+            async for doc in collection.find({"_id": {"$in": ids}}, client_lookup.PROFILE_PROJECTION):
+                current[str(doc["_id"])] = doc
+            for record_id, profile in cached.items():
+                doc = current.get(record_id)
+                if doc is None:
+                    cache.invalidate(record_id)
+                    fuzzy_index.matcher.remove(record_id)
+                elif client_lookup.flatten_profile(doc) != profile:
+                    cache.replace(client_lookup.flatten_profile(doc))
+                    fuzzy_index.matcher.upsert(doc)
+        except Exception as e:
+            logger.warning(f"Profile cache poll failed: {e}")
+
+
+async def keep_current(collection=None):
+    """Keep the shared cache in sync with Mongo until cancelled."""
+    collection = collection if collection is not None else db.get_collection()
+    try:
+        await _watch_change_stream(collection)
+    except OperationFailure as e:
+        # Standalone servers reject $changeStream; fall back to polling
+        logger.info(f"Change stream not available ({e.code}): {e}")
+        await _poll_cached_profiles(collection)
+    except Exception as e:
+        logger.warning(f"Change stream stopped, polling instead: {e}")
+        await _poll_cached_profiles(collection)
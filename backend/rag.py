@@ -1,11 +1,29 @@
 import os
 import json
+import time
+import asyncio
+import hashlib
+import random
 import logging
+import threading
+import contextvars
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pinecone import Pinecone, ServerlessSpec
 from dotenv import load_dotenv
 from tqdm import tqdm
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI, RateLimitError, APIConnectionError, APITimeoutError, InternalServerError
 from pymongo import MongoClient
+from embedding_cache import EmbeddingCache
+from answer_cache import SemanticAnswerCache, ANSWER_CACHE_PATH
+from local_index import LocalVectorIndex
+import doc_chunker
+from context_packer import pack_context
+from bm25_index import BM25Index, reciprocal_rank_fusion
+from intent_router import IntentRouter, routing_query
+import db as mongo_pool
+import client_lookup
+import telemetry
 
 # ========== CONFIG ==========
 load_dotenv()
@@ -14,201 +32,570 @@ PINECONE_API_KEY = os.getenv("PINECONE_API_KEY")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
 INDEX_NAME = "tekisho-rag-openai-v1"  # New index for OpenAI embeddings
+PINECONE_INDEX_HOST = os.getenv("PINECONE_INDEX_HOST")  # optional; skips the describe_index call
 EMBED_MODEL = "text-embedding-3-small"  # Best OpenAI embedding model
 EMBED_DIM = 1536  # Full dimensionality for text-embedding-3-small
 DOCS_DIR = "Rag_docs"
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache")
 
-# Chunking parameters
+# "pinecone" (serverless, default) or "local" (memory-mapped NumPy index built
+# by the same ingestion; no network hop per query, works offline)
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "pinecone").lower()
+LOCAL_INDEX_DIR = os.getenv("LOCAL_INDEX_DIR", os.path.join(CACHE_DIR, f"{INDEX_NAME}.local"))
+
+# BM25 index over the same chunk ids, built by ingestion. "hybrid" retrieval
+# fuses it with vector hits by reciprocal rank fusion; "vector" skips it.
+# Either can be chosen per query with the `retrieval` argument.
+BM25_INDEX_PATH = os.getenv("BM25_INDEX_PATH", os.path.join(CACHE_DIR, f"{INDEX_NAME}.bm25.json"))
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid").lower()
+
+# Records what is already in the index so re-ingestion only touches changes
+# (one manifest per backend; ingest each backend you use)
+INGEST_MANIFEST_PATH = os.getenv(
+    "INGEST_MANIFEST_PATH",
+    os.path.join(CACHE_DIR, f"{INDEX_NAME}.local.manifest.json" if VECTOR_BACKEND == "local"
+                 else f"{INDEX_NAME}.manifest.json"),
+)
+
+# Ingestion publishes the index version to this Mongo collection so workers on
+# other machines drop cached answers after a re-ingest (the manifest above is local)
+INDEX_VERSION_COLLECTION = os.getenv("INDEX_VERSION_COLLECTION", "rag_index_versions")
+INDEX_VERSION_ID = f"{INDEX_NAME}:{VECTOR_BACKEND}"
+# Seconds a worker trusts the index version it last read
+INDEX_VERSION_REFRESH = float(os.getenv("INDEX_VERSION_REFRESH", "30"))
+
+# Chunking parameters (tokens of the embedding model's tokenizer)
 MAX_CHUNK_LENGTH = 400
 CHUNK_OVERLAP = 50
 
+# Ingestion throughput: inputs per embeddings request, requests in flight,
+# retries on rate limits / transient errors, vectors per Pinecone upsert
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+EMBED_MAX_CONCURRENCY = int(os.getenv("EMBED_MAX_CONCURRENCY", "4"))
+EMBED_MAX_RETRIES = int(os.getenv("EMBED_MAX_RETRIES", "6"))
+UPSERT_BATCH_SIZE = 100
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("TekishoRAG")
 
 # ========== INITIALIZE ==========
-logger.info("Initializing Pinecone and OpenAI clients...")
-
-pc = Pinecone(api_key=PINECONE_API_KEY)
-if INDEX_NAME not in pc.list_indexes().names():
-    logger.info(f"Creating index '{INDEX_NAME}' in Pinecone...")
-    pc.create_index(
-        name=INDEX_NAME,
-        dimension=EMBED_DIM,
-        metric="cosine",
-        spec=ServerlessSpec(cloud="aws", region="us-east-1"),
-    )
+# Clients and the index are created on first use (or by init()), never at
+# import, so importing rag costs no network round trips and cannot fail
+# offline. Creating the Pinecone index is left to the ingestion CLI.
+
+pc = None
+index = None
+_index_host = PINECONE_INDEX_HOST  # resolved once, shared by the sync and async index
+lexical_index = None
+intent_router = None
+openai_client = None
+_init_lock = threading.Lock()
+
+
+def _get_pinecone():
+    global pc
+    if pc is None:
+        pc = Pinecone(api_key=PINECONE_API_KEY)
+    return pc
+
+
+def ensure_index():
+    """Create the Pinecone index if it does not exist yet (ingestion only)."""
+    if VECTOR_BACKEND == "local":
+        return
+    client = _get_pinecone()
+    if INDEX_NAME not in client.list_indexes().names():
+        logger.info(f"Creating index '{INDEX_NAME}' in Pinecone...")
+        client.create_index(
+            name=INDEX_NAME,
+            dimension=EMBED_DIM,
+            metric="cosine",
+            spec=ServerlessSpec(cloud="aws", region="us-east-1"),
+        )
+
+
+def _resolve_index_host() -> str:
+    """The Pinecone index's data-plane host, from a one-off blocking describe_index call."""
+    global _index_host
+    if _index_host is None:
+        _index_host = _get_pinecone().describe_index(INDEX_NAME).host
+    return _index_host
+
+
+def get_index():
+    """The vector index for the configured backend, opened on first use."""
+    global index
+    if index is None:
+        # Outside the lock: the describe_index round trip shouldn't hold up other initializers
+        host = _resolve_index_host() if VECTOR_BACKEND != "local" else None
+        with _init_lock:
+            if index is None:
+                if VECTOR_BACKEND == "local":
+                    index = LocalVectorIndex(LOCAL_INDEX_DIR, EMBED_DIM)
+                else:
+                    index = _get_pinecone().Index(host=host)
+    return index
+
+
+def get_lexical_index() -> BM25Index:
+    """The BM25 index, loaded from disk on first use (empty if never built)."""
+    global lexical_index
+    if lexical_index is None:
+        with _init_lock:
+            if lexical_index is None:
+                lexical_index = BM25Index(BM25_INDEX_PATH)
+    return lexical_index
+
+
+def get_intent_router() -> IntentRouter:
+    """The query intent router, with its centroids loaded on first use (inactive if untrained)."""
+    global intent_router
+    if intent_router is None:
+        with _init_lock:
+            if intent_router is None:
+                router = IntentRouter()
+                router.load(EMBED_MODEL, EMBED_DIM)
+                intent_router = router
+    return intent_router
+
 
-index = pc.Index(INDEX_NAME)
-openai_client = OpenAI(api_key=OPENAI_API_KEY)
+def get_openai_client():
+    global openai_client
+    if openai_client is None:
+        with _init_lock:
+            if openai_client is None:
+                openai_client = OpenAI(api_key=OPENAI_API_KEY)
+    return openai_client
+
+
+def init():
+    """Create the clients and open the index, caches and tokenizer now instead of on the first query."""
+    start = time.perf_counter()
+    get_openai_client()
+    _get_async_openai()
+    get_index()
+    if VECTOR_BACKEND != "local":
+        # The agent queries through the async index; give it the host resolved above
+        _open_async_index()
+    get_lexical_index()
+    get_intent_router()
+    embedding_cache.open()
+    # context_packer counts tokens on the event loop for every answer
+    doc_chunker.load_tokenizer()
+    refresh_index_version()
+    answer_cache.check_index_version(index_version())
+    # Answers earlier job processes cached; this process is new for every session
+    answer_cache.refresh(prune=True)
+    logger.info(f"RAG {VECTOR_BACKEND} index and OpenAI client ready in {(time.perf_counter() - start) * 1000:.0f}ms")
+
+
+# Shared by the query path and ingestion, so unchanged docs and repeat
+# questions never hit the embeddings API twice
+embedding_cache = EmbeddingCache()
+
+# Speech-ready answers for semantically repeated questions, shared with the
+# other job processes on this host; dropped on re-ingest
+answer_cache = SemanticAnswerCache(path=ANSWER_CACHE_PATH)
+_index_version = [None, float("-inf")]  # [version, monotonic time it was read]
+_manifest_version = (None, None)  # (manifest mtime, version) last read from the local manifest
+_version_client = None  # sync MongoClient for index versions (ingestion and the sync API)
+
+# Runs filtered index queries side by side for one request
+_retrieval_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="rag-retrieval")
 
 # ========== HELPER FUNCTIONS ==========
 
-def chunk_text(text: str, max_length: int = MAX_CHUNK_LENGTH, overlap: int = CHUNK_OVERLAP):
-    """Split text into chunks based on character count."""
-    max_chars = max_length * 4
-    overlap_chars = overlap * 4
+def _check_embedding(emb: list) -> list:
+    """Pad/truncate to EMBED_DIM and reject zero vectors."""
+    if len(emb) != EMBED_DIM:
+        logger.warning(f"Expected {EMBED_DIM} dimensions, got {len(emb)}")
+        emb = (emb + [0.0] * EMBED_DIM)[:EMBED_DIM]
     
-    if len(text) <= max_chars:
-        return [text]
-    
-    chunks = []
-    start = 0
-    
-    while start < len(text):
-        end = start + max_chars
-        
-        if end < len(text):
-            last_period = text.rfind('.', start, end)
-            last_newline = text.rfind('\n', start, end)
-            last_break = max(last_period, last_newline)
-            
-            if last_break > start + (max_chars // 2):
-                end = last_break + 1
-            else:
-                last_space = text.rfind(' ', start, end)
-                if last_space > start:
-                    end = last_space
-        
-        chunk = text[start:end].strip()
-        if chunk:
-            chunks.append(chunk)
-        
-        start = end - overlap_chars if end < len(text) else end
-    
-    return chunks
+    # Safety check for zero vectors
+    if all(v == 0.0 for v in emb):
+        raise Exception("Received zero vector from OpenAI")
+    return emb
 
 
 def get_openai_embedding(text: str):
-    """Get embeddings from OpenAI API."""
+    """Get embeddings from the cache, falling back to the OpenAI API."""
+    cached = embedding_cache.get(text, EMBED_MODEL, EMBED_DIM)
+    telemetry.cache_lookup("embedding", cached is not None)
+    if cached is not None:
+        return cached
+
     try:
         # OpenAI's embedding API is simpler - no need for input_type parameter
-        response = openai_client.embeddings.create(
+        response = get_openai_client().embeddings.create(
             input=text,
             model=EMBED_MODEL,
             encoding_format="float"
         )
         
-        emb = response.data[0].embedding
-        
-        # Verify embedding dimension
-        if len(emb) != EMBED_DIM:
-            logger.warning(f"Expected {EMBED_DIM} dimensions, got {len(emb)}")
-            emb = (emb + [0.0] * EMBED_DIM)[:EMBED_DIM]
-        
-        # Safety check for zero vectors
-        if all(v == 0.0 for v in emb):
-            raise Exception("Received zero vector from OpenAI")
-        
+        emb = _check_embedding(response.data[0].embedding)
+        embedding_cache.put(text, emb, EMBED_MODEL, EMBED_DIM)
         return emb
     
     except Exception as e:
         logger.error(f"OpenAI embedding failed: {str(e)}")
+        telemetry.error("rag.embed", e)
         return None
 
 
-def load_and_upsert_documents():
-    """Load JSON files, chunk them, and upsert to Pinecone."""
-    if not os.path.exists(DOCS_DIR):
-        logger.warning(f"Documents folder '{DOCS_DIR}' not found.")
+def _embed_batch_with_retry(texts: list) -> list:
+    """Embed a batch of texts in one request, backing off on rate limits."""
+    for attempt in range(EMBED_MAX_RETRIES + 1):
+        try:
+            response = get_openai_client().embeddings.create(
+                input=texts,
+                model=EMBED_MODEL,
+                encoding_format="float"
+            )
+            ordered = sorted(response.data, key=lambda item: item.index)
+            return [_check_embedding(item.embedding) for item in ordered]
+        except (RateLimitError, APIConnectionError, APITimeoutError, InternalServerError) as e:
+            if attempt == EMBED_MAX_RETRIES:
+                raise
+            delay = min(30.0, 2 ** attempt) * (0.5 + random.random())
+            logger.warning(f"Embedding batch failed ({type(e).__name__}), retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+
+def iter_openai_embeddings(texts: list):
+    """
+    Yield (positions, embeddings) as batches of `texts` become available.
+    Cached texts come first; the rest are embedded EMBED_BATCH_SIZE inputs per
+    request with at most EMBED_MAX_CONCURRENCY requests in flight. Failed
+    batches yield None embeddings.
+    """
+    cached = embedding_cache.get_many(texts, EMBED_MODEL, EMBED_DIM)
+    if cached:
+        positions = [i for i, text in enumerate(texts) if text in cached]
+        yield positions, [cached[texts[i]] for i in positions]
+
+    # Embed each distinct missing text once
+    pending = {}
+    for i, text in enumerate(texts):
+        if text not in cached:
+            pending.setdefault(text, []).append(i)
+    unique = list(pending)
+    batches = [unique[i:i + EMBED_BATCH_SIZE] for i in range(0, len(unique), EMBED_BATCH_SIZE)]
+    if not batches:
         return
 
-    all_chunks = []
-    
-    for file in os.listdir(DOCS_DIR):
-        if file.endswith(".json"):
-            path = os.path.join(DOCS_DIR, file)
+    with ThreadPoolExecutor(max_workers=EMBED_MAX_CONCURRENCY) as pool:
+        futures = {pool.submit(_embed_batch_with_retry, batch): batch for batch in batches}
+        for future in as_completed(futures):
+            batch = futures[future]
+            try:
+                embs = future.result()
+                embedding_cache.put_many(zip(batch, embs), EMBED_MODEL, EMBED_DIM)
+            except Exception as e:
+                logger.error(f"OpenAI embedding batch of {len(batch)} failed: {e}")
+                embs = [None] * len(batch)
+            positions, values = [], []
+            for text, emb in zip(batch, embs):
+                for i in pending[text]:
+                    positions.append(i)
+                    values.append(emb)
+            yield positions, values
+
+
+def vector_id(source: str, chunk_id: int, text: str) -> str:
+    """Stable content-derived vector id for one chunk of one source file."""
+    text_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    return hashlib.sha256(f"{source}\x00{chunk_id}\x00{text_hash}".encode("utf-8")).hexdigest()[:40]
+
+
+def _load_manifest() -> dict:
+    """Load the ingestion manifest; an empty one if missing or built for another model/index/chunker."""
+    identity = (INDEX_NAME, EMBED_MODEL, EMBED_DIM, doc_chunker.CHUNKER_VERSION)
+    empty = {"index": INDEX_NAME, "embed_model": EMBED_MODEL, "embed_dim": EMBED_DIM,
+             "chunker": doc_chunker.CHUNKER_VERSION, "files": {}}
+    try:
+        with open(INGEST_MANIFEST_PATH, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        return empty
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable manifest {INGEST_MANIFEST_PATH}: {e}")
+        return empty
+    if (manifest.get("index"), manifest.get("embed_model"), manifest.get("embed_dim"), manifest.get("chunker")) != identity:
+        logger.info("Manifest was built for a different index, embedding model or chunker; rebuilding.")
+        return empty
+    return manifest
+
+
+def _save_manifest(manifest: dict):
+    os.makedirs(os.path.dirname(INGEST_MANIFEST_PATH), exist_ok=True)
+    tmp_path = INGEST_MANIFEST_PATH + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, INGEST_MANIFEST_PATH)
+
+
+def _file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _chunk_file(file: str, path: str) -> list:
+    """Chunk one JSON document, streamed from disk, into records carrying their stable vector ids."""
+    with open(path, "r", encoding="utf-8") as f:
+        chunks = list(doc_chunker.chunk_json(f, MAX_CHUNK_LENGTH, CHUNK_OVERLAP))
+    logger.info(f"Split {file} into {len(chunks)} chunks")
+
+    # Determine document type for better routing
+    doc_type = "services" if "services" in file.lower() else "use_cases"
+
+    return [{
+        "id": vector_id(file, i, chunk),
+        "text": chunk,
+        "section": section,
+        "source": file,
+        "doc_type": doc_type,
+        "chunk_id": i,
+        "total_chunks": len(chunks)
+    } for i, (section, chunk) in enumerate(chunks)]
+
+
+def _embed_and_upsert(chunks: list) -> set:
+    """Embed chunks in batches while a background thread upserts them; return the ids written."""
+    start = time.perf_counter()
+    embedded = 0
+    written = set()
+    buffer = []
+    upserts = {}
+    with ThreadPoolExecutor(max_workers=1) as upsert_pool, tqdm(total=len(chunks), desc="Embedding chunks") as progress:
+        texts = [chunk_data["text"] for chunk_data in chunks]
+        for positions, embs in iter_openai_embeddings(texts):
+            progress.update(len(positions))
+            for idx, emb in zip(positions, embs):
+                if emb is None:
+                    continue
+                chunk_data = chunks[idx]
+                buffer.append({
+                    "id": chunk_data["id"],
+                    "values": emb,
+                    "metadata": {
+                        "source": chunk_data["source"],
+                        "doc_type": chunk_data["doc_type"],
+                        "chunk_id": chunk_data["chunk_id"],
+                        "total_chunks": chunk_data["total_chunks"],
+                        "section": chunk_data["section"],
+                        "text": chunk_data["text"]  # chunks are token-bounded; store them whole
+                    }
+                })
+                embedded += 1
+                if len(buffer) >= UPSERT_BATCH_SIZE:
+                    upserts[upsert_pool.submit(get_index().upsert, vectors=buffer)] = buffer
+                    buffer = []
+        if buffer:
+            upserts[upsert_pool.submit(get_index().upsert, vectors=buffer)] = buffer
+
+        for future, batch in upserts.items():
             try:
-                with open(path, "r", encoding="utf-8") as f:
-                    content = json.load(f)
-                    doc_text = json.dumps(content, ensure_ascii=False)
-                    
-                    chunks = chunk_text(doc_text)
-                    logger.info(f"Split {file} into {len(chunks)} chunks")
-                    
-                    # Determine document type for better routing
-                    doc_type = "services" if "services" in file.lower() else "use_cases"
-                    
-                    for i, chunk in enumerate(chunks):
-                        all_chunks.append({
-                            "text": chunk,
-                            "source": file,
-                            "doc_type": doc_type,
-                            "chunk_id": i,
-                            "total_chunks": len(chunks)
-                        })
-                        
+                future.result()
+                written.update(vector["id"] for vector in batch)
             except Exception as e:
-                logger.warning(f"Failed to load {file}: {e}")
+                logger.error(f"Upsert failed: {e}")
 
-    if not all_chunks:
-        logger.warning("No valid documents found.")
+    elapsed = time.perf_counter() - start
+    logger.info(
+        f"Embedded {embedded}/{len(chunks)} chunks and upserted {len(written)} vectors in {elapsed:.1f}s "
+        f"({len(chunks) / elapsed if elapsed else 0:.1f} chunks/sec)"
+    )
+    return written
+
+
+def load_and_upsert_documents(full_rebuild: bool = False):
+    """
+    Incrementally sync JSON files in DOCS_DIR to Pinecone.
+    Unchanged files are skipped by content hash, only new or changed chunks are
+    embedded and upserted, and vectors of removed chunks and files are deleted.
+    Without a manifest (or with full_rebuild) the index is cleared first.
+    """
+    if not os.path.exists(DOCS_DIR):
+        logger.warning(f"Documents folder '{DOCS_DIR}' not found.")
         return
 
-    logger.info(f"Total chunks to embed: {len(all_chunks)}")
-    
-    vectors = []
-    for idx, chunk_data in enumerate(tqdm(all_chunks, desc="Embedding chunks")):
-        emb = get_openai_embedding(chunk_data["text"])
-        if emb is None:
+    start = time.perf_counter()
+    manifest = _load_manifest()
+    lexical = get_lexical_index()
+    if full_rebuild or not manifest["files"]:
+        # The index is owned by this ingester; drop vectors we have no record of
+        logger.info(f"Clearing index '{INDEX_NAME}' for a full rebuild...")
+        try:
+            get_index().delete(delete_all=True)
+        except Exception as e:
+            logger.warning(f"Could not clear index (it may already be empty): {e}")
+        manifest["files"] = {}
+    if full_rebuild or not manifest["files"] or not len(lexical):
+        # Also re-chunk unchanged files so the BM25 index covers every chunk
+        lexical.delete(delete_all=True)
+        rebuild_lexical = True
+    else:
+        rebuild_lexical = False
+
+    previous = manifest["files"]
+    current = {}
+    to_upsert = []
+    stale_ids = []
+    unchanged = 0
+
+    for file in sorted(os.listdir(DOCS_DIR)):
+        if not file.endswith(".json"):
             continue
-            
-        vectors.append({
-            "id": f"chunk-{idx}",
-            "values": emb,
-            "metadata": {
-                "source": chunk_data["source"],
-                "doc_type": chunk_data["doc_type"],
-                "chunk_id": chunk_data["chunk_id"],
-                "total_chunks": chunk_data["total_chunks"],
-                "text": chunk_data["text"][:1000]  # Store more text for context
-            }
-        })
-
-    if vectors:
+        path = os.path.join(DOCS_DIR, file)
         try:
-            logger.info(f"Upserting {len(vectors)} chunks...")
-            batch_size = 100
-            for i in range(0, len(vectors), batch_size):
-                batch = vectors[i:i + batch_size]
-                index.upsert(vectors=batch)
-            logger.info("Upsert completed successfully.")
+            file_hash = _file_sha256(path)
+            known = previous.get(file, {})
+            if known.get("sha256") == file_hash:
+                current[file] = known
+                unchanged += 1
+                if rebuild_lexical:
+                    lexical.upsert(_chunk_file(file, path))
+                continue
+
+            chunks = _chunk_file(file, path)
+            lexical.upsert(chunks)
+            known_ids = set(known.get("ids", []))
+            new_ids = [chunk_data["id"] for chunk_data in chunks]
+            to_upsert.extend(chunk_data for chunk_data in chunks if chunk_data["id"] not in known_ids)
+            stale_ids.extend(known_ids - set(new_ids))
+            current[file] = {"sha256": file_hash, "ids": new_ids}
         except Exception as e:
-            logger.error(f"Upsert failed: {e}")
+            logger.warning(f"Failed to load {file}: {e}")
+            # Leave whatever we had for this file in place
+            if file in previous:
+                current[file] = previous[file]
 
+    for file, known in previous.items():
+        if file not in current:
+            logger.info(f"{file} was removed; deleting its {len(known.get('ids', []))} vectors")
+            stale_ids.extend(known.get("ids", []))
+    lexical.delete(stale_ids)
+
+    logger.info(
+        f"{unchanged} unchanged files, {len(to_upsert)} new/changed chunks, {len(stale_ids)} stale vectors"
+    )
+
+    if to_upsert:
+        written = _embed_and_upsert(to_upsert)
+        failed = {chunk_data["id"] for chunk_data in to_upsert} - written
+        if failed:
+            # Forget the file hash so the next run retries the missing chunks
+            for known in current.values():
+                if failed.intersection(known["ids"]):
+                    known["ids"] = [i for i in known["ids"] if i not in failed]
+                    known["sha256"] = None
+
+    if stale_ids:
+        try:
+            for i in range(0, len(stale_ids), 1000):
+                get_index().delete(ids=stale_ids[i:i + 1000])
+            logger.info(f"Deleted {len(stale_ids)} stale vectors")
+        except Exception as e:
+            logger.error(f"Stale vector delete failed: {e}")
+            # Keep tracking them so the next run tries again
+            for file, known in previous.items():
+                leftover = set(known.get("ids", [])) & set(stale_ids)
+                if leftover:
+                    entry = current.setdefault(file, {"sha256": None, "ids": []})
+                    entry["ids"] = entry["ids"] + sorted(leftover)
+                    entry["sha256"] = None
+
+    if VECTOR_BACKEND == "local":
+        get_index().save()
+    lexical.save()
+    logger.info(f"BM25 index holds {len(lexical)} chunks")
+
+    manifest["files"] = current
+    # Bumped whenever the indexed vectors change, so workers drop cached answers
+    version_source = json.dumps({file: known["ids"] for file, known in sorted(current.items())})
+    manifest["version"] = hashlib.sha256(version_source.encode("utf-8")).hexdigest()[:16]
+    _save_manifest(manifest)
+    _publish_index_version(manifest["version"])
+    logger.info(f"Ingestion finished in {time.perf_counter() - start:.1f}s")
+    logger.info(f"Embedding cache: {embedding_cache.stats()}")
 
-def query_rag(query: str, top_k: int = 15, doc_type_filter: str = None):
-    """Query RAG index and retrieve top-k chunks with optional filtering."""
-    emb = get_openai_embedding(query)
-    if emb is None:
-        return []
 
+def _hit_dict(hit: dict, include_values: bool = False) -> dict:
+    chunk = {
+        "source": hit["metadata"]["source"],
+        "doc_type": hit["metadata"]["doc_type"],
+        "chunk_id": hit["metadata"]["chunk_id"],
+        "section": hit["metadata"].get("section", ""),
+        "score": hit["score"],
+        "text": hit["metadata"].get("text", "")
+    }
+    if include_values:
+        chunk["values"] = hit["values"]
+    return chunk
+
+
+def search_index(emb: list, top_k: int = 15, doc_type_filter: str = None, include_values: bool = False):
+    """Retrieve top-k chunks for an already-computed query embedding (with their vectors if asked)."""
     try:
         # Build filter if doc_type specified
         filter_dict = {"doc_type": {"$eq": doc_type_filter}} if doc_type_filter else None
         
-        results = index.query(
-            vector=emb, 
-            top_k=top_k, 
-            include_metadata=True,
-            filter=filter_dict
-        )
+        with telemetry.span("rag.vector_search", doc_type=doc_type_filter or "all", top_k=top_k):
+            results = get_index().query(
+                vector=emb, 
+                top_k=top_k, 
+                include_metadata=True,
+                include_values=include_values,
+                filter=filter_dict
+            )
         hits = results.get("matches", [])
         
-        return [{
-            "source": hit["metadata"]["source"],
-            "doc_type": hit["metadata"]["doc_type"],
-            "chunk_id": hit["metadata"]["chunk_id"],
-            "score": hit["score"],
-            "text": hit["metadata"].get("text", "")
-        } for hit in hits]
+        return [_hit_dict(hit, include_values) for hit in hits]
     except Exception as e:
         logger.error(f"Query failed: {e}")
         return []
 
 
-def generate_conversational_response(query: str, context: str, response_type: str = "general"):
-    """Generate natural conversational response using OpenAI."""
-    
+def _fuse_lexical(query: str, vector_hits: list, top_k: int, doc_type_filter: str, retrieval: str) -> list:
+    """Fuse vector hits with BM25 hits for hybrid retrieval; vector hits unchanged otherwise."""
+    if (retrieval or RETRIEVAL_MODE) != "hybrid":
+        return vector_hits
+    lexical = get_lexical_index()
+    if not len(lexical):
+        return vector_hits
+    with telemetry.span("rag.lexical_search", doc_type=doc_type_filter or "all", top_k=top_k):
+        lexical_hits = lexical.search(query, top_k=top_k, doc_type_filter=doc_type_filter)
+    return reciprocal_rank_fusion([vector_hits, lexical_hits], top_k)
+
+
+def retrieve(query: str, emb: list, top_k: int = 15, doc_type_filter: str = None, retrieval: str = None):
+    """Top-k chunks for an embedded query: vector search, fused with BM25 in hybrid mode."""
+    vector_hits = search_index(emb, top_k=top_k, doc_type_filter=doc_type_filter)
+    return _fuse_lexical(query, vector_hits, top_k, doc_type_filter, retrieval)
+
+
+def query_rag(query: str, top_k: int = 15, doc_type_filter: str = None, emb: list = None, retrieval: str = None):
+    """Query RAG index and retrieve top-k chunks with optional filtering."""
+    with telemetry.span("rag.query", top_k=top_k):
+        if emb is None:
+            with telemetry.span("rag.embed"):
+                emb = get_openai_embedding(query)
+        if emb is None:
+            return []
+        return retrieve(query, emb, top_k=top_k, doc_type_filter=doc_type_filter, retrieval=retrieval)
+
+
+def _log_timings(label: str, timings: dict):
+    """Log per-stage latencies in milliseconds."""
+    stages = " ".join(f"{stage}={ms:.0f}ms" for stage, ms in timings.items())
+    logger.info(f"{label} timings: {stages} total={sum(timings.values()):.0f}ms")
+
+
+def _response_messages(query: str, context: str, response_type: str = "general") -> list:
+    """Chat messages for a conversational answer of the given response type."""
     if response_type == "services":
         system_prompt = """You are a knowledgeable AI assistant for Tekisho Infotech, an AI/ML solutions company.
 
@@ -264,34 +651,42 @@ Context from Tekisho's documentation:
 
 Provide a natural, conversational response suitable for a voice avatar. Be specific with numbers and metrics when they're in the context."""
 
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt}
+    ]
+
+
+# Completion settings for answers: best balance of quality and cost
+RESPONSE_COMPLETION_PARAMS = {"model": "gpt-4o-mini", "temperature": 0.7, "max_tokens": 600, "top_p": 0.9}
+GENERATION_FALLBACK = ("I'd be happy to discuss Tekisho's AI solutions with you. "
+                       "Could you tell me more about what specific challenges you're facing?")
+NO_CONTEXT_RESPONSE = ("I'd love to help you with that challenge. While I don't have specific details right now, "
+                       "Tekisho specializes in custom AI and automation solutions that can significantly reduce costs "
+                       "and improve efficiency. Would you like me to connect you with one of our solution architects "
+                       "who can discuss your specific needs in detail?")
+
+
+def generate_conversational_response(query: str, context: str, response_type: str = "general"):
+    """Generate natural conversational response using OpenAI."""
     try:
-        completion = openai_client.chat.completions.create(
-            model="gpt-4o-mini",  # Best balance of quality and cost
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ],
-            temperature=0.7,
-            max_tokens=600,
-            top_p=0.9
+        completion = get_openai_client().chat.completions.create(
+            messages=_response_messages(query, context, response_type),
+            **RESPONSE_COMPLETION_PARAMS
         )
         
         return completion.choices[0].message.content
         
     except Exception as e:
         logger.error(f"OpenAI LLM generation failed: {e}")
-        return "I'd be happy to discuss Tekisho's AI solutions with you. Could you tell me more about what specific challenges you're facing?"
+        telemetry.error("rag.generate", e)
+        return GENERATION_FALLBACK
 
 
-def get_tekisho_solutions(challenge: str, industry: str = None) -> str:
-    """
-    Main function called by agent to get solutions for client challenges.
-    Intelligently routes to services or use cases based on query.
-    """
-    logger.info(f"Getting solutions for challenge: {challenge}, industry: {industry}")
-    
-    # Enhance query with industry context
-    enhanced_query = f"{challenge} in {industry} industry" if industry else challenge
+def _plan_solutions_query(challenge: str, industry: str = None):
+    """Return (enhanced_query, primary doc_type, secondary doc_type, response_type) by keywords."""
+    # Enhance query with industry context (the form the intent centroids are trained on)
+    enhanced_query = routing_query(challenge, industry)
     
     # Determine query intent (services vs use cases)
     query_lower = enhanced_query.lower()
@@ -299,70 +694,233 @@ def get_tekisho_solutions(challenge: str, industry: str = None) -> str:
                             ["roi", "cost saving", "case study", "example", "productivity", 
                              "revenue", "impact", "results", "implementation"])
     
-    # Retrieve relevant chunks with smart filtering
+    # Prioritize use cases or services, but also get some of the other
     if is_use_case_query:
-        # Prioritize use cases but also get some services
-        use_case_chunks = query_rag(enhanced_query, top_k=10, doc_type_filter="use_cases")
-        service_chunks = query_rag(enhanced_query, top_k=5, doc_type_filter="services")
-        all_chunks = use_case_chunks + service_chunks
-        response_type = "use_cases"
-    else:
-        # Prioritize services but also get some use cases
-        service_chunks = query_rag(enhanced_query, top_k=10, doc_type_filter="services")
-        use_case_chunks = query_rag(enhanced_query, top_k=5, doc_type_filter="use_cases")
-        all_chunks = service_chunks + use_case_chunks
-        response_type = "services"
+        return enhanced_query, "use_cases", "services", "use_cases"
+    return enhanced_query, "services", "use_cases", "services"
+
+
+def _route_solutions_query(emb, primary: str, secondary: str, response_type: str, timings: dict):
+    """
+    Classify the embedded query with the intent router. When it is confident,
+    return (intent, None, intent) so a single filtered query is run; otherwise
+    keep the keyword plan and its primary + secondary queries.
+    """
+    with telemetry.span("rag.route", timings) as current:
+        routed = get_intent_router().route(emb)
+        current.set_attribute("intent", routed[0] if routed else "keywords")
+    if routed is None:
+        return primary, secondary, response_type
+    intent, margin = routed
+    logger.info(f"Routed query to {intent} (margin {margin:.3f})")
+    return intent, None, intent
+
+
+def _build_context(chunks: list) -> str:
+    """Deduplicate, diversify and pack retrieved chunks into the prompt context."""
+    return pack_context(chunks)
+
+
+def _manifest_index_version():
+    """Version stamp in the local ingestion manifest, re-read when the file changes."""
+    global _manifest_version
+    try:
+        mtime = os.stat(INGEST_MANIFEST_PATH).st_mtime
+    except OSError:
+        return None
+    if _manifest_version[0] != mtime:
+        try:
+            with open(INGEST_MANIFEST_PATH, "r", encoding="utf-8") as f:
+                _manifest_version = (mtime, json.load(f).get("version"))
+        except Exception as e:
+            logger.warning(f"Could not read index version: {e}")
+            return _manifest_version[1]
+    return _manifest_version[1]
+
+
+def _version_collection():
+    """Sync handle on INDEX_VERSION_COLLECTION, or None without MONGO_URI."""
+    global _version_client
+    if not mongo_pool.MONGO_URI:
+        return None
+    if _version_client is None:
+        with _init_lock:
+            if _version_client is None:
+                _version_client = MongoClient(
+                    mongo_pool.MONGO_URI,
+                    serverSelectionTimeoutMS=mongo_pool.MONGO_SERVER_SELECTION_TIMEOUT_MS,
+                )
+    return _version_client[mongo_pool.DB_NAME][INDEX_VERSION_COLLECTION]
+
+
+def _publish_index_version(version: str):
+    """Record a new index version where every worker reads it."""
+    try:
+        collection = _version_collection()
+        if collection is None:
+            logger.warning("MONGO_URI is not set; workers on other machines keep cached answers until they expire")
+            return
+        collection.update_one(
+            {"_id": INDEX_VERSION_ID},
+            {"$set": {"version": version, "updated_at": datetime.now(timezone.utc)}},
+            upsert=True,
+        )
+        logger.info(f"Published index version {version}")
+    except Exception as e:
+        logger.error(f"Could not publish index version {version}: {e}")
+
+
+def _index_version_due() -> bool:
+    """True (and the next read claimed) when the cached version is older than INDEX_VERSION_REFRESH."""
+    if time.monotonic() - _index_version[1] < INDEX_VERSION_REFRESH:
+        return False
+    _index_version[1] = time.monotonic()
+    return True
+
+
+def _set_index_version(doc):
+    # Indexes ingested before versions were published only have the local manifest
+    _index_version[0] = doc.get("version") if doc else _manifest_index_version()
+
+
+def refresh_index_version():
+    """Re-read the published index version if the cached one is due."""
+    if not _index_version_due():
+        return
+    try:
+        collection = _version_collection()
+        _set_index_version(collection.find_one({"_id": INDEX_VERSION_ID}) if collection is not None else None)
+    except Exception as e:
+        logger.warning(f"Could not read index version: {e}")
+
+
+async def arefresh_index_version():
+    """Async refresh_index_version, through the shared async pool."""
+    if not _index_version_due():
+        return
+    try:
+        doc = None
+        if mongo_pool.MONGO_URI:
+            doc = await mongo_pool.get_collection(INDEX_VERSION_COLLECTION).find_one({"_id": INDEX_VERSION_ID})
+        _set_index_version(doc)
+    except Exception as e:
+        logger.warning(f"Could not read index version: {e}")
+
+
+def index_version():
+    """Version stamp of the ingested document index as last read (changes on every re-ingest that changes vectors)."""
+    return _index_version[0]
+
+
+def _cached_answer(emb, industry: str, response_type: str):
+    """Return a cached speech-formatted answer for a semantically equivalent query, or None."""
+    if emb is None:
+        return None
+    answer_cache.check_index_version(index_version())
+    hit = answer_cache.lookup(emb, industry, response_type)
+    telemetry.cache_lookup("answer", hit is not None)
+    if hit is None:
+        return None
+    answer, similarity = hit
+    logger.info(f"Answer cache hit (similarity {similarity:.3f}); cache stats: {answer_cache.stats()}")
+    return answer
+
+
+def _remember_answer(emb, industry: str, response_type: str, answer: str, timings: dict):
+    # Fallback texts are not real answers; don't let them shadow later queries
+    if emb is not None and answer not in (GENERATION_FALLBACK, NO_CONTEXT_RESPONSE):
+        cost_ms = timings.get("retrieve", 0.0) + timings.get("generate", 0.0)
+        answer_cache.put(emb, industry, response_type, answer, cost_ms=cost_ms)
+
+
+async def _aremember_answer(emb, industry: str, response_type: str, answer: str, timings: dict):
+    """_remember_answer off the event loop (the answer cache writes to SQLite)."""
+    await asyncio.to_thread(_remember_answer, emb, industry, response_type, answer, timings)
+
+
+async def _arefresh_answers():
+    """Check for a re-ingest, then load the answers other job processes cached since the last query."""
+    await arefresh_index_version()
+    answer_cache.check_index_version(index_version())
+    if answer_cache.persistent:
+        await asyncio.to_thread(answer_cache.refresh)
+
+
+def get_tekisho_solutions(challenge: str, industry: str = None, formatter=None, retrieval: str = None) -> str:
+    """
+    Main function called by agent to get solutions for client challenges.
+    Routes to services or use cases by the query embedding (keywords plus
+    both doc types when the intent router is unsure).
+    `formatter` (e.g. speech formatting) is applied before the answer is cached;
+    `retrieval` ("hybrid" or "vector") overrides RETRIEVAL_MODE.
+    """
+    logger.info(f"Getting solutions for challenge: {challenge}, industry: {industry}")
+    enhanced_query, primary, secondary, response_type = _plan_solutions_query(challenge, industry)
     
-    if not all_chunks:
-        # Fallback: General query without filtering
-        all_chunks = query_rag(enhanced_query, top_k=15)
-        response_type = "general"
+    # Embed once, then run one targeted query, or the primary and secondary
+    # filtered queries concurrently
+    timings = {}
+    with telemetry.span("rag.embed", timings):
+        emb = get_openai_embedding(enhanced_query)
+    if emb is not None:
+        primary, secondary, response_type = _route_solutions_query(emb, primary, secondary, response_type, timings)
+    cache_type = response_type
+
+    refresh_index_version()
+    answer_cache.check_index_version(index_version())
+    answer_cache.refresh()
+    cached = _cached_answer(emb, industry, cache_type)
+    if cached is not None:
+        return cached
     
-    # Build context from chunks
-    context = "\n\n".join([f"[{chunk['doc_type'].upper()}] {chunk['text']}" 
-                          for chunk in all_chunks[:15]])  # Limit to top 15
+    all_chunks = []
+    with telemetry.span("rag.retrieve", timings, retrieval=retrieval or RETRIEVAL_MODE):
+        if emb is not None:
+            if secondary is None:
+                all_chunks = retrieve(enhanced_query, emb, top_k=15, doc_type_filter=primary, retrieval=retrieval)
+            else:
+                # Run in a copy of this context so its spans nest under this one
+                primary_future = _retrieval_pool.submit(
+                    contextvars.copy_context().run, retrieve, enhanced_query, emb, 10, primary, retrieval
+                )
+                secondary_chunks = retrieve(enhanced_query, emb, top_k=5, doc_type_filter=secondary, retrieval=retrieval)
+                all_chunks = primary_future.result() + secondary_chunks
+        
+            if not all_chunks:
+                # Fallback: General query without filtering
+                all_chunks = retrieve(enhanced_query, emb, top_k=15, retrieval=retrieval)
+                response_type = "general"
     
+    context = _build_context(all_chunks)
     if not context.strip():
         # No relevant info found - provide general helpful response
-        return ("I'd love to help you with that challenge. While I don't have specific details right now, "
-                "Tekisho specializes in custom AI and automation solutions that can significantly reduce costs "
-                "and improve efficiency. Would you like me to connect you with one of our solution architects "
-                "who can discuss your specific needs in detail?")
+        return formatter(NO_CONTEXT_RESPONSE) if formatter else NO_CONTEXT_RESPONSE
     
     # Generate conversational response
-    response = generate_conversational_response(enhanced_query, context, response_type)
-    return response
+    with telemetry.span("rag.generate", timings, response_type=response_type):
+        response = generate_conversational_response(enhanced_query, context, response_type)
+    _log_timings("get_tekisho_solutions", timings)
 
+    answer = formatter(response) if formatter else response
+    if response != GENERATION_FALLBACK:
+        _remember_answer(emb, industry, cache_type, answer, timings)
+    return answer
 
-def get_personalized_greeting(name: str, company: str, mongo_uri: str) -> str:
-    """
-    Generate personalized greeting using company research from MongoDB + RAG.
-    """
-    logger.info(f"Generating greeting for {name} from {company}")
-    
-    # Check MongoDB for existing research
-    company_context = ""
-    try:
-        client = MongoClient(mongo_uri)
-        db = client[os.getenv("MONGO_DB_NAME", "tekisho_db")]
-        collection = db[os.getenv("MONGO_COLLECTION", "clients")]
-        
-        company_doc = collection.find_one({"company": company})
-        if company_doc:
-            if company_doc.get("company_summary"):
-                company_context = f"Company Summary: {company_doc['company_summary']}"
-            elif company_doc.get("research_about_company"):
-                company_context = f"Research: {company_doc['research_about_company']}"
-    except Exception as e:
-        logger.error(f"MongoDB query failed: {e}")
-    
-    # Search for relevant industry solutions
-    industry_query = f"{company} industry solutions challenges"
-    relevant_chunks = query_rag(industry_query, top_k=5)
-    
+
+def greeting_context(company_doc: dict) -> str:
+    """Summarize stored company research for the greeting prompt."""
+    if company_doc:
+        if company_doc.get("company_summary"):
+            return f"Company Summary: {company_doc['company_summary']}"
+        elif company_doc.get("research_about_company"):
+            return f"Research: {company_doc['research_about_company']}"
+    return ""
+
+
+def _greeting_messages(name: str, company: str, company_context: str, relevant_chunks: list) -> list:
+    """Chat messages for a personalized greeting (bump client_lookup.GREETING_PROMPT_VERSION on changes)."""
     rag_context = "\n".join([chunk['text'][:200] for chunk in relevant_chunks[:3]]) if relevant_chunks else ""
     
-    # Generate personalized greeting
     system_prompt = """You are a warm, professional AI greeter for Tekisho Infotech.
 
 Create a personalized, conversational greeting that:
@@ -383,30 +941,409 @@ Industry Insights: {rag_context if rag_context else 'General AI/ML capabilities'
 
 Create a warm, natural greeting."""
 
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt}
+    ]
+
+
+# The stored greetings' model and prompt version live in client_lookup, which
+# checks them whenever it builds a profile; bump GREETING_PROMPT_VERSION there
+# when _greeting_messages changes
+GREETING_COMPLETION_PARAMS = {"model": client_lookup.GREETING_MODEL, "temperature": 0.8, "max_tokens": 200}
+GREETING_PROMPT_VERSION = client_lookup.GREETING_PROMPT_VERSION
+# Precomputed greeting on each client: {text, model, prompt_version, profile_hash, generated_at}
+GREETING_FIELD = client_lookup.GREETING_FIELD
+# Profiles carry the greeting, so the greeting reads need no extra fields
+GREETING_PROJECTION = client_lookup.PROFILE_PROJECTION
+greeting_fingerprint = client_lookup.greeting_fingerprint
+stored_greeting = client_lookup.stored_greeting
+
+
+def _greeting_fallback(name: str, company: str) -> str:
+    return (f"Hi {name}! Great to connect with you from {company}. "
+            f"I'm here to learn about your business challenges and show you how "
+            f"Tekisho's AI solutions can help. What brings you here today?")
+
+
+def _greeting_doc_query(name: str, company: str):
+    """Exact normalized name + company query, served by the lookup_company_name index; None if either is empty."""
+    queries, name_key, company_key, _ = client_lookup.build_queries(name, company)
+    return queries[0] if name_key and company_key else None
+
+
+def _client_greeting(client_doc: dict):
+    """(stored greeting or None, company context for generating one) from the looked-up client."""
+    greeting = stored_greeting(client_doc) if client_doc is not None else None
+    telemetry.cache_lookup("greeting", greeting is not None)
+    if client_doc is None:
+        return None, ""
+    return greeting, greeting_context(client_lookup.flatten_profile(client_doc))
+
+
+def get_personalized_greeting(name: str, company: str, mongo_uri: str) -> str:
+    """
+    Personalized greeting for a client: the one precomputed by greetings.py
+    when it is current, otherwise generated from company research + RAG.
+    """
+    logger.info(f"Generating greeting for {name} from {company}")
+    
+    # One indexed lookup for the stored greeting and the company research
+    company_context = ""
+    try:
+        client = MongoClient(mongo_uri)
+        db = client[os.getenv("MONGO_DB_NAME", "tekisho_db")]
+        collection = db[os.getenv("MONGO_COLLECTION", "clients")]
+        
+        query = _greeting_doc_query(name, company)
+        greeting, company_context = _client_greeting(
+            collection.find_one(query, GREETING_PROJECTION) if query else None
+        )
+        if greeting:
+            return greeting
+    except Exception as e:
+        logger.error(f"MongoDB query failed: {e}")
+    
+    # Search for relevant industry solutions
+    industry_query = f"{company} industry solutions challenges"
+    relevant_chunks = query_rag(industry_query, top_k=5)
+    
     try:
-        completion = openai_client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ],
-            temperature=0.8,
-            max_tokens=200
+        completion = get_openai_client().chat.completions.create(
+            messages=_greeting_messages(name, company, company_context, relevant_chunks),
+            **GREETING_COMPLETION_PARAMS
         )
         
         return completion.choices[0].message.content
         
     except Exception as e:
         logger.error(f"Greeting generation failed: {e}")
-        return (f"Hi {name}! Great to connect with you from {company}. "
-                f"I'm here to learn about your business challenges and show you how "
-                f"Tekisho's AI solutions can help. What brings you here today?")
+        return _greeting_fallback(name, company)
+
+
+# ========== ASYNC API ==========
+# Used by the agent's function tools so retrieval and generation never block
+# the LiveKit session's event loop. The sync API above serves the CLI.
+
+_async_openai_client = None
+_async_index = None
+
+
+def _get_async_openai():
+    global _async_openai_client
+    if _async_openai_client is None:
+        _async_openai_client = AsyncOpenAI(api_key=OPENAI_API_KEY)
+    return _async_openai_client
+
+
+def _open_async_index():
+    """Build the async index handle (no I/O) once the host is known."""
+    global _async_index
+    if _async_index is None:
+        _async_index = _get_pinecone().IndexAsyncio(host=_resolve_index_host())
+    return _async_index
+
+
+async def _get_async_index():
+    if _async_index is None and _index_host is None:
+        # Not prewarmed by init(): resolve the host off the event loop
+        await asyncio.to_thread(_resolve_index_host)
+    return _open_async_index()
+
+
+
+async def aget_openai_embedding(text: str):
+    """Async get_openai_embedding: cache first, then the OpenAI API."""
+    # Memory hits stay on the loop; the SQLite tier is read and written in a thread
+    cached = embedding_cache.get_memory(text, EMBED_MODEL, EMBED_DIM)
+    if cached is None:
+        cached = await asyncio.to_thread(embedding_cache.get, text, EMBED_MODEL, EMBED_DIM)
+    telemetry.cache_lookup("embedding", cached is not None)
+    if cached is not None:
+        return cached
+
+    try:
+        response = await _get_async_openai().embeddings.create(
+            input=text,
+            model=EMBED_MODEL,
+            encoding_format="float"
+        )
+        emb = _check_embedding(response.data[0].embedding)
+        await asyncio.to_thread(embedding_cache.put, text, emb, EMBED_MODEL, EMBED_DIM)
+        return emb
+    except Exception as e:
+        logger.error(f"OpenAI embedding failed: {str(e)}")
+        telemetry.error("rag.embed", e)
+        return None
+
+
+async def asearch_index(emb: list, top_k: int = 15, doc_type_filter: str = None, include_values: bool = False):
+    """Async search_index."""
+    if VECTOR_BACKEND == "local":
+        # In-process and sub-millisecond; no need to leave the event loop
+        return search_index(emb, top_k=top_k, doc_type_filter=doc_type_filter, include_values=include_values)
+    try:
+        filter_dict = {"doc_type": {"$eq": doc_type_filter}} if doc_type_filter else None
+        with telemetry.span("rag.vector_search", doc_type=doc_type_filter or "all", top_k=top_k):
+            results = await (await _get_async_index()).query(
+                vector=emb,
+                top_k=top_k,
+                include_metadata=True,
+                include_values=include_values,
+                filter=filter_dict
+            )
+        return [_hit_dict(hit, include_values) for hit in results.get("matches", [])]
+    except Exception as e:
+        logger.error(f"Query failed: {e}")
+        return []
+
+
+async def aretrieve(query: str, emb: list, top_k: int = 15, doc_type_filter: str = None, retrieval: str = None,
+                    session=None):
+    """
+    Async retrieve; the BM25 side is in-process and runs inline. The vector
+    side comes from the session's prefetched candidates when they provably
+    contain the index's top-k (prefetch.CandidatePool).
+    """
+    vector_hits = session.vector_hits(emb, doc_type_filter, top_k) if session is not None else None
+    if vector_hits is None:
+        vector_hits = await asearch_index(emb, top_k=top_k, doc_type_filter=doc_type_filter)
+    return _fuse_lexical(query, vector_hits, top_k, doc_type_filter, retrieval)
+
+
+async def aquery_rag(query: str, top_k: int = 15, doc_type_filter: str = None, emb: list = None,
+                     retrieval: str = None):
+    """Async query_rag."""
+    with telemetry.span("rag.query", top_k=top_k):
+        if emb is None:
+            with telemetry.span("rag.embed"):
+                emb = await aget_openai_embedding(query)
+        if emb is None:
+            return []
+        return await aretrieve(query, emb, top_k=top_k, doc_type_filter=doc_type_filter, retrieval=retrieval)
+
+
+async def agenerate_conversational_response(query: str, context: str, response_type: str = "general"):
+    """Async generate_conversational_response."""
+    try:
+        completion = await _get_async_openai().chat.completions.create(
+            messages=_response_messages(query, context, response_type),
+            **RESPONSE_COMPLETION_PARAMS
+        )
+        return completion.choices[0].message.content
+    except Exception as e:
+        logger.error(f"OpenAI LLM generation failed: {e}")
+        telemetry.error("rag.generate", e)
+        return GENERATION_FALLBACK
+
+
+async def _aretrieve_solutions_context(query: str, emb, primary: str, secondary: str, response_type: str,
+                                       timings: dict, retrieval: str = None, session=None):
+    """Run the filtered queries for an embedded query (one if secondary is None); return (context, response_type)."""
+    all_chunks = []
+    with telemetry.span("rag.retrieve", timings, retrieval=retrieval or RETRIEVAL_MODE):
+        if emb is not None:
+            if secondary is None:
+                all_chunks = await aretrieve(query, emb, top_k=15, doc_type_filter=primary, retrieval=retrieval,
+                                             session=session)
+            else:
+                primary_chunks, secondary_chunks = await asyncio.gather(
+                    aretrieve(query, emb, top_k=10, doc_type_filter=primary, retrieval=retrieval, session=session),
+                    aretrieve(query, emb, top_k=5, doc_type_filter=secondary, retrieval=retrieval, session=session),
+                )
+                all_chunks = primary_chunks + secondary_chunks
+            if not all_chunks:
+                all_chunks = await aretrieve(query, emb, top_k=15, retrieval=retrieval)
+                response_type = "general"
+    return _build_context(all_chunks), response_type
+
+
+async def _aembed_solutions_query(challenge: str, industry: str, timings: dict):
+    """Plan, embed and route a solutions query; return (emb, enhanced_query, primary, secondary, response_type)."""
+    enhanced_query, primary, secondary, response_type = _plan_solutions_query(challenge, industry)
+    with telemetry.span("rag.embed", timings):
+        # The answer cache is consulted next; bring it up to date alongside the embedding
+        emb, _ = await asyncio.gather(aget_openai_embedding(enhanced_query), _arefresh_answers())
+    if emb is not None:
+        primary, secondary, response_type = _route_solutions_query(emb, primary, secondary, response_type, timings)
+    return emb, enhanced_query, primary, secondary, response_type
+
+
+async def aprefetch_candidates(query: str, doc_type: str, top_k: int):
+    """Embed `query` and fetch its top-k chunks of `doc_type` with their vectors; return (emb, hits)."""
+    emb = await aget_openai_embedding(query)
+    if emb is None:
+        return None, []
+    return emb, await asearch_index(emb, top_k=top_k, doc_type_filter=doc_type, include_values=True)
+
+
+async def aprefetch_answer(challenge: str, industry: str, session):
+    """Speculatively answer a likely question into a prefetch.SessionPrefetch's draft answers."""
+    timings = {}
+    emb, enhanced_query, primary, secondary, cache_type = await _aembed_solutions_query(challenge, industry, timings)
+    if emb is None:
+        return
+    context, response_type = await _aretrieve_solutions_context(
+        enhanced_query, emb, primary, secondary, cache_type, timings, session=session
+    )
+    if not context.strip():
+        return
+    with telemetry.span("rag.generate", timings, response_type=response_type, speculative=True):
+        response = await agenerate_conversational_response(enhanced_query, context, response_type)
+    if response != GENERATION_FALLBACK:
+        session.remember_answer(emb, industry, cache_type,
+                                session.formatter(response) if session.formatter else response)
+
+
+async def aget_tekisho_solutions(challenge: str, industry: str = None, formatter=None, retrieval: str = None,
+                                 session=None) -> str:
+    """Async get_tekisho_solutions; `session` is the caller's prefetch.SessionPrefetch, if any."""
+    logger.info(f"Getting solutions for challenge: {challenge}, industry: {industry}")
+    timings = {}
+    emb, enhanced_query, primary, secondary, cache_type = await _aembed_solutions_query(challenge, industry, timings)
+    cached = (session.lookup_answer(emb, industry, cache_type) if session is not None else None) \
+        or _cached_answer(emb, industry, cache_type)
+    if cached is not None:
+        return cached
+
+    context, response_type = await _aretrieve_solutions_context(
+        enhanced_query, emb, primary, secondary, cache_type, timings, retrieval, session
+    )
+    if not context.strip():
+        return formatter(NO_CONTEXT_RESPONSE) if formatter else NO_CONTEXT_RESPONSE
+
+    with telemetry.span("rag.generate", timings, response_type=response_type):
+        response = await agenerate_conversational_response(enhanced_query, context, response_type)
+    _log_timings("aget_tekisho_solutions", timings)
+
+    answer = formatter(response) if formatter else response
+    if response != GENERATION_FALLBACK:
+        await _aremember_answer(emb, industry, cache_type, answer, timings)
+    return answer
+
+
+async def astream_conversational_response(query: str, context: str, response_type: str = "general"):
+    """
+    Stream the conversational response as text deltas while tokens arrive.
+    A failure before any text yields GENERATION_FALLBACK; one after it raises,
+    so callers never take the partial text for a finished answer.
+    """
+    emitted = False
+    try:
+        stream = await _get_async_openai().chat.completions.create(
+            messages=_response_messages(query, context, response_type),
+            stream=True,
+            **RESPONSE_COMPLETION_PARAMS
+        )
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                emitted = True
+                yield chunk.choices[0].delta.content
+    except Exception as e:
+        logger.error(f"OpenAI LLM streaming failed: {e}")
+        telemetry.error("rag.generate", e)
+        if emitted:
+            raise
+        yield GENERATION_FALLBACK
+
+
+async def astream_tekisho_solutions(challenge: str, industry: str = None, formatter=None, retrieval: str = None,
+                                    session=None):
+    """
+    Streaming aget_tekisho_solutions: yields raw answer text deltas, or the
+    whole cached (already formatted) answer on a semantic or prefetch cache hit.
+    """
+    logger.info(f"Streaming solutions for challenge: {challenge}, industry: {industry}")
+    timings = {}
+    emb, enhanced_query, primary, secondary, cache_type = await _aembed_solutions_query(challenge, industry, timings)
+    cached = (session.lookup_answer(emb, industry, cache_type) if session is not None else None) \
+        or _cached_answer(emb, industry, cache_type)
+    if cached is not None:
+        yield cached
+        return
+
+    context, response_type = await _aretrieve_solutions_context(
+        enhanced_query, emb, primary, secondary, cache_type, timings, retrieval, session
+    )
+    if not context.strip():
+        yield NO_CONTEXT_RESPONSE
+        return
+
+    start = time.perf_counter()
+    parts = []
+    # Spans can't stay open across yields, so the stream's stages are recorded afterwards.
+    # A stream that dies mid-answer raises out of the loop: nothing is cached
+    async for delta in astream_conversational_response(enhanced_query, context, response_type):
+        if "first_token" not in timings:
+            telemetry.record("rag.first_token", start, timings=timings)
+        parts.append(delta)
+        yield delta
+    telemetry.record("rag.generate", start, response_type=response_type)
+    generate_ms = (time.perf_counter() - start) * 1000
+    timings["rest_of_generation"] = generate_ms - timings.get("first_token", 0.0)
+    _log_timings("astream_tekisho_solutions", timings)
+
+    response = "".join(parts)
+    if response != GENERATION_FALLBACK:
+        answer = formatter(response) if formatter else response
+        await _aremember_answer(emb, industry, cache_type, answer, {**timings, "generate": generate_ms})
+
+
+async def agenerate_greeting(name: str, company: str, company_context: str) -> str:
+    """Write a greeting with RAG industry insights and the greeting model; raises if the completion fails."""
+    relevant_chunks = await aquery_rag(f"{company} industry solutions challenges", top_k=5)
+    completion = await _get_async_openai().chat.completions.create(
+        messages=_greeting_messages(name, company, company_context, relevant_chunks),
+        **GREETING_COMPLETION_PARAMS
+    )
+    return completion.choices[0].message.content
+
+
+async def aget_personalized_greeting(name: str, company: str) -> str:
+    """Async get_personalized_greeting using the shared MongoDB pool."""
+    logger.info(f"Generating greeting for {name} from {company}")
+
+    context = ""
+    try:
+        query = _greeting_doc_query(name, company)
+        greeting, context = _client_greeting(
+            await mongo_pool.get_collection().find_one(query, GREETING_PROJECTION) if query else None
+        )
+        if greeting:
+            return greeting
+    except Exception as e:
+        logger.error(f"MongoDB query failed: {e}")
+
+    try:
+        return await agenerate_greeting(name, company, context)
+    except Exception as e:
+        logger.error(f"Greeting generation failed: {e}")
+        return _greeting_fallback(name, company)
+
+
+async def aclose():
+    """Close the async clients (call on worker shutdown)."""
+    global _async_openai_client, _async_index
+    logger.info(f"Answer cache stats: {answer_cache.stats()}")
+    if _async_index is not None:
+        index_, _async_index = _async_index, None
+        await index_.close()
+    if _async_openai_client is not None:
+        client, _async_openai_client = _async_openai_client, None
+        await client.close()
 
 
 # ========== MAIN INGESTION ==========
 if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Sync Rag_docs to the vector index, then chat with it")
+    parser.add_argument("--rebuild", action="store_true", help="clear the index and re-ingest everything")
+    args = parser.parse_args()
+
     logger.info("Starting RAG ingestion with OpenAI embeddings...")
-    load_and_upsert_documents()
+    ensure_index()
+    load_and_upsert_documents(full_rebuild=args.rebuild)
     logger.info("RAG setup complete.")
     
     # Interactive testing
@@ -0,0 +1,260 @@
+# room_pool.py – Pool of pre-created rooms with an agent already joined and warmed
+import os
+import json
+import time
+import uuid
+import random
+import asyncio
+import logging
+from collections import deque
+from dataclasses import dataclass
+from dotenv import load_dotenv
+from livekit import api
+from prometheus_client import Counter, Gauge, Histogram
+
+# ========== CONFIG ==========
+load_dotenv()
+
+# Warm rooms kept ready; 0 disables the pool (every visitor gets a fresh room)
+ROOM_POOL_SIZE = int(os.getenv("ROOM_POOL_SIZE", "0"))
+# "livekit" creates real rooms; "local" is a stand-in that needs no LiveKit server
+ROOM_POOL_BACKEND = os.getenv("ROOM_POOL_BACKEND", "livekit").lower()
+# Rooms warming up at once, so a refill burst doesn't hit every worker together
+ROOM_POOL_CONCURRENCY = int(os.getenv("ROOM_POOL_CONCURRENCY", "4"))
+# How long a warm agent waits for a visitor before leaving (it holds a worker slot)
+ROOM_POOL_MAX_IDLE = float(os.getenv("ROOM_POOL_MAX_IDLE", "600"))
+# Give up on a room whose agent hasn't reported warm by then
+ROOM_POOL_WARM_TIMEOUT = float(os.getenv("ROOM_POOL_WARM_TIMEOUT", "60"))
+# Start warming a replacement this long before an idle room goes stale, so the
+# pool stays full through quiet spells longer than ROOM_POOL_MAX_IDLE
+ROOM_POOL_REPLACE_LEAD = float(os.getenv("ROOM_POOL_REPLACE_LEAD", str(ROOM_POOL_WARM_TIMEOUT)))
+# Seconds the local stand-in takes to "warm" a room
+ROOM_POOL_LOCAL_WARMUP = float(os.getenv("ROOM_POOL_LOCAL_WARMUP", "3.0"))
+# Must match the worker's agent_name; set it to switch the worker to explicit dispatch
+AGENT_NAME = os.getenv("AGENT_NAME", "")
+
+# Participant attribute the agent sets once its session is started (see agent.py)
+WARM_ATTRIBUTE = "tekisho.warm"
+# Don't hand out a room whose agent is about to give up waiting
+STALE_MARGIN = 30.0
+WARM_POLL_INTERVAL = 0.5
+# How often the pool drops stale rooms and tops itself up between handouts
+MAINTAIN_INTERVAL = 5.0
+
+logger = logging.getLogger("TekishoRoomPool")
+
+# ========== METRICS ==========
+
+POOL_DEPTH = Gauge("tekisho_room_pool_depth", "Warm rooms ready to hand out")
+POOL_WARMING = Gauge("tekisho_room_pool_warming", "Rooms being created and warmed")
+HANDOUTS = Counter("tekisho_room_pool_handouts_total", "Rooms handed to visitors", ["result"])
+WARMUP_SECONDS = Histogram(
+    "tekisho_room_pool_warmup_seconds",
+    "Room creation to agent warm",
+    buckets=(0.5, 1.0, 2.0, 3.0, 5.0, 7.5, 10.0, 15.0, 30.0, 60.0),
+)
+WARMUP_FAILURES = Counter("tekisho_room_pool_warmup_failures_total", "Rooms that failed to warm")
+
+
+def generate_room_name() -> str:
+    """A fresh room per visitor; a full uuid4 (122 random bits) never collides, so no room listing is needed."""
+    return f"room-{uuid.uuid4().hex}"
+
+
+# ========== PROVISIONERS ==========
+
+class LiveKitProvisioner:
+    """Creates rooms with the agent dispatched into them through the LiveKit server API."""
+
+    def __init__(self, lkapi: api.LiveKitAPI, agent_name: str = AGENT_NAME):
+        self.lkapi = lkapi
+        self.agent_name = agent_name
+
+    async def create(self, room: str, metadata: dict = None):
+        """Create `room` with the agent dispatched (when the worker uses explicit dispatch)."""
+        agents = [api.RoomAgentDispatch(agent_name=self.agent_name, metadata=json.dumps(metadata or {}))] \
+            if self.agent_name else []
+        await self.lkapi.room.create_room(api.CreateRoomRequest(name=room, agents=agents))
+
+    async def provision(self, room: str, max_idle: float):
+        """Create a room and wait until its agent reports warm."""
+        await self.create(room, {"pool": True, "max_idle": max_idle})
+        deadline = time.monotonic() + ROOM_POOL_WARM_TIMEOUT
+        while time.monotonic() < deadline:
+            res = await self.lkapi.room.list_participants(api.ListParticipantsRequest(room=room))
+            if any(p.attributes.get(WARM_ATTRIBUTE) == "1" for p in res.participants):
+                return
+            await asyncio.sleep(WARM_POLL_INTERVAL)
+        raise TimeoutError(f"Agent in {room} not warm after {ROOM_POOL_WARM_TIMEOUT:.0f}s")
+
+    async def release(self, room: str):
+        await self.lkapi.room.delete_room(api.DeleteRoomRequest(room=room))
+
+
+class LocalProvisioner:
+    """
+    Stand-in for LiveKit Cloud: a room "warms" after about `warmup` seconds and
+    fails with `failure_rate`. Lets the pool and /getToken be exercised offline.
+    """
+
+    def __init__(self, warmup: float = ROOM_POOL_LOCAL_WARMUP, failure_rate: float = 0.0):
+        self.warmup = warmup
+        self.failure_rate = failure_rate
+        self.rooms = set()
+
+    async def create(self, room: str, metadata: dict = None):
+        self.rooms.add(room)
+
+    async def provision(self, room: str, max_idle: float):
+        self.rooms.add(room)
+        await asyncio.sleep(self.warmup * random.uniform(0.8, 1.2))
+        if random.random() < self.failure_rate:
+            raise RuntimeError("stand-in warmup failure")
+
+    async def release(self, room: str):
+        self.rooms.discard(room)
+
+
+# ========== POOL ==========
+
+@dataclass
+class WarmRoom:
+    name: str
+    ready_at: float
+
+
+class RoomPool:
+    """
+    Keeps `size` rooms warm. acquire() hands out the oldest usable one and
+    starts a background refill; when the pool is empty the visitor gets a
+    fresh room with the agent dispatched, i.e. the pre-pool path. A background
+    task replaces idle rooms before their agents give up waiting.
+    """
+
+    def __init__(self, provisioner, size: int = ROOM_POOL_SIZE, max_idle: float = ROOM_POOL_MAX_IDLE,
+                 concurrency: int = ROOM_POOL_CONCURRENCY):
+        self.provisioner = provisioner
+        self.size = size
+        self.max_idle = max_idle
+        # Rooms this close to stale no longer count as filled; capped so a short
+        # max_idle still leaves rooms counted for a while
+        self.replace_lead = min(ROOM_POOL_REPLACE_LEAD, max(0.0, max_idle - STALE_MARGIN) / 2)
+        self._idle = deque()
+        self._warming = 0
+        self._slots = asyncio.Semaphore(max(1, concurrency))
+        self._tasks = set()
+        self._closed = False
+
+    def start(self):
+        self._refill()
+        self._spawn(self._maintain())
+
+    async def acquire(self) -> tuple:
+        """Return (room name, whether its agent is already warm)."""
+        self._drop_stale()
+        warm = self._idle.popleft() if self._idle else None
+        POOL_DEPTH.set(len(self._idle))
+        self._refill()
+
+        if warm is not None:
+            HANDOUTS.labels("warm").inc()
+            return warm.name, True
+        room = generate_room_name()
+        await self.provisioner.create(room)
+        HANDOUTS.labels("cold").inc()
+        return room, False
+
+    async def stop(self):
+        """Stop refilling and delete the rooms nobody took."""
+        self._closed = True
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        idle, self._idle = list(self._idle), deque()
+        await asyncio.gather(*(self._release(room.name) for room in idle))
+        POOL_DEPTH.set(0)
+
+    def stats(self) -> dict:
+        return {"size": self.size, "ready": len(self._idle), "warming": self._warming}
+
+    def _spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _usable_for(self, room: WarmRoom, now: float) -> float:
+        """Seconds `room` can still be handed out before its agent is about to leave."""
+        return room.ready_at + self.max_idle - STALE_MARGIN - now
+
+    def _drop_stale(self):
+        # Rooms are appended as they warm, so the stale ones are at the front
+        now = time.monotonic()
+        while self._idle and self._usable_for(self._idle[0], now) <= 0:
+            self._spawn(self._release(self._idle.popleft().name))
+        POOL_DEPTH.set(len(self._idle))
+
+    def _refill(self):
+        if self._closed:
+            return
+        # Rooms about to go stale are being replaced, so they don't count as filled
+        now = time.monotonic()
+        filled = sum(self._usable_for(room, now) > self.replace_lead for room in self._idle)
+        while filled + self._warming < self.size:
+            self._warming += 1
+            POOL_WARMING.set(self._warming)
+            self._spawn(self._warm_one())
+
+    async def _maintain(self):
+        while not self._closed:
+            self._drop_stale()
+            self._refill()
+            await asyncio.sleep(MAINTAIN_INTERVAL)
+
+    async def _warm_one(self):
+        room = generate_room_name()
+        try:
+            async with self._slots:
+                start = time.perf_counter()
+                await self.provisioner.provision(room, self.max_idle)
+            WARMUP_SECONDS.observe(time.perf_counter() - start)
+            self._idle.append(WarmRoom(room, time.monotonic()))
+            POOL_DEPTH.set(len(self._idle))
+        except asyncio.CancelledError:
+            await self._release(room)
+            raise
+        except Exception as e:
+            WARMUP_FAILURES.inc()
+            logger.warning(f"Warming {room} failed: {e}")
+            await self._release(room)
+            # Back off, still counted as warming so neither acquire() nor the
+            # maintenance task refills the slot, so a LiveKit or worker outage
+            # doesn't turn into a retry storm
+            await asyncio.sleep(random.uniform(2.0, 5.0))
+        finally:
+            self._warming -= 1
+            POOL_WARMING.set(self._warming)
+        self._refill()
+
+    async def _release(self, room: str):
+        try:
+            await self.provisioner.release(room)
+        except Exception as e:
+            logger.warning(f"Could not delete {room}: {e}")
+
+
+def create_pool(lkapi: api.LiveKitAPI = None):
+    """
+    Pool for the configured backend, or None when neither a pool nor explicit
+    dispatch is configured (visitors' rooms then get agents by auto-dispatch).
+    """
+    if ROOM_POOL_BACKEND == "local":
+        return RoomPool(LocalProvisioner())
+    if ROOM_POOL_BACKEND != "livekit":
+        raise RuntimeError(f"Unknown ROOM_POOL_BACKEND {ROOM_POOL_BACKEND!r}")
+    if ROOM_POOL_SIZE <= 0 and not AGENT_NAME:
+        return None
+    if ROOM_POOL_SIZE > 0 and not AGENT_NAME:
+        raise RuntimeError("ROOM_POOL_SIZE needs AGENT_NAME (the worker must use explicit dispatch)")
+    if lkapi is None:
+        raise RuntimeError("LIVEKIT_URL must be set to pre-create rooms")
+    return RoomPool(LiveKitProvisioner(lkapi))
@@ -1,46 +1,93 @@
+# server.py – ASGI token server for the website's LiveKit widget
 import os
-from livekit import api
-from flask import Flask, request
+import logging
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
-from flask_cors import CORS
-from livekit.api import LiveKitAPI, ListRoomsRequest
-import uuid
+from livekit import api
+from livekit.api import LiveKitAPI
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import PlainTextResponse, Response
+from starlette.routing import Route
 
+import room_pool
+from room_pool import generate_room_name
+
+# ========== CONFIG ==========
 load_dotenv()
 
-app = Flask(__name__)
-CORS(app, resources={r"/*": {"origins": "*"}})
-
-async def generate_room_name():
-    name = "room-" + str(uuid.uuid4())[:8]
-    rooms = await get_rooms()
-    while name in rooms:
-        name = "room-" + str(uuid.uuid4())[:8]
-    return name
-
-async def get_rooms():
-    api = LiveKitAPI()
-    rooms = await api.room.list_rooms(ListRoomsRequest())
-    await api.aclose()
-    return [room.name for room in rooms.rooms]
-
-@app.route("/getToken")
-async def get_token():
-    name = request.args.get("name", "my name")
-    room = request.args.get("room", None)
-    
+# Read once: the signing config never changes while the server runs
+LIVEKIT_URL = os.getenv("LIVEKIT_URL")
+LIVEKIT_API_KEY = os.getenv("LIVEKIT_API_KEY")
+LIVEKIT_API_SECRET = os.getenv("LIVEKIT_API_SECRET")
+SERVER_HOST = os.getenv("SERVER_HOST", "0.0.0.0")
+SERVER_PORT = int(os.getenv("SERVER_PORT", "5001"))
+
+logger = logging.getLogger("TekishoServer")
+
+
+def issue_token(name: str, room: str) -> str:
+    """Sign a join token for `room` with the cached API key and secret."""
+    return api.AccessToken(LIVEKIT_API_KEY, LIVEKIT_API_SECRET) \
+        .with_identity(name) \
+        .with_name(name) \
+        .with_grants(api.VideoGrants(room_join=True, room=room)) \
+        .to_jwt()
+
+
+# ========== APP ==========
+
+@asynccontextmanager
+async def lifespan(app: Starlette):
+    """
+    Check the signing config, open one LiveKit API client for the server's
+    lifetime and start filling the warm room pool. The server never writes to
+    Mongo; `python client_lookup.py --watch` keeps the lookup keys current.
+    """
+    if not (LIVEKIT_API_KEY and LIVEKIT_API_SECRET):
+        raise RuntimeError("LIVEKIT_API_KEY and LIVEKIT_API_SECRET must be set")
+    app.state.livekit = LiveKitAPI(LIVEKIT_URL, LIVEKIT_API_KEY, LIVEKIT_API_SECRET) if LIVEKIT_URL else None
+    # Each server process keeps its own pool, so run one process per pool
+    app.state.pool = room_pool.create_pool(app.state.livekit)
+    if app.state.pool is not None:
+        app.state.pool.start()
+        logger.info(f"Room pool started: {app.state.pool.stats()}")
+    try:
+        yield
+    finally:
+        if app.state.pool is not None:
+            await app.state.pool.stop()
+        if app.state.livekit is not None:
+            await app.state.livekit.aclose()
+
+
+async def get_token(request):
+    name = request.query_params.get("name", "my name")
+    room = request.query_params.get("room")
+    warm = False
     if not room:
-        room = await generate_room_name()
-        
-    token = api.AccessToken(os.getenv("LIVEKIT_API_KEY"), os.getenv("LIVEKIT_API_SECRET")) \
-        .with_identity(name)\
-        .with_name(name)\
-        .with_grants(api.VideoGrants(
-            room_join=True,
-            room=room
-        ))
-    
-    return token.to_jwt()
+        pool = request.app.state.pool
+        if pool is not None:
+            room, warm = await pool.acquire()
+        else:
+            room = generate_room_name()
+    return PlainTextResponse(issue_token(name, room), headers={"X-Tekisho-Room": "warm" if warm else "cold"})
+
+
+async def metrics(request):
+    """Pool depth, handouts and warmup times for Prometheus."""
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+
+app = Starlette(
+    routes=[Route("/getToken", get_token), Route("/metrics", metrics)],
+    middleware=[Middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["GET"])],
+    lifespan=lifespan,
+)
+
 
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=5001, debug=True)
\ No newline at end of file
+    import uvicorn
+    uvicorn.run(app, host=SERVER_HOST, port=SERVER_PORT)
@@ -0,0 +1,270 @@
+# speech.py – Number, currency and unit normalization of text for TTS
+import re
+from functools import lru_cache
+
+# ========== WORD TABLES ==========
+
+ONES = ["zero", "one", "two", "three", "four", "five", "six", "seven", "eight", "nine",
+        "ten", "eleven", "twelve", "thirteen", "fourteen", "fifteen", "sixteen",
+        "seventeen", "eighteen", "nineteen"]
+TENS = ["", "", "twenty", "thirty", "forty", "fifty", "sixty", "seventy", "eighty", "ninety"]
+SCALES = [(10 ** 12, "trillion"), (10 ** 9, "billion"), (10 ** 6, "million"), (1000, "thousand")]
+
+# Last word of a cardinal -> ordinal, where it isn't just "+th"
+ORDINAL_WORDS = {"one": "first", "two": "second", "three": "third", "five": "fifth",
+                 "eight": "eighth", "nine": "ninth", "twelve": "twelfth"}
+
+# Currency symbol -> (singular, plural, minor unit singular, minor unit plural)
+CURRENCIES = {"$": ("dollar", "dollars", "cent", "cents"), "€": ("euro", "euros", "cent", "cents"),
+              "£": ("pound", "pounds", "penny", "pence"), "₹": ("rupee", "rupees", "paisa", "paise")}
+
+# Abbreviated magnitudes ("$1.2M", "500K", "3bn") -> spoken scale
+SCALE_SUFFIXES = {"k": "thousand", "m": "million", "mn": "million", "b": "billion", "bn": "billion",
+                  "thousand": "thousand", "million": "million", "billion": "billion", "trillion": "trillion"}
+
+_MONTHS = (r"jan(?:uary)?|feb(?:ruary)?|mar(?:ch)?|apr(?:il)?|may|june?|july?|aug(?:ust)?"
+           r"|sep(?:t(?:ember)?)?|oct(?:ober)?|nov(?:ember)?|dec(?:ember)?")
+# Words before a four-digit number that make it a year ("in 2024", "since 1998",
+# "Q3 2024", "March 2024", "March 5th, 2024")
+YEAR_CONTEXT = re.compile(
+    r"\b(?:in|since|by|from|until|till|through|before|after|during|of|year|fy|early|late|mid|q[1-4]|h[12]"
+    rf"|(?:{_MONTHS})\.?(?:\s+\d{{1,2}}(?:st|nd|rd|th)?,?)?)[\s-]*$",
+    re.IGNORECASE,
+)
+
+
+# ========== NUMBER WORDS ==========
+
+def _below_thousand(n: int) -> str:
+    if n < 20:
+        return ONES[n]
+    if n < 100:
+        return TENS[n // 10] + (" " + ONES[n % 10] if n % 10 else "")
+    words = ONES[n // 100] + " hundred"
+    return words + (" and " + _below_thousand(n % 100) if n % 100 else "")
+
+
+@lru_cache(maxsize=4096)
+def number_to_words(n: int) -> str:
+    """Cardinal words for a non-negative integer: 1250 -> "one thousand two hundred and fifty"."""
+    if n < 1000:
+        return _below_thousand(n)
+    parts = []
+    for value, name in SCALES:
+        if n >= value:
+            parts.append(number_to_words(n // value) + " " + name)
+            n %= value
+    if n:
+        parts.append(_below_thousand(n))
+    return " ".join(parts)
+
+
+@lru_cache(maxsize=4096)
+def ordinal_words(n: int) -> str:
+    """Ordinal words: 22 -> "twenty second"."""
+    words = number_to_words(n)
+    head, _, last = words.rpartition(" ")
+    if last in ORDINAL_WORDS:
+        last = ORDINAL_WORDS[last]
+    elif last.endswith("y"):
+        last = last[:-1] + "ieth"
+    else:
+        last += "th"
+    return f"{head} {last}" if head else last
+
+
+@lru_cache(maxsize=4096)
+def year_words(n: int) -> str:
+    """Years read in pairs: 1998 -> "nineteen ninety eight", 2025 -> "twenty twenty five"."""
+    high, low = divmod(n, 100)
+    if 2000 <= n < 2010:
+        return number_to_words(n)
+    if low == 0:
+        return number_to_words(high) + " hundred"
+    return number_to_words(high) + (" oh " if low < 10 else " ") + number_to_words(low)
+
+
+@lru_cache(maxsize=4096)
+def decimal_words(literal: str) -> str:
+    """Words for a numeric literal with optional thousands commas and decimals: "1,200.5"."""
+    whole, _, fraction = literal.replace(",", "").partition(".")
+    words = number_to_words(int(whole or "0"))
+    if fraction:
+        words += " point " + " ".join(ONES[int(digit)] for digit in fraction)
+    return words
+
+
+# ========== TOKENIZER ==========
+
+_NUM = r"\d+(?:,\d{3})*(?:\.\d+)?"
+_SCALE = r"(?:\s?(?:thousand|million|billion|trillion)\b|[kKmMbB](?:[nN])?(?![A-Za-z]))"
+
+# One pass over the text. The first alternative protects digit runs that are
+# not quantities (phone numbers, dates, versions, times, "24/7"); the second
+# is an optionally currency-prefixed number or range with scale and suffix.
+TOKEN = re.compile(
+    rf"""
+    (?=[\d$€£₹])  # cheap rejection of every position that can't start a token
+    (?:
+        (?P<code>
+            (?<![\w.])\d+(?:(?:-\d+){{2}}|(?:\.\d+){{2}}|(?:/\d+){{1,2}}|:\d\d)(?![\w])
+        )
+        |(?<![\w.\-/:])
+        (?:(?P<cur>[$€£₹])\s?)?(?P<a>{_NUM})(?P<a_scale>{_SCALE})?
+        (?:\s?[-–]\s?[$€£₹]?(?P<b>{_NUM})(?P<b_scale>{_SCALE})?)?
+        (?P<suffix>\s?%|[xX](?![A-Za-z])|st|nd|rd|th)?
+        (?![\w])
+    )
+    """,
+    re.VERBOSE,
+)
+
+# Streamed text that may still grow into a longer token: a trailing word with
+# a digit or currency symbol, optionally followed by a space and a partial word
+_PENDING_TAIL = re.compile(r"[$€£₹]?[\w.,:/%$€£₹\-–]*(?:\d|[$€£₹])[\w.,:/%\-–]*\s*(?:[-–]\s*[$€£₹]?[\d.,]*\s*)?[A-Za-z]*$")
+# Characters of already-emitted text kept as look-behind context
+_CONTEXT_CHARS = 24
+# Spoken form of tokens whose reading doesn't depend on the preceding words
+_SPOKEN = {}
+_SPOKEN_MAX = 4096
+
+
+def _scale_word(raw: str, currency: bool) -> str:
+    if not raw:
+        return ""
+    key = raw.strip().lower()
+    # A bare lowercase "m"/"b" is usually a unit (metres, bytes) unless it's money
+    if not currency and raw in ("m", "b"):
+        return None
+    return SCALE_SUFFIXES.get(key)
+
+
+def _is_year(literal: str) -> bool:
+    return len(literal) == 4 and literal.isdigit() and 1100 <= int(literal) <= 2099
+
+
+def _render(match, text: str) -> str:
+    token = match.group(0)
+    if _is_year(token):
+        # "2024" reads differently after "in"; never cache it
+        spoken = _render_token(match, text)
+        return year_words(int(token)) if spoken is None else spoken
+    spoken = _SPOKEN.get(token)
+    if spoken is None:
+        spoken = _render_token(match, text)
+        if len(_SPOKEN) >= _SPOKEN_MAX:
+            _SPOKEN.clear()
+        _SPOKEN[token] = spoken
+    return spoken
+
+
+def _render_token(match, text: str):
+    """Spoken form of one token; None for a year read as such only because of its context."""
+    if match.group("code"):
+        return match.group(0)
+
+    cur, a, b = match.group("cur"), match.group("a"), match.group("b")
+    suffix = (match.group("suffix") or "").strip()
+    a_scale = _scale_word(match.group("a_scale"), bool(cur))
+    b_scale = _scale_word(match.group("b_scale"), bool(cur))
+    if a_scale is None or b_scale is None:
+        return match.group(0)
+
+    if suffix.lower() in ("st", "nd", "rd", "th"):
+        if b or "." in a or "," in a or a_scale or cur:
+            return match.group(0)
+        return ordinal_words(int(a))
+
+    # Years: a range starting at a year ("2023-2025", "2023-24"), or one after
+    # a year-context word ("since 2019")
+    if not (cur or suffix or a_scale or b_scale) and _is_year(a):
+        if b and (_is_year(b) or (len(b) == 2 and b.isdigit())):
+            end = int(b) if len(b) == 4 else int(a) // 100 * 100 + int(b)
+            return year_words(int(a)) + " to " + year_words(end)
+        if not b and YEAR_CONTEXT.search(text, max(0, match.start() - _CONTEXT_CHARS), match.start()):
+            return None
+
+    # "$1-2M" shares the scale of its upper bound
+    scale = b_scale or a_scale
+    words = decimal_words(a)
+    if a_scale and a_scale != scale:
+        words += " " + a_scale
+    if b:
+        words += " to " + decimal_words(b)
+    if scale:
+        words += " " + scale
+
+    if cur:
+        singular, plural, minor_singular, minor_plural = CURRENCIES[cur]
+        whole, _, cents = a.replace(",", "").partition(".")
+        if not b and not scale and len(cents) == 2:
+            whole, cents = int(whole or "0"), int(cents)
+            minor = number_to_words(cents) + " " + (minor_singular if cents == 1 else minor_plural)
+            if cents and not whole:
+                # "$0.99" -> "ninety nine cents"
+                return minor
+            words = number_to_words(whole) + " " + (singular if whole == 1 else plural)
+            return words + (" and " + minor if cents else "")
+        return words + " " + (singular if not b and not scale and a == "1" else plural)
+    if suffix == "%":
+        return words + " percent"
+    if suffix:
+        return words + " times"
+    return words
+
+
+def normalize_for_speech(text: str, context: str = "") -> str:
+    """
+    Rewrite every number in text the way it should be spoken, in one pass:
+    "$1.2M" -> "one point two million dollars", "150-200%" -> "one hundred and
+    fifty to two hundred percent", "2.5x" -> "two point five times", "3rd" ->
+    "third", "since 2019" -> "since twenty nineteen". `context` is text that
+    came just before (already spoken) and is only used as look-behind.
+    """
+    if not context:
+        return TOKEN.sub(lambda match: _render(match, text), text)
+    source = context + text
+    out = []
+    last = len(context)
+    for match in TOKEN.finditer(source, len(context)):
+        out.append(source[last:match.start()])
+        out.append(_render(match, source))
+        last = match.end()
+    out.append(source[last:])
+    return "".join(out)
+
+
+class SpeechNormalizer:
+    """
+    Incremental normalize_for_speech() for streamed text: feed() returns the
+    normalized text that can no longer change, holding back a trailing
+    number (or a word that may be its unit) until more text or flush().
+    `formatter(text, context)` stands in for normalize_for_speech, e.g. to time it.
+    """
+
+    def __init__(self, formatter=normalize_for_speech):
+        self.formatter = formatter
+        self._pending = ""
+        self._context = ""
+
+    def _emit(self, text: str) -> str:
+        spoken = self.formatter(text, self._context)
+        self._context = (self._context + text)[-_CONTEXT_CHARS:]
+        return spoken
+
+    def feed(self, delta: str) -> str:
+        """Add streamed text; return whatever part of it is ready to be spoken."""
+        self._pending += delta
+        tail = _PENDING_TAIL.search(self._pending)
+        cut = tail.start() if tail else len(self._pending)
+        if not cut:
+            return ""
+        ready, self._pending = self._pending[:cut], self._pending[cut:]
+        return self._emit(ready)
+
+    def flush(self) -> str:
+        """Return the rest at the end of the stream and reset."""
+        ready, self._pending = self._pending, ""
+        spoken = self._emit(ready) if ready else ""
+        self._context = ""
+        return spoken
@@ -0,0 +1,154 @@
+# telemetry.py – Per-turn tracing spans and Prometheus metrics for the agent's hot path
+import os
+import time
+import asyncio
+import logging
+import tempfile
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dotenv import load_dotenv
+
+# ========== CONFIG ==========
+load_dotenv()
+
+# Where spans go: "none", "file" (JSON lines at TRACE_FILE) or "otlp" (endpoint
+# and headers from the standard OTEL_EXPORTER_OTLP_* variables)
+TRACE_EXPORTER = os.getenv("TRACE_EXPORTER", "none").lower()
+TRACE_FILE = os.getenv("TRACE_FILE", "traces.jsonl")
+TRACE_SERVICE_NAME = os.getenv("TRACE_SERVICE_NAME", "tekisho-agent")
+# Port of the worker's /metrics endpoint (served by the LiveKit worker); unset disables it
+PROMETHEUS_PORT = int(os.getenv("PROMETHEUS_PORT", "0")) or None
+
+# Jobs run in child processes, so metrics are shared through prometheus_client's
+# multiprocess files; the directory must be known before prometheus_client loads
+if PROMETHEUS_PORT and "PROMETHEUS_MULTIPROC_DIR" not in os.environ:
+    os.environ["PROMETHEUS_MULTIPROC_DIR"] = os.path.join(tempfile.gettempdir(), "tekisho-agent-metrics")
+PROMETHEUS_MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+if PROMETHEUS_MULTIPROC_DIR:
+    os.makedirs(PROMETHEUS_MULTIPROC_DIR, exist_ok=True)
+
+from opentelemetry import trace  # noqa: E402
+from opentelemetry.trace import Status, StatusCode  # noqa: E402
+from prometheus_client import Counter, Histogram  # noqa: E402
+
+logger = logging.getLogger("TekishoTelemetry")
+
+# ========== METRICS ==========
+# Cache hit ratio per cache, in PromQL:
+#   sum by (cache) (rate(tekisho_cache_lookups_total{result="hit"}[5m]))
+#     / sum by (cache) (rate(tekisho_cache_lookups_total[5m]))
+
+STAGE_SECONDS = Histogram(
+    "tekisho_stage_seconds",
+    "Latency of tool calls and RAG, lookup and speech stages",
+    ["stage"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+STAGE_ERRORS = Counter("tekisho_stage_errors_total", "Failed tool calls and stages", ["stage"])
+CACHE_LOOKUPS = Counter("tekisho_cache_lookups_total", "Hot-path cache lookups", ["cache", "result"])
+
+# ========== TRACING ==========
+
+tracer = trace.get_tracer("tekisho")
+_provider = None
+# Room/job attributes put on every span of the session that set them
+_session_attributes = ContextVar("tekisho_session_attributes", default={})
+
+
+def _span_exporter():
+    if TRACE_EXPORTER == "file":
+        from opentelemetry.sdk.trace.export import ConsoleSpanExporter
+        out = open(TRACE_FILE, "a", encoding="utf-8", buffering=1)
+        return ConsoleSpanExporter(out=out, formatter=lambda span: span.to_json(indent=None) + "\n")
+    if TRACE_EXPORTER == "otlp":
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        return OTLPSpanExporter()
+    if TRACE_EXPORTER != "none":
+        logger.warning(f"Unknown TRACE_EXPORTER {TRACE_EXPORTER!r}; tracing disabled")
+    return None
+
+
+def setup_tracing():
+    """
+    Install a tracer provider with the configured exporter, for our spans and
+    LiveKit's own. Call once per process; a no-op when tracing is disabled.
+    """
+    global _provider
+    if _provider is not None:
+        return
+    exporter = _span_exporter()
+    if exporter is None:
+        return
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor
+    from livekit.agents.telemetry import set_tracer_provider
+
+    _provider = TracerProvider(resource=Resource.create({"service.name": TRACE_SERVICE_NAME}))
+    _provider.add_span_processor(BatchSpanProcessor(exporter))
+    trace.set_tracer_provider(_provider)
+    set_tracer_provider(_provider)
+    logger.info(f"Tracing to {TRACE_FILE if TRACE_EXPORTER == 'file' else TRACE_EXPORTER}")
+
+
+async def flush():
+    """Export spans still buffered (call on job shutdown)."""
+    if _provider is not None:
+        await asyncio.to_thread(_provider.force_flush)
+
+
+def bind_session(**attributes):
+    """Attach attributes (room, job id) to every span started from this context on."""
+    _session_attributes.set({key: str(value) for key, value in attributes.items() if value is not None})
+
+
+@contextmanager
+def span(name: str, timings: dict = None, **attributes):
+    """
+    Trace a stage as a span (nested under the current one) and observe its
+    duration in tekisho_stage_seconds. An exception escaping the block is
+    recorded on the span and counted as a stage error. With `timings`, the
+    duration in ms is also stored there under the last dotted part of `name`.
+    """
+    start = time.perf_counter()
+    with tracer.start_as_current_span(name, attributes={**_session_attributes.get(), **attributes},
+                                      record_exception=False, set_status_on_exception=False) as current:
+        try:
+            yield current
+        except Exception as e:
+            error(name, e)
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            STAGE_SECONDS.labels(name).observe(elapsed)
+            if timings is not None:
+                timings[name.rsplit(".", 1)[-1]] = elapsed * 1000
+
+
+def record(name: str, start: float, end: float = None, timings: dict = None, **attributes):
+    """
+    Record a stage timed by hand (perf_counter start/end), e.g. one that spans
+    yields of a stream, as a finished span and a histogram observation.
+    """
+    end = time.perf_counter() if end is None else end
+    now_ns = time.time_ns()
+    start_ns = now_ns - int((time.perf_counter() - start) * 1e9)
+    end_ns = now_ns - int((time.perf_counter() - end) * 1e9)
+    tracer.start_span(name, attributes={**_session_attributes.get(), **attributes},
+                      start_time=start_ns).end(end_time=end_ns)
+    STAGE_SECONDS.labels(name).observe(end - start)
+    if timings is not None:
+        timings[name.rsplit(".", 1)[-1]] = (end - start) * 1000
+
+
+def error(stage: str, exc: BaseException = None):
+    """Count a failed stage and mark the current span, for errors that are handled rather than raised."""
+    STAGE_ERRORS.labels(stage).inc()
+    current = trace.get_current_span()
+    if exc is not None:
+        current.record_exception(exc)
+    current.set_status(Status(StatusCode.ERROR, str(exc) if exc is not None else stage))
+
+
+def cache_lookup(cache: str, hit: bool):
+    CACHE_LOOKUPS.labels(cache, "hit" if hit else "miss").inc()